@@ -43,6 +43,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -52,6 +53,7 @@ THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    'cacheback',
 ]
 
 LOCAL_APPS = [
@@ -63,6 +65,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # MIDDLEWARE
 # ------------------------------------------------------------------------------
 MIDDLEWARE = [
+    'setlistspy.app.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,7 +130,11 @@ CACHES = {
         }
     }
 }
-CACHE_TTL = 60 * 60 * 2  # 2 Hours
+CACHE_TTL = 60 * 60 * 24 * 7  # 1 Week -- cached lists are invalidated by model generation (see app/cache.py)
+STATS_CACHE_LIFETIME = 60 * 60  # 1 Hour -- stale stats are served while they are refreshed in the background
+LOCAL_CACHE_MAX_ENTRIES = 1000  # Per worker -- hot values kept in process in front of Redis (see app/local_cache.py)
+LOCAL_CACHE_TTL = 60  # 1 Minute -- longest a worker may serve a value changed behind the cache's back
+CACHEBACK_TASK_QUEUE = 'celery'
 
 # Celery
 # ------------------------------------------------------------------------------
@@ -177,9 +184,14 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'rest_framework_filters.backends.ComplexFilterBackend',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'setlistspy.app.pagination.SetSpyPagination',
     'PAGE_SIZE': 100,
 }
+COUNT_ESTIMATE_THRESHOLD = 100000  # Unfiltered lists of tables with more rows than this report an estimated count
+COUNT_CACHE_TTL = 60  # 1 Minute
+SEARCH_LATENCY_BUDGET_MS = 50  # 95th percentile latency of typeahead searches, enforced by ./manage.py benchmark
+PROFILING_LOG_SAMPLE_RATE = env.float('PROFILING_LOG_SAMPLE_RATE', default=0.01)  # Share of request profiles logged
+QUERY_BUDGETS_ENFORCED = False  # Requests over their view's query budget are logged, or fail when enforced
 
 CORS_ORIGIN_ALLOW_ALL = True
 
@@ -5,7 +5,7 @@ SECRET_KEY = env('DJANGO_SECRET_KEY', default='7BuURoRA0FIaBFlFw0K6JdwcGG9nEWU7q
 ALLOWED_HOSTS = ['*']
 
 DEBUG = True
-MIDDLEWARE.insert(3, 'silk.middleware.SilkyMiddleware')
+MIDDLEWARE.insert(4, 'silk.middleware.SilkyMiddleware')
 INSTALLED_APPS.append('silk')
 SILKY_PYTHON_PROFILER = True
 SILKY_PYTHON_PROFILER_BINARY = True
@@ -16,3 +16,5 @@ if 'debug_toolbar.middleware.DebugToolbarMiddleware' in MIDDLEWARE:
     INSTALLED_APPS.remove('debug_toolbar')
 
 MEDIA_ROOT = 'test_uploads'
+
+QUERY_BUDGETS_ENFORCED = True
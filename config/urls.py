@@ -2,7 +2,8 @@ from django.conf import settings
 from django.conf.urls import url, include
 from django.contrib import admin
 from rest_framework import routers
-from setlistspy.app.views import ArtistViewSet, DJViewSet, LabelViewSet, TrackViewSet, TrackPlayViewSet, SetlistViewSet
+from setlistspy.app.views import ArtistViewSet, DJViewSet, LabelViewSet, TrackViewSet, TrackPlayViewSet, \
+    SetlistViewSet, SearchView
 
 router = routers.DefaultRouter()
 router.register('artists', ArtistViewSet)
@@ -16,6 +17,7 @@ urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^api-auth/',
         include('rest_framework.urls', namespace='rest_framework')),
+    url(r'^api/search/$', SearchView.as_view(), name='search'),
     url(r'^api/', include(router.urls)),
 ]
 
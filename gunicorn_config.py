@@ -2,11 +2,21 @@ import os
 
 name = 'setlistspy'
 worker_class = 'gevent'
-worker_connections = 20
-max_requests = 100
-max_requests_jitter = 50
-backlog = 16
+# Requests served concurrently by each worker, each of which holds its own database connection
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 50))
+# Recycling a worker throws away its in-process caches, so only do it now and then in case of leaks
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 128))
 port = os.environ.get('PORT', 6400)
 bind = [f'0.0.0.0:{port}']
 timeout = 28
-reload = True
+# Polls every loaded module for changes, so it's left to the local entrypoint
+reload = os.environ.get('GUNICORN_RELOAD', '0') == '1'
+
+
+def post_fork(server, worker):
+    if os.environ.get('GUNICORN_PATCH_PSYCOPG', '1') == '1':
+        # psycopg2 waits on Postgres in C, blocking every greenlet of the worker, unless it yields to the gevent hub
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
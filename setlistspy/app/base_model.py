@@ -1,5 +1,58 @@
 import uuid
-from django.db import models
+from collections import defaultdict
+
+from django.db import connection, models
+
+
+class SurrogateKeyField(models.BigIntegerField):
+    '''
+    Compact bigint key drawn from the {table}_key_seq sequence, which is also the column's database default.
+
+    Foreign keys on hot tables reference it (to_field='key') rather than the UUID primary key, which the API keeps
+    exposing, so that their columns and indexes are half the size and new rows are appended to the end of them.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('unique', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('unique') is True:
+            del kwargs['unique']
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        if add and getattr(model_instance, self.attname) is None:
+            assign_keys([model_instance])
+        return getattr(model_instance, self.attname)
+
+
+def get_key_sequence(model):
+    return f'{model._meta.db_table}_key_seq'
+
+
+def assign_keys(instances):
+    '''Draw the keys of unsaved instances in one query per model, e.g. before bulk_create'''
+    keyless_instances = defaultdict(list)
+    for instance in instances:
+        if getattr(instance, 'key', 0) is None:
+            keyless_instances[type(instance)].append(instance)
+    with connection.cursor() as cursor:
+        for model, model_instances in keyless_instances.items():
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)',
+                           [get_key_sequence(model), len(model_instances)])
+            for instance, (key,) in zip(model_instances, cursor.fetchall()):
+                instance.key = key
+
+
+def get_key_field(model):
+    '''Return the field which foreign keys to the model reference, i.e. its key if it has one, else its pk'''
+    return model._meta.get_field('key') if hasattr(model, 'key') else model._meta.pk
+
 
 class BaseSetSpyModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -8,3 +61,11 @@ class BaseSetSpyModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class KeyedSetSpyModel(BaseSetSpyModel):
+    '''A model referenced by its compact surrogate key, see SurrogateKeyField'''
+    key = SurrogateKeyField()
+
+    class Meta:
+        abstract = True
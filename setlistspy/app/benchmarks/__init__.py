@@ -0,0 +1,18 @@
+'''
+Benchmarks run with ./manage.py benchmark [name ...], so changes to hot paths can be measured.
+
+Each benchmark is a function taking the number of rounds to run and returning an ordered {metric: value} dict. A
+benchmark with a budget reports whether it was met as its within_budget metric, and the command fails when it wasn't.
+'''
+BENCHMARKS = {
+    'tracklists': 'setlistspy.app.benchmarks.tracklists.run',
+    'search': 'setlistspy.app.benchmarks.search.run',
+    'filters': 'setlistspy.app.benchmarks.filters.run',
+    'keys': 'setlistspy.app.benchmarks.keys.run',
+    'indexes': 'setlistspy.app.benchmarks.indexes.run',
+    'api': 'setlistspy.app.benchmarks.api.run',
+    'serving': 'setlistspy.app.benchmarks.serving.run',
+    'serializers': 'setlistspy.app.benchmarks.serializers.run',
+    'responses': 'setlistspy.app.benchmarks.responses.run',
+    'collaborators': 'setlistspy.app.benchmarks.collaborators.run',
+}
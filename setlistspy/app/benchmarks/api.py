@@ -0,0 +1,136 @@
+'''
+Latency and query counts of the API endpoints at production scale, over a synthetic catalogue loaded and rolled back
+within the benchmark.
+
+The catalogue has thousands of DJs and millions of track plays, with DJs, artists and labels following a Zipf
+distribution of popularity, so that the most popular ones have far more setlists and plays than the rest. A fixed mix
+of list, filter, retrieve, stats and search requests for popular and long tail entities is replayed through the whole
+middleware and view stack, once with the response caches invalidated and once served from them. The benchmark fails
+when a request runs more queries than its view's query budget (see setlistspy.app.profiling).
+'''
+import random
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.benchmarks.search import get_percentile
+from setlistspy.app.cache import CACHED_MODELS, bump_generations
+from setlistspy.app.jobs import STATS_REQUESTS_KEY, get_serializer_path
+from setlistspy.app.models import Artist, DJ, Label, Track
+from setlistspy.app.profiling import get_view_budget, is_query
+
+CATALOGUE_SETLISTS = getattr(settings, 'API_BENCHMARK_SETLISTS', 100000)
+CATALOGUE_DJS = 5000
+POPULARITY_EXPONENT = 1.1
+REPLAYS = 10
+
+
+def get_detail_urls(basename, instance):
+    kwargs = {'pk': instance.pk.hex}
+    return reverse(f'{basename}-detail', kwargs=kwargs), reverse(f'{basename}-stats', kwargs=kwargs)
+
+
+def get_requests(seed=0):
+    '''
+    Return the (name, path, query params) of the requests replayed, about the catalogue's most popular entities and
+    a random one from its long tail
+    '''
+    rng = random.Random(seed)
+    dj = DJ.objects.order_by('-num_setlists').first()
+    tail_dj = rng.choice(DJ.objects.order_by('num_setlists', 'pk')[:100])
+    artist = Artist.objects.order_by('-total_plays').first()
+    tail_artist = rng.choice(Artist.objects.order_by('total_plays', 'pk')[:100])
+    label = Label.objects.order_by('-total_plays').first()
+    track = Track.objects.order_by('-num_plays').first()
+    dj_url, dj_stats_url = get_detail_urls('dj', dj)
+    _, tail_dj_stats_url = get_detail_urls('dj', tail_dj)
+    _, artist_stats_url = get_detail_urls('artist', artist)
+    _, tail_artist_stats_url = get_detail_urls('artist', tail_artist)
+    _, label_stats_url = get_detail_urls('label', label)
+    track_url, track_stats_url = get_detail_urls('track', track)
+    return [
+        ('djs', reverse('dj-list'), {}),
+        ('djs by popularity', reverse('dj-list'), {'ordering': '-num_setlists'}),
+        ('djs by name', reverse('dj-list'), {'name': dj.name}),
+        ('dj', dj_url, {}),
+        ('dj stats', dj_stats_url, {}),
+        ('tail dj stats', tail_dj_stats_url, {}),
+        ('setlists', reverse('setlist-list'), {}),
+        ('setlists by dj', reverse('setlist-list'), {'dj__name': dj.name}),
+        ('tracks', reverse('track-list'), {}),
+        ('tracks by artist', reverse('track-list'), {'artist__name': artist.name}),
+        ('tracks by dj', reverse('track-list'), {'plays__setlist__dj__name': dj.name}),
+        ('track', track_url, {}),
+        ('track stats', track_stats_url, {}),
+        ('artists by popularity', reverse('artist-list'), {'ordering': '-total_plays'}),
+        ('artist stats', artist_stats_url, {}),
+        ('tail artist stats', tail_artist_stats_url, {}),
+        ('labels search', reverse('label-list'), {'search': label.name[:4]}),
+        ('label stats', label_stats_url, {}),
+        ('plays', reverse('trackplay-list'), {}),
+        ('plays by dj', reverse('trackplay-list'), {'setlist__dj__name': dj.name}),
+        ('search', reverse('search'), {'q': artist.name[:4]}),
+    ]
+
+
+def time_request(client, path, params):
+    '''Return the (milliseconds, number of queries) of a request'''
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(path, params)
+        milliseconds = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, f'{path} {params}: {response.status_code}'
+    return milliseconds, sum(1 for query in queries if is_query(query['sql']))
+
+
+def forget_stats_requests(paths):
+    '''Drop the request counts of the catalogue's stats, which would otherwise crowd out real ones in warm_stats'''
+    members = []
+    for path in paths:
+        match = resolve(path)
+        if getattr(match.func, 'actions', {}).get('get') == 'stats':
+            serializer_class = match.func.cls(action='stats').get_serializer_class()
+            members.append(f'{get_serializer_path(serializer_class)}:{uuid.UUID(match.kwargs["pk"])}')
+    if members:
+        get_redis_connection().zrem(STATS_REQUESTS_KEY, *members)
+
+
+def run(rounds=5):
+    '''Report the p50 and p95 ms and most queries of each request on a cache miss, and its p50 ms once cached'''
+    results = OrderedDict()
+    over_budget = []
+    client = APIClient()
+    with seeded_catalogue(CATALOGUE_SETLISTS, num_djs=CATALOGUE_DJS, popularity_exponent=POPULARITY_EXPONENT):
+        requests = get_requests()
+        latencies = {name: ([], []) for name, _, _ in requests}
+        max_queries = dict.fromkeys(latencies, 0)
+        for _ in range(rounds * REPLAYS):
+            for name, path, params in requests:
+                bump_generations(*CACHED_MODELS)
+                uncached_ms, num_queries = time_request(client, path, params)
+                cached_ms, _ = time_request(client, path, params)
+                latencies[name][0].append(uncached_ms)
+                latencies[name][1].append(cached_ms)
+                max_queries[name] = max(max_queries[name], num_queries)
+
+        for name, path, params in requests:
+            uncached, cached = (sorted(values) for values in latencies[name])
+            view_name, query_budget = get_view_budget(resolve(path).func, 'GET')
+            results[f'{name} p50_ms'] = round(get_percentile(uncached, 50), 2)
+            results[f'{name} p95_ms'] = round(get_percentile(uncached, 95), 2)
+            results[f'{name} cached_p50_ms'] = round(get_percentile(cached, 50), 2)
+            results[f'{name} queries'] = max_queries[name]
+            if query_budget is not None and max_queries[name] > query_budget:
+                over_budget.append(f'{name} ({view_name}: {max_queries[name]} > {query_budget})')
+        forget_stats_requests(path for _, path, _ in requests)
+    results['over_query_budget'] = ', '.join(over_budget) or None
+    results['within_budget'] = not over_budget
+    return results
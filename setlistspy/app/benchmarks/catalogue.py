@@ -0,0 +1,91 @@
+'''
+Synthetic catalogues of setlists for benchmarks, in the format setlistspy.app.bulk_load loads.
+
+Names are made up of random syllables so that substring and trigram searches over them behave like searches over
+real names. DJs, artists and labels are equally likely to turn up by default, or follow a Zipf distribution given a
+popularity exponent, as on MixesDB where a few of them account for most of the setlists and plays. The same seed
+always generates the same catalogue.
+'''
+import itertools
+import random
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from setlistspy.app.bulk_load import bulk_load
+
+SYLLABLES = (
+    'ka', 'lo', 'mi', 'ra', 'ven', 'dor', 'sha', 'tek', 'nu', 'bel', 'gar', 'stro', 'phi', 'zen', 'qua', 'mor',
+    'dex', 'ly', 'tron', 'vi', 'sol', 'har', 'ex', 'ob', 'cal', 'ri', 'an', 'mo', 'dub', 'ton', 'fa', 'sys',
+)
+
+
+def generate_name(rng, num_words=2):
+    return ' '.join(
+        ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))).title() for _ in range(num_words)
+    )
+
+
+def get_zipf_weights(num_items, exponent):
+    '''Return the cumulative weights of items ranked by popularity, for random.choices, or None for equal weights'''
+    if not exponent:
+        return None
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, num_items + 1)))
+
+
+def generate_setlists(num_setlists, tracks_per_setlist=20, num_djs=None, num_artists=None, seed=0, first_mixesdb_id=1,
+                      popularity_exponent=None, b2b_share=0):
+    '''
+    Yield num_setlists setlists by random DJs, playing random tracks by random artists on random labels, numbered from
+    first_mixesdb_id so that setlists of another catalogue can be added to a loaded one. With a popularity_exponent,
+    the first DJs, artists and labels generated are the most popular ones. A b2b_share of the setlists are b2b sets
+    with one or two other DJs, which are listed under each of them as they are on MixesDB.
+    '''
+    rng = random.Random(seed)
+    num_djs = num_djs or max(1, num_setlists // 20)
+    num_artists = num_artists or max(1, num_setlists * tracks_per_setlist // 10)
+    djs = [generate_name(rng) for _ in range(num_djs)]
+    artists = [generate_name(rng) for _ in range(num_artists)]
+    labels = [generate_name(rng, num_words=1) + ' Records' for _ in range(max(1, num_artists // 5))]
+    dj_weights, artist_weights, label_weights = (get_zipf_weights(len(items), popularity_exponent)
+                                                 for items in (djs, artists, labels))
+    for mixesdb_id in range(first_mixesdb_id, first_mixesdb_id + num_setlists):
+        dj_index = choose(rng, range(num_djs), dj_weights)
+        setlist = {
+            'dj_name': djs[dj_index],
+            'dj_url': f'/w/Category:DJ_{dj_index}',
+            'mixesdb_id': mixesdb_id,
+            'title': f'{djs[dj_index]} @ {generate_name(rng, num_words=1)}',
+            'mixesdb_mod_time': '2019-05-01T12:00:00Z',
+            'xml_sha1': f'{mixesdb_id:031d}',
+            'b2b': False,
+            'tracklist_data': [
+                {
+                    'artist_name': choose(rng, artists, artist_weights),
+                    'title': generate_name(rng, num_words=rng.randint(1, 3)),
+                    'label_name': choose(rng, labels, label_weights),
+                }
+                for _ in range(tracks_per_setlist)
+            ],
+        }
+        b2b_dj_indexes = set()
+        if b2b_share and rng.random() < b2b_share:
+            b2b_dj_indexes = {choose(rng, range(num_djs), dj_weights) for _ in range(rng.randint(1, 2))} - {dj_index}
+        if b2b_dj_indexes:
+            setlist['b2b'] = True
+        yield setlist
+        for b2b_dj_index in sorted(b2b_dj_indexes):
+            yield {**setlist, 'dj_name': djs[b2b_dj_index], 'dj_url': f'/w/Category:DJ_{b2b_dj_index}'}
+
+
+def choose(rng, items, cum_weights):
+    return rng.choices(items, cum_weights=cum_weights)[0] if cum_weights else rng.choice(items)
+
+
+@contextmanager
+def seeded_catalogue(num_setlists, **kwargs):
+    '''Load a generated catalogue for the duration of the block, leaving the database as it was afterwards'''
+    with transaction.atomic():
+        bulk_load(generate_setlists(num_setlists, **kwargs))
+        yield
+        transaction.set_rollback(True)
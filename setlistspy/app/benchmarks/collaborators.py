@@ -0,0 +1,69 @@
+'''
+Latency of the b2b collaborators of the most prolific DJs read from the collaboration graph, directly and with 2 hops,
+against the nested lookup over the setlists sharing their mixesdb_ids it replaced, and of updating a prolific DJ's
+edges, over a synthetic catalogue loaded and rolled back within the benchmark.
+'''
+import time
+from collections import OrderedDict
+
+from django.db import connection
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.collaborations import get_collaborators, update_collaborations
+from setlistspy.app.models import DJ, Setlist
+
+CATALOGUE_SETLISTS = 20000
+POPULARITY_EXPONENT = 1.1
+B2B_SHARE = 0.2
+TOP_DJS = 10
+
+# As the DJ stats looked up b2b collaborators before the collaboration graph
+LEGACY_COLLABORATORS_SQL = f'''
+    SELECT DISTINCT dj.id, dj.name
+    FROM {Setlist._meta.db_table} setlist
+    JOIN {DJ._meta.db_table} dj ON dj.key = setlist.dj_id
+    WHERE setlist.mixesdb_id IN (
+        SELECT mixesdb_id FROM {Setlist._meta.db_table} WHERE dj_id = %(dj_key)s AND b2b
+    ) AND setlist.dj_id <> %(dj_key)s
+'''
+
+
+def time_call(call, rounds):
+    best_seconds = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        call()
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def get_mean_ms(call, dj_keys, rounds):
+    '''Return the mean over the DJs of the best ms of call(dj_key)'''
+    return round(sum(time_call(lambda: call(dj_key), rounds) for dj_key in dj_keys) / len(dj_keys) * 1000, 2)
+
+
+def drop_mixesdb_id_index(cursor):
+    '''Drop the index added along with the collaboration graph, which the legacy lookup didn't have'''
+    index_name = next(index.name for index in Setlist._meta.indexes if index.fields == ['mixesdb_id', 'dj'])
+    cursor.execute(f'DROP INDEX {index_name}')
+
+
+def run(rounds=5):
+    '''Report the mean of the best ms over the most prolific DJs of each way to look up their collaborators'''
+    results = OrderedDict()
+    with seeded_catalogue(CATALOGUE_SETLISTS, popularity_exponent=POPULARITY_EXPONENT, b2b_share=B2B_SHARE), \
+            connection.cursor() as cursor:
+        dj_keys = list(DJ.objects.order_by('-num_setlists').values_list('key', flat=True)[:TOP_DJS])
+        results['graph_ms'] = get_mean_ms(get_collaborators, dj_keys, rounds)
+        results['graph_2_hops_ms'] = get_mean_ms(lambda dj_key: get_collaborators(dj_key, hops=2), dj_keys, rounds)
+        results['update_ms'] = get_mean_ms(lambda dj_key: update_collaborations([dj_key]), dj_keys, rounds)
+        results['top_dj_collaborators'] = len(get_collaborators(dj_keys[0]))
+        results['top_dj_2_hop_collaborators'] = len(get_collaborators(dj_keys[0], hops=2))
+
+        def get_legacy_collaborators(dj_key):
+            cursor.execute(LEGACY_COLLABORATORS_SQL, {'dj_key': dj_key})
+            return cursor.fetchall()
+        drop_mixesdb_id_index(cursor)
+        results['legacy_ms'] = get_mean_ms(get_legacy_collaborators, dj_keys, rounds)
+    return results
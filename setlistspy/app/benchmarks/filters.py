@@ -0,0 +1,73 @@
+'''
+Related filter chains compiled to EXISTS semi-joins against the IN (subquery) + DISTINCT they replaced, over a
+synthetic catalogue loaded and rolled back within the benchmark.
+
+Each path filters a list two or three relations away, e.g. tracks by the DJs who played them, and is timed fetching
+the first page and counting the list both ways. The planner's estimated total cost of the page query is reported too.
+'''
+import time
+from collections import OrderedDict
+
+from django.db import connection
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.filters import DJFilter, LabelFilter, SetlistFilter, SetSpyFilterSet, TrackFilter, \
+    TrackPlayFilter
+from setlistspy.app.models import Artist, DJ, Label
+
+CATALOGUE_SETLISTS = 5000
+PAGE_SIZE = 50
+
+# (name, filterset class, filter, model whose first name the filter takes)
+FILTER_PATHS = (
+    ('tracks by dj', TrackFilter, 'plays__setlist__dj__name', DJ),
+    ('tracks by label', TrackFilter, 'plays__label__name', Label),
+    ('setlists by artist', SetlistFilter, 'track_plays__track__artist__name', Artist),
+    ('setlists by label', SetlistFilter, 'track_plays__label__name', Label),
+    ('djs by artist', DJFilter, 'setlists__track_plays__track__artist__name', Artist),
+    ('labels by dj', LabelFilter, 'track_plays__setlist__dj__name', DJ),
+    ('djs by label', DJFilter, 'setlists__track_plays__label__name', Label),
+    ('plays by artist', TrackPlayFilter, 'track__artist__name', Artist),
+)
+
+
+def get_queryset(filterset_class, data, exists):
+    # Switched for the nested filtersets of the chain too
+    SetSpyFilterSet.exists_related_filters = exists
+    try:
+        queryset = filterset_class(data, queryset=filterset_class._meta.model.objects.order_by('pk')).qs
+        return queryset if exists else queryset.distinct()
+    finally:
+        SetSpyFilterSet.exists_related_filters = True
+
+
+def get_total_cost(queryset):
+    # QuerySet.explain() returns the JSON plan as text
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Plan']['Total Cost']
+
+
+def time_queryset(queryset, rounds):
+    best_seconds = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        list(queryset[:PAGE_SIZE])
+        queryset.count()
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def run(rounds=5):
+    '''Report the best ms per page and count, and the estimated cost, of each path as IN + DISTINCT and EXISTS'''
+    results = OrderedDict()
+    with seeded_catalogue(CATALOGUE_SETLISTS):
+        for name, filterset_class, filter_name, value_model in FILTER_PATHS:
+            data = {filter_name: value_model.objects.order_by('name').values_list('name', flat=True).first()}
+            for method, exists in (('in', False), ('exists', True)):
+                queryset = get_queryset(filterset_class, data, exists)
+                results[f'{name} {method}_ms'] = round(time_queryset(queryset, rounds) * 1000, 2)
+                results[f'{name} {method}_cost'] = get_total_cost(queryset[:PAGE_SIZE])
+    return results
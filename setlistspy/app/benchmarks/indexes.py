@@ -0,0 +1,78 @@
+'''
+Write throughput of bulk ingest with the redundant indexes migration 0008 dropped against without them.
+
+A synthetic catalogue is loaded and rolled back within the benchmark, and each round loads another batch of setlists
+on top of it, with the dropped indexes recreated for the legacy runs. The indexes are maintained row by row as they
+would be on a populated production database, rather than rebuilt at the end as with bulk_load --defer-indexes.
+'''
+from collections import OrderedDict
+
+from django.db import connection, transaction
+
+from setlistspy.app.benchmarks.catalogue import generate_setlists, seeded_catalogue
+from setlistspy.app.bulk_load import LOADED_MODELS, bulk_load
+from setlistspy.app.models import DJ, DJArtistPlayCount, DJLabelPlayCount, LabelArtistPlayCount, Setlist, Track, \
+    TrackPlay
+
+CATALOGUE_SETLISTS = 5000
+BATCH_SETLISTS = 1000
+
+# (table, columns) of the indexes dropped by migration 0008, including the ones Django created on foreign keys
+LEGACY_INDEXES = (
+    (DJ._meta.db_table, 'name'),
+    (Setlist._meta.db_table, 'dj_id'),
+    (Setlist._meta.db_table, 'dj_id'),
+    (Track._meta.db_table, 'artist_id'),
+    (Track._meta.db_table, 'artist_id'),
+    (Track._meta.db_table, 'artist_id, title'),
+    (TrackPlay._meta.db_table, 'track_id'),
+    (TrackPlay._meta.db_table, 'track_id'),
+    (TrackPlay._meta.db_table, 'setlist_id'),
+    (TrackPlay._meta.db_table, 'setlist_id'),
+    (DJArtistPlayCount._meta.db_table, 'dj_id'),
+    (DJArtistPlayCount._meta.db_table, 'artist_id'),
+    (DJArtistPlayCount._meta.db_table, 'dj_id, play_count DESC'),
+    (DJLabelPlayCount._meta.db_table, 'dj_id'),
+    (DJLabelPlayCount._meta.db_table, 'label_id'),
+    (DJLabelPlayCount._meta.db_table, 'dj_id, play_count DESC'),
+    (LabelArtistPlayCount._meta.db_table, 'label_id'),
+    (LabelArtistPlayCount._meta.db_table, 'artist_id'),
+)
+
+INDEXED_TABLES = [model._meta.db_table for model in LOADED_MODELS + (DJArtistPlayCount, DJLabelPlayCount,
+                                                                     LabelArtistPlayCount)]
+
+
+def get_indexes_size(cursor):
+    cursor.execute('SELECT SUM(pg_indexes_size(name::regclass)) FROM unnest(%s::text[]) AS name', [INDEXED_TABLES])
+    return cursor.fetchone()[0]
+
+
+def load_batch(cursor, indexes, seed):
+    '''Load a batch of setlists with the extra indexes and roll it back, returning (plays, seconds, index size)'''
+    with transaction.atomic():
+        for table, columns in indexes:
+            cursor.execute(f'CREATE INDEX ON {table} ({columns})')
+        setlists = generate_setlists(BATCH_SETLISTS, seed=seed, first_mixesdb_id=CATALOGUE_SETLISTS + 1)
+        timings = bulk_load(setlists)
+        indexes_size = get_indexes_size(cursor)
+        transaction.set_rollback(True)
+    num_plays = next(num_rows for step, num_rows, _ in timings if step == 'merge track plays')
+    # The staging steps don't touch the app tables' indexes
+    seconds = sum(seconds for step, _, seconds in timings if not step.startswith('copy'))
+    return num_plays, seconds, indexes_size
+
+
+def run(rounds=5):
+    '''Report the best track plays merged per second and seconds per batch, and the index sizes, of each index set'''
+    results = OrderedDict()
+    with seeded_catalogue(CATALOGUE_SETLISTS), connection.cursor() as cursor:
+        for name, indexes in (('legacy', LEGACY_INDEXES), ('current', ())):
+            best_seconds = None
+            for seed in range(1, rounds + 1):
+                num_plays, seconds, indexes_size = load_batch(cursor, indexes, seed)
+                best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+            results[f'{name} plays_per_s'] = round(num_plays / best_seconds)
+            results[f'{name} load_s'] = round(best_seconds, 3)
+            results[f'{name} indexes_mb'] = round(indexes_size / 2 ** 20, 2)
+    return results
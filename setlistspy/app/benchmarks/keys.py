@@ -0,0 +1,82 @@
+'''
+Size and join speed of track plays referencing their tracks and setlists by UUID against by surrogate key, over a
+synthetic catalogue loaded and rolled back within the benchmark.
+
+The plays are copied into two temporary tables, one per kind of foreign key, which are indexed like app_trackplay
+before being filled in the order the plays were loaded, so the indexes grow the way they do in production.
+'''
+import time
+from collections import OrderedDict
+
+from django.db import connection
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.models import Setlist, Track, TrackPlay
+
+CATALOGUE_SETLISTS = 10000
+
+# (name, type of the foreign keys, referenced column)
+PLAY_TABLES = (
+    ('uuid', 'uuid', 'id'),
+    ('key', 'bigint', 'key'),
+)
+
+INDEXES = ('(track_id)', '(setlist_id)', '(track_id, setlist_id)', '(setlist_id, set_order)')
+
+
+def create_play_table(cursor, name, key_type, column):
+    table = f'bench_{name}_play'
+    cursor.execute(f'''
+        CREATE TEMPORARY TABLE {table} (
+            id uuid PRIMARY KEY, track_id {key_type} NOT NULL, setlist_id {key_type} NOT NULL, set_order integer
+        ) ON COMMIT DROP
+    ''')
+    for index in INDEXES:
+        cursor.execute(f'CREATE INDEX ON {table} {index}')
+    cursor.execute(f'''
+        INSERT INTO {table}
+        SELECT play.id, track.{column}, setlist.{column}, play.set_order
+        FROM {TrackPlay._meta.db_table} play
+        JOIN {Track._meta.db_table} track ON track.key = play.track_id
+        JOIN {Setlist._meta.db_table} setlist ON setlist.key = play.setlist_id
+        ORDER BY setlist.key, play.set_order
+    ''')
+    cursor.execute(f'ANALYZE {table}')
+    return table
+
+
+def get_join_sql(table, column):
+    '''Plays per DJ and artist, joining every play to its track and setlist'''
+    return f'''
+        SELECT setlist.dj_id, track.artist_id, COUNT(*)
+        FROM {table} play
+        JOIN {Track._meta.db_table} track ON track.{column} = play.track_id
+        JOIN {Setlist._meta.db_table} setlist ON setlist.{column} = play.setlist_id
+        GROUP BY setlist.dj_id, track.artist_id
+    '''
+
+
+def time_sql(cursor, sql, rounds):
+    best_seconds = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def run(rounds=5):
+    '''Report the table and index sizes and the best join time of the plays with each kind of foreign key'''
+    results = OrderedDict()
+    with seeded_catalogue(CATALOGUE_SETLISTS), connection.cursor() as cursor:
+        for name, key_type, column in PLAY_TABLES:
+            table = create_play_table(cursor, name, key_type, column)
+            cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', [table, table])
+            table_size, indexes_size = cursor.fetchone()
+            results[f'{name} table_mb'] = round(table_size / 2 ** 20, 2)
+            results[f'{name} indexes_mb'] = round(indexes_size / 2 ** 20, 2)
+            results[f'{name} join_ms'] = round(time_sql(cursor, get_join_sql(table, column), rounds) * 1000, 2)
+            cursor.execute(f'DROP TABLE {table}')
+    return results
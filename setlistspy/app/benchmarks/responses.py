@@ -0,0 +1,73 @@
+'''
+Redis memory and bandwidth of cached responses stored precompressed, against the pickled responses cache_page stored
+and sent uncompressed, and the latency of cache hits against If-None-Match revalidations, over a synthetic catalogue
+loaded and rolled back within the benchmark.
+'''
+import gzip
+import pickle
+import time
+from collections import OrderedDict
+
+from django.http import HttpResponse
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.cache import CACHED_MODELS, bump_generations
+from setlistspy.app.models import DJ
+from setlistspy.app.response_cache import COMPRESS_LEVEL, CachedResponse
+
+CATALOGUE_SETLISTS = 2000
+
+
+def get_paths():
+    dj = DJ.objects.order_by('-num_setlists').first()
+    return [
+        ('djs', reverse('dj-list')),
+        ('setlists', reverse('setlist-list')),
+        ('tracks', reverse('track-list')),
+        ('plays', reverse('trackplay-list')),
+        ('search', f'{reverse("search")}?q={dj.name[:3]}'),
+        ('dj stats', reverse('dj-stats', kwargs={'pk': dj.pk.hex})),
+    ]
+
+
+def time_request(client, path, rounds, **headers):
+    best_seconds = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        client.get(path, **headers)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def run(rounds=5):
+    '''Report the KB stored and sent per response both ways, and the best ms of cache hits and of 304s'''
+    results = OrderedDict()
+    totals = OrderedDict([('legacy_stored', 0), ('stored', 0), ('legacy_sent', 0), ('sent', 0)])
+    client = APIClient()
+    with seeded_catalogue(CATALOGUE_SETLISTS):
+        for name, path in get_paths():
+            bump_generations(*CACHED_MODELS)
+            response = client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+            content = gzip.decompress(response.content)
+            sizes = OrderedDict([
+                # cache_page pickled the whole response, and it was sent as it was
+                ('legacy_stored', len(pickle.dumps(HttpResponse(content, content_type=response['Content-Type']),
+                                                   pickle.HIGHEST_PROTOCOL))),
+                ('stored', len(pickle.dumps(CachedResponse(response['ETag'], response['Content-Type'],
+                                                           gzip.compress(content, COMPRESS_LEVEL)),
+                                            pickle.HIGHEST_PROTOCOL))),
+                ('legacy_sent', len(content)),
+                ('sent', len(response.content)),
+            ])
+            for metric, size in sizes.items():
+                results[f'{name} {metric}_kb'] = round(size / 1024, 2)
+                totals[metric] += size
+            results[f'{name} hit_ms'] = round(time_request(client, path, rounds, HTTP_ACCEPT_ENCODING='gzip') * 1000, 2)
+            results[f'{name} not_modified_ms'] = round(
+                time_request(client, path, rounds, HTTP_IF_NONE_MATCH=response['ETag']) * 1000, 2)
+    results['stored_saving'] = round(1 - totals['stored'] / totals['legacy_stored'], 3)
+    results['sent_saving'] = round(1 - totals['sent'] / totals['legacy_sent'], 3)
+    return results
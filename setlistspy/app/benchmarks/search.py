@@ -0,0 +1,58 @@
+'''
+Typeahead latency of the unified search, over a synthetic catalogue loaded and rolled back within the benchmark.
+
+Queries are the successive prefixes of names typed into a search box, and the benchmark fails when the 95th
+percentile latency goes over SEARCH_LATENCY_BUDGET_MS.
+'''
+import random
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.models import Artist, Track
+from setlistspy.app.search import search_all
+
+SEARCH_LATENCY_BUDGET_MS = getattr(settings, 'SEARCH_LATENCY_BUDGET_MS', 50)
+
+CATALOGUE_SETLISTS = 5000
+TYPED_NAMES = 20
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 10
+SEARCH_LIMIT = 5
+
+
+def get_typeahead_queries(seed=0):
+    '''Return the prefixes of random artist names and track titles, as typed one character at a time'''
+    rng = random.Random(seed)
+    names = list(Artist.objects.order_by('name').values_list('name', flat=True)[:1000])
+    names += list(Track.objects.order_by('title').values_list('title', flat=True)[:1000])
+    return [name[:length] for name in rng.sample(names, min(TYPED_NAMES, len(names)))
+            for length in range(MIN_PREFIX_LENGTH, min(len(name), MAX_PREFIX_LENGTH) + 1)]
+
+
+def get_percentile(sorted_values, percentile):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
+
+
+def run(rounds=5):
+    with seeded_catalogue(CATALOGUE_SETLISTS):
+        queries = get_typeahead_queries()
+        latencies = []
+        for _ in range(rounds):
+            for query in queries:
+                start = time.perf_counter()
+                search_all(query, SEARCH_LIMIT)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    p95 = get_percentile(latencies, 95)
+    return OrderedDict([
+        ('queries', len(latencies)),
+        ('p50_ms', round(get_percentile(latencies, 50), 2)),
+        ('p95_ms', round(p95, 2)),
+        ('p99_ms', round(get_percentile(latencies, 99), 2)),
+        ('budget_ms', SEARCH_LATENCY_BUDGET_MS),
+        ('within_budget', p95 <= SEARCH_LATENCY_BUDGET_MS),
+    ])
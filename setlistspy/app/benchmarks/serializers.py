@@ -0,0 +1,57 @@
+'''
+Serialization of list pages by the DRF serializers against the ValuesSerializers compiled from them, over a synthetic
+catalogue loaded and rolled back within the benchmark.
+
+Each page is fetched and serialized the way the list endpoints do it, i.e. as models with their related objects
+selected by the serializer's setup_queryset, or as .values() rows.
+'''
+import time
+from collections import OrderedDict
+
+from setlistspy.app.benchmarks.catalogue import seeded_catalogue
+from setlistspy.app.models import Setlist, Track, TrackPlay
+from setlistspy.app.serializers import SetlistSerializer, TrackPlaySerializer, TrackSerializer
+from setlistspy.app.values_serializers import ValuesSerializer
+
+CATALOGUE_SETLISTS = 2000
+PAGE_SIZE = 100
+PAGES = 20
+
+SERIALIZED_LISTS = (
+    ('plays', TrackPlay, TrackPlaySerializer),
+    ('tracks', Track, TrackSerializer),
+    ('setlists', Setlist, SetlistSerializer),
+)
+
+
+def serialize_models(queryset, serializer_class, offset):
+    page = serializer_class.setup_queryset(queryset, {})[offset:offset + PAGE_SIZE]
+    return serializer_class(list(page), many=True).data
+
+
+def serialize_values(queryset, values_serializer, offset):
+    return values_serializer.serialize(values_serializer.get_queryset(queryset)[offset:offset + PAGE_SIZE])
+
+
+def time_pages(serialize, queryset, serializer, rounds):
+    best_seconds = None
+    for offset in list(range(0, PAGES * PAGE_SIZE, PAGE_SIZE)) * rounds:
+        start = time.perf_counter()
+        serialize(queryset, serializer, offset)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds
+
+
+def run(rounds=5):
+    '''Report the best ms to fetch and serialize a page of each list both ways, and how many times faster values are'''
+    results = OrderedDict()
+    with seeded_catalogue(CATALOGUE_SETLISTS):
+        for name, model, serializer_class in SERIALIZED_LISTS:
+            queryset = model.objects.order_by('pk')
+            models_seconds = time_pages(serialize_models, queryset, serializer_class, rounds)
+            values_seconds = time_pages(serialize_values, queryset, ValuesSerializer(serializer_class), rounds)
+            results[f'{name} models_ms'] = round(models_seconds * 1000, 2)
+            results[f'{name} values_ms'] = round(values_seconds * 1000, 2)
+            results[f'{name} speedup'] = round(models_seconds / values_seconds, 1)
+    return results
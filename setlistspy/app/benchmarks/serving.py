@@ -0,0 +1,117 @@
+'''
+Throughput and latency of the gunicorn deployment under concurrent load, with its previous settings against its
+current ones.
+
+Each configuration is served by a single gevent worker pinned to the same CPU, started from gunicorn_config.py with
+its settings overridden through the environment, and loaded by CONCURRENCY clients at once with read requests over the
+database as it is. List offsets vary from request to request so that they miss the response caches and reach Postgres.
+'''
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.urls import reverse
+
+from setlistspy.app.benchmarks.search import get_percentile
+from setlistspy.app.models import DJ
+
+# Where gunicorn_config.py and the config package live
+PROJECT_PATH = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir)
+PORT = 6499
+CONCURRENCY = 50
+REQUESTS_PER_ROUND = 500
+STARTUP_TIMEOUT = 30
+REQUEST_TIMEOUT = 30
+
+# Environment overrides of gunicorn_config.py for each configuration
+SERVING_CONFIGS = OrderedDict([
+    ('legacy', {
+        'GUNICORN_WORKER_CONNECTIONS': '20',
+        'GUNICORN_MAX_REQUESTS': '100',
+        'GUNICORN_MAX_REQUESTS_JITTER': '50',
+        'GUNICORN_BACKLOG': '16',
+        'GUNICORN_PATCH_PSYCOPG': '0',
+    }),
+    ('current', {}),
+])
+
+
+def get_paths(rng, num_paths):
+    '''Return the paths of a random mix of list, retrieve and stats requests'''
+    dj_pks = list(DJ.objects.order_by('-num_setlists').values_list('pk', flat=True)[:100])
+    list_urls = [reverse(name) for name in ('dj-list', 'setlist-list', 'track-list', 'trackplay-list')]
+    paths = []
+    for _ in range(num_paths):
+        if dj_pks and rng.random() < 0.3:
+            basename = rng.choice(('dj-detail', 'dj-stats'))
+            paths.append(reverse(basename, kwargs={'pk': rng.choice(dj_pks).hex}))
+        else:
+            paths.append(f'{rng.choice(list_urls)}?limit=20&offset={rng.randrange(10000)}')
+    return paths
+
+
+def pin_to_first_cpu():
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+
+
+def start_server(overrides):
+    env = {**os.environ, **overrides, 'PORT': str(PORT)}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'config.wsgi', '-c', 'gunicorn_config.py', '--workers', '1'],
+        cwd=PROJECT_PATH, env=env, preexec_fn=pin_to_first_cpu,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{PORT}{reverse("dj-list")}', timeout=REQUEST_TIMEOUT)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    server.kill()
+    raise RuntimeError(f'gunicorn did not start listening on port {PORT} within {STARTUP_TIMEOUT}s')
+
+
+def fetch(path):
+    '''Return the (milliseconds, whether it succeeded) of a request'''
+    start = time.perf_counter()
+    try:
+        ok = requests.get(f'http://127.0.0.1:{PORT}{path}', timeout=REQUEST_TIMEOUT).status_code == 200
+    except requests.RequestException:
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+def run(rounds=5):
+    '''Report the best requests per second, p50 and p95 ms and share of failed requests of each configuration'''
+    results = OrderedDict()
+    for name, overrides in SERVING_CONFIGS.items():
+        server = start_server(overrides)
+        latencies = []
+        num_errors = 0
+        best_seconds = None
+        try:
+            with ThreadPoolExecutor(CONCURRENCY) as executor:
+                for seed in range(rounds):
+                    paths = get_paths(random.Random(seed), REQUESTS_PER_ROUND)
+                    start = time.perf_counter()
+                    responses = list(executor.map(fetch, paths))
+                    seconds = time.perf_counter() - start
+                    best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+                    latencies.extend(milliseconds for milliseconds, _ in responses)
+                    num_errors += sum(1 for _, ok in responses if not ok)
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        results[f'{name} requests_per_s'] = round(REQUESTS_PER_ROUND / best_seconds)
+        results[f'{name} p50_ms'] = round(get_percentile(latencies, 50), 2)
+        results[f'{name} p95_ms'] = round(get_percentile(latencies, 95), 2)
+        results[f'{name} error_rate'] = round(num_errors / len(latencies), 4)
+    return results
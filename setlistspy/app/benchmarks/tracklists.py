@@ -0,0 +1,35 @@
+import os
+import time
+from collections import OrderedDict
+
+from setlistspy.app.tracklists import TracklistMetrics, parse_tracklist
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'corpus', 'tracklists.txt')
+
+# Times the corpus is repeated per round, so a round takes long enough to time
+CORPUS_COPIES = 500
+
+
+def load_corpus():
+    '''Return the stripped lines of the MixesDB style tracklist wikitext corpus'''
+    with open(CORPUS_PATH, encoding='utf-8') as corpus:
+        return [line.strip() for line in corpus]
+
+
+def run(rounds=5):
+    '''Parse the corpus and report the best lines/sec over the rounds'''
+    lines = load_corpus() * CORPUS_COPIES
+    best_seconds = None
+    for _ in range(rounds):
+        metrics = TracklistMetrics()
+        start = time.perf_counter()
+        parse_tracklist(lines, metrics=metrics)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return OrderedDict([
+        ('lines', metrics.counts['lines']),
+        ('tracks', metrics.counts['tracks']),
+        ('irregular', metrics.counts['irregular']),
+        ('seconds', round(best_seconds, 4)),
+        ('lines/sec', round(metrics.counts['lines'] / best_seconds)),
+    ])
@@ -0,0 +1,279 @@
+'''
+Bulk loading of parsed setlists for full database seeds.
+
+Setlists are streamed into temporary staging tables with COPY FROM STDIN and merged into the app tables with a few
+set-based statements, so loading millions of track plays takes a handful of round trips rather than one per row.
+Setlists already loaded with the same xml_sha1 are left alone and changed ones get their track plays replaced.
+
+Each setlist is a dict of the features extracted by setlistspy.app.tasks.mixesdb.extract_setlist_features plus the
+name and url of its DJ, e.g.
+
+    {"dj_name": "Jeff Mills", "dj_url": "/w/Category:Jeff_Mills", "mixesdb_id": 1234, "title": "...",
+     "mixesdb_mod_time": "2019-05-01T12:00:00Z", "xml_sha1": "...", "b2b": false,
+     "tracklist_data": [{"artist_name": "...", "title": "...", "label_name": "..."}]}
+'''
+import tempfile
+import time
+
+from django.db import connection, transaction
+
+from setlistspy.app.cache import CACHED_MODELS, bump_generations
+from setlistspy.app.collaborations import update_collaborations
+from setlistspy.app.models import Artist, DJ, DJCollaboration, Label, Setlist, Track, TrackPlay
+from setlistspy.app.rollups import rebuild_rollups
+
+LOADED_MODELS = (DJ, Setlist, Artist, Label, Track, TrackPlay)
+
+# Postgres 10 has no gen_random_uuid() without the pgcrypto extension
+NEW_UUID_SQL = 'md5(random()::text || clock_timestamp()::text)::uuid'
+
+# Setlists spill over from memory to disk past this many bytes while their track plays are being copied
+SETLIST_SPOOL_SIZE = 64 * 1024 * 1024
+
+NAME_MAX_LENGTH = 255
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class CopyStream:
+    '''File-like object which feeds rows to COPY FROM STDIN in text format as they are generated'''
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = bytearray()
+        self.num_rows = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += encode_copy_row(row)
+            self.num_rows += 1
+        size = len(self.buffer) if size < 0 else size
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return chunk
+
+
+def encode_copy_row(row):
+    values = []
+    for value in row:
+        if value is None:
+            values.append('\\N')
+        elif isinstance(value, bool):
+            values.append('t' if value else 'f')
+        else:
+            values.append(str(value).translate(COPY_ESCAPES))
+    return ('\t'.join(values) + '\n').encode('utf-8')
+
+
+def bulk_load(setlists, defer_indexes=False):
+    '''
+    Load an iterable of setlists in one transaction and return the (step, number of rows, seconds) of each step.
+
+    With defer_indexes, the non-unique indexes of the loaded tables are dropped before the merge and rebuilt in one
+    pass at the end, which beats updating them row by row when loading into a nearly empty database.
+    '''
+    timings = []
+
+    def timed(step, execute):
+        start = time.perf_counter()
+        num_rows = execute()
+        timings.append((step, num_rows, time.perf_counter() - start))
+
+    with transaction.atomic(), connection.cursor() as cursor, \
+            tempfile.SpooledTemporaryFile(max_size=SETLIST_SPOOL_SIZE) as setlist_spool:
+        create_staging_tables(cursor)
+        timed('copy track plays', lambda: copy_track_plays(cursor, setlists, setlist_spool))
+        timed('copy setlists', lambda: copy_setlists(cursor, setlist_spool))
+        prepare_staging_tables(cursor)
+
+        dropped_indexes = drop_indexes(cursor, LOADED_MODELS) if defer_indexes else []
+        for step, sql in MERGE_STEPS:
+            timed(step, lambda: execute(cursor, sql))
+        merged_dj_keys = get_merged_dj_keys(cursor)
+        # Dropped on commit anyway, but the transaction may be nested in a longer one
+        cursor.execute('DROP TABLE stage_setlist, stage_play')
+        # Django's foreign keys are checked at commit, and indexes can't be built while those checks are pending
+        timed('check foreign keys', lambda: cursor.execute('SET CONSTRAINTS ALL IMMEDIATE'))
+        if dropped_indexes:
+            timed('rebuild indexes', lambda: create_indexes(cursor, dropped_indexes))
+
+        if any(num_rows for step, num_rows, _ in timings if step in PLAY_CHANGING_STEPS):
+            timed('rebuild rollups', rebuild_rollups)
+        if merged_dj_keys:
+            timed('update collaborations', lambda: update_collaborations(merged_dj_keys))
+        # Fresh planner statistics, and row estimates for the list counts
+        timed('analyze', lambda: analyze(cursor, LOADED_MODELS + (DJCollaboration,)))
+        # Bumped once committed, as other connections could cache the rows as they were until then
+        transaction.on_commit(lambda: bump_generations(*CACHED_MODELS))
+    return timings
+
+
+def create_staging_tables(cursor):
+    cursor.execute('''
+        CREATE TEMPORARY TABLE stage_setlist (
+            position integer, dj_url text, dj_name text, mixesdb_id integer, title text,
+            mixesdb_mod_time timestamp with time zone, xml_sha1 text, b2b boolean, setlist_key bigint
+        ) ON COMMIT DROP
+    ''')
+    cursor.execute('''
+        CREATE TEMPORARY TABLE stage_play (
+            setlist_position integer, set_order integer, artist_name text, title text, label_name text
+        ) ON COMMIT DROP
+    ''')
+
+
+def copy_track_plays(cursor, setlists, setlist_spool):
+    '''COPY the track plays into stage_play while spooling the setlists, which can't be copied at the same time'''
+    def get_play_rows():
+        for position, setlist in enumerate(setlists):
+            setlist_spool.write(encode_copy_row((
+                position, setlist['dj_url'], setlist['dj_name'][:NAME_MAX_LENGTH], setlist['mixesdb_id'],
+                setlist['title'][:NAME_MAX_LENGTH], setlist['mixesdb_mod_time'], setlist.get('xml_sha1'),
+                setlist.get('b2b'), None
+            )))
+            for set_order, track in enumerate(setlist['tracklist_data'], 1):
+                yield (position, set_order, track['artist_name'][:NAME_MAX_LENGTH], track['title'][:NAME_MAX_LENGTH],
+                       (track.get('label_name') or '')[:NAME_MAX_LENGTH] or None)
+
+    stream = CopyStream(get_play_rows())
+    cursor.copy_expert('COPY stage_play FROM STDIN', stream)
+    return stream.num_rows
+
+
+def copy_setlists(cursor, setlist_spool):
+    setlist_spool.seek(0)
+    cursor.copy_expert('COPY stage_setlist FROM STDIN', setlist_spool)
+    return cursor.rowcount
+
+
+def prepare_staging_tables(cursor):
+    # A setlist listed more than once is loaded as it was last listed
+    cursor.execute('''
+        DELETE FROM stage_setlist setlist USING stage_setlist later
+        WHERE later.dj_url = setlist.dj_url AND later.mixesdb_id = setlist.mixesdb_id
+            AND later.position > setlist.position
+    ''')
+    cursor.execute('CREATE INDEX ON stage_setlist (position)')
+    # Temporary tables are never auto-analyzed, and the merge plans depend on their sizes
+    cursor.execute('ANALYZE stage_setlist')
+    cursor.execute('ANALYZE stage_play')
+
+
+MERGE_STEPS = (
+    ('merge DJs', f'''
+        INSERT INTO {DJ._meta.db_table} (id, created_at, last_modified, name, url, xml_md5, num_setlists)
+        SELECT DISTINCT ON (dj_url) {NEW_UUID_SQL}, now(), now(), dj_name, dj_url, '', 0
+        FROM stage_setlist
+        ORDER BY dj_url, position DESC
+        ON CONFLICT (url) DO NOTHING
+    '''),
+    ('merge setlists', f'''
+        WITH merged AS (
+            INSERT INTO {Setlist._meta.db_table} AS setlist
+                (id, created_at, last_modified, dj_id, mixesdb_id, title, mixesdb_mod_time, xml_sha1, b2b, num_tracks)
+            SELECT {NEW_UUID_SQL}, now(), now(), dj.key, stage.mixesdb_id, stage.title, stage.mixesdb_mod_time,
+                stage.xml_sha1, stage.b2b, 0
+            FROM stage_setlist stage
+            JOIN {DJ._meta.db_table} dj ON dj.url = stage.dj_url
+            ON CONFLICT (dj_id, mixesdb_id) DO UPDATE SET
+                last_modified = EXCLUDED.last_modified,
+                title = EXCLUDED.title,
+                mixesdb_mod_time = EXCLUDED.mixesdb_mod_time,
+                xml_sha1 = EXCLUDED.xml_sha1,
+                b2b = EXCLUDED.b2b
+            WHERE setlist.xml_sha1 IS DISTINCT FROM EXCLUDED.xml_sha1
+            RETURNING setlist.key, setlist.dj_id, setlist.mixesdb_id
+        )
+        UPDATE stage_setlist stage SET setlist_key = merged.key
+        FROM merged
+        JOIN {DJ._meta.db_table} dj ON dj.key = merged.dj_id
+        WHERE stage.dj_url = dj.url AND stage.mixesdb_id = merged.mixesdb_id
+    '''),
+    # Only the track plays of new and changed setlists are loaded
+    ('skip unchanged setlists', '''
+        DELETE FROM stage_play play
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stage_setlist setlist
+            WHERE setlist.position = play.setlist_position AND setlist.setlist_key IS NOT NULL
+        )
+    '''),
+    ('merge artists', f'''
+        INSERT INTO {Artist._meta.db_table} (id, created_at, last_modified, name, total_plays)
+        SELECT {NEW_UUID_SQL}, now(), now(), artist_name, 0
+        FROM (SELECT DISTINCT artist_name FROM stage_play) artist
+        ON CONFLICT (name) DO NOTHING
+    '''),
+    ('merge labels', f'''
+        INSERT INTO {Label._meta.db_table} (id, created_at, last_modified, name, total_plays)
+        SELECT {NEW_UUID_SQL}, now(), now(), label_name, 0
+        FROM (SELECT DISTINCT label_name FROM stage_play WHERE label_name IS NOT NULL) label
+        ON CONFLICT (name) DO NOTHING
+    '''),
+    ('merge tracks', f'''
+        INSERT INTO {Track._meta.db_table} (id, created_at, last_modified, artist_id, title, num_plays)
+        SELECT {NEW_UUID_SQL}, now(), now(), artist.key, track.title, 0
+        FROM (SELECT DISTINCT artist_name, title FROM stage_play) track
+        JOIN {Artist._meta.db_table} artist ON artist.name = track.artist_name
+        ON CONFLICT (artist_id, title) DO NOTHING
+    '''),
+    ('delete replaced track plays', f'''
+        DELETE FROM {TrackPlay._meta.db_table} play
+        USING stage_setlist setlist
+        WHERE play.setlist_id = setlist.setlist_key
+    '''),
+    ('merge track plays', f'''
+        INSERT INTO {TrackPlay._meta.db_table}
+            (id, created_at, last_modified, track_id, setlist_id, set_order, label_id)
+        SELECT {NEW_UUID_SQL}, now(), now(), track.key, setlist.setlist_key, play.set_order, label.id
+        FROM stage_play play
+        JOIN stage_setlist setlist ON setlist.position = play.setlist_position
+        JOIN {Artist._meta.db_table} artist ON artist.name = play.artist_name
+        JOIN {Track._meta.db_table} track ON track.artist_id = artist.key AND track.title = play.title
+        LEFT JOIN {Label._meta.db_table} label ON label.name = play.label_name
+    '''),
+)
+
+PLAY_CHANGING_STEPS = ('delete replaced track plays', 'merge track plays')
+
+
+def get_merged_dj_keys(cursor):
+    '''Return the keys of the DJs whose setlists were added or changed, whose collaborations may have changed'''
+    cursor.execute(f'''
+        SELECT DISTINCT dj.key
+        FROM stage_setlist stage
+        JOIN {DJ._meta.db_table} dj ON dj.url = stage.dj_url
+        WHERE stage.setlist_key IS NOT NULL
+    ''')
+    return [key for key, in cursor.fetchall()]
+
+
+def execute(cursor, sql):
+    cursor.execute(sql)
+    return cursor.rowcount
+
+
+def drop_indexes(cursor, models):
+    '''Drop the indexes of the models' tables which nothing depends on, returning their definitions'''
+    # Primary keys and unique indexes stay, as the merge upserts against them
+    cursor.execute('''
+        SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid)
+        FROM pg_index
+        WHERE indrelid = ANY(%s::regclass[]) AND NOT indisprimary AND NOT indisunique
+    ''', [[model._meta.db_table for model in models]])
+    indexes = cursor.fetchall()
+    for index_name, _ in indexes:
+        cursor.execute(f'DROP INDEX {index_name}')
+    return [definition for _, definition in indexes]
+
+
+def analyze(cursor, models):
+    for model in models:
+        cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+
+def create_indexes(cursor, definitions):
+    for definition in definitions:
+        cursor.execute(definition)
@@ -0,0 +1,89 @@
+'''
+Generation based invalidation for cached API responses.
+
+Each cached model has a generation counter in the cache which is bumped whenever one of its rows changes. Cached
+responses fold the generations of the models they were built from into their cache key, so a change makes the old
+entries unreachable (they simply age out) without flushing anything else. Generations are read through the local
+tier of setlistspy.app.local_cache, as every cached request looks them up, and bumps invalidate them in every worker.
+
+Changes made in a transaction bump the generations right away, so the transaction reads its own writes, and once more
+when it commits, since other requests may have cached responses from the rows as they were until then.
+'''
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from setlistspy.app import local_cache
+from setlistspy.app.models import Artist, DJ, Label, Setlist, Track, TrackPlay
+
+CACHED_MODELS = (DJ, Setlist, Track, Artist, Label, TrackPlay)
+
+_deferred_bumps = threading.local()
+
+
+def get_generation_key(model):
+    return f'cache_generation:{model._meta.label_lower}'
+
+
+def get_generations(models):
+    '''Return {model: current generation}, starting a fresh generation for models that have none in the cache'''
+    keys = {get_generation_key(model): model for model in models}
+    generations = local_cache.get_many(keys.keys())
+    for key in keys.keys() - generations.keys():
+        cache.add(key, _new_generation(), timeout=None)
+        generations[key] = local_cache.get(key)
+    return {model: generations[key] for key, model in keys.items()}
+
+
+def get_generation_key_prefix(models):
+    '''Return a cache key prefix which changes whenever a row of any of the models changes'''
+    generations = get_generations(models)
+    generations_signature = ':'.join(f'{model._meta.model_name}.{generations[model]}'
+                                     for model in sorted(generations, key=lambda model: model._meta.model_name))
+    return hashlib.md5(generations_signature.encode('utf-8')).hexdigest()
+
+
+def bump_generations(*models):
+    '''Invalidate every cached response built from the models, or defer it to the end of a batch'''
+    deferred_models = getattr(_deferred_bumps, 'models', None)
+    if deferred_models is not None:
+        deferred_models.update(models)
+        return
+    keys = [get_generation_key(model) for model in models]
+    _bump(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No generation yet or it was evicted; start one that can't collide with an earlier one
+            cache.add(key, _new_generation(), timeout=None)
+    if keys:
+        local_cache.invalidate(*keys)
+
+
+@contextmanager
+def batch_invalidation():
+    '''Collect generation bumps, e.g. over an ingest batch, and apply each of them once at the end'''
+    if getattr(_deferred_bumps, 'models', None) is not None:
+        # Already batching
+        yield
+        return
+    _deferred_bumps.models = set()
+    try:
+        yield
+    finally:
+        models, _deferred_bumps.models = _deferred_bumps.models, None
+        bump_generations(*models)
+
+
+def _new_generation():
+    return int(time.time() * 1000)
@@ -0,0 +1,93 @@
+'''
+Precomputed b2b collaboration graph of DJs, backing /api/djs/{id}/collaborators/ and the b2b collaborators of the DJ
+stats.
+
+A DJ's b2b setlist is listed on MixesDB under every DJ on deck, as setlists sharing its mixesdb_id, so each DJ has an
+edge to each other DJ listed on the pages of their b2b setlists, weighted by the number of those setlists. Edges are
+recomputed for the DJs whose setlists were written, which only reads those DJs' pages, rather than the graph being
+worked out from the setlists on every request.
+'''
+from collections import OrderedDict
+
+from django.db import connection
+
+from setlistspy.app.models import DJ, DJCollaboration, Setlist
+from setlistspy.app.utils import batched
+
+COLLABORATION_TABLE = DJCollaboration._meta.db_table
+DJ_TABLE, SETLIST_TABLE = DJ._meta.db_table, Setlist._meta.db_table
+
+# Edges from the DJs of b2b setlists to the other DJs listed on the same pages, restricted by the condition
+COLLABORATIONS_SQL = f'''
+    SELECT setlist.dj_id, other.dj_id, COUNT(*)
+    FROM {SETLIST_TABLE} setlist
+    JOIN {SETLIST_TABLE} other ON other.mixesdb_id = setlist.mixesdb_id AND other.dj_id <> setlist.dj_id
+    WHERE setlist.b2b {{condition}}
+    GROUP BY setlist.dj_id, other.dj_id
+'''
+
+# Any edge from or to the DJs is between DJs listed on one of their pages
+DJ_COLLABORATIONS_CONDITION = f'''
+    AND setlist.mixesdb_id IN (SELECT mixesdb_id FROM {SETLIST_TABLE} WHERE dj_id = ANY(%(dj_keys)s::bigint[]))
+    AND (setlist.dj_id = ANY(%(dj_keys)s::bigint[]) OR other.dj_id = ANY(%(dj_keys)s::bigint[]))
+'''
+
+
+def update_collaborations(dj_keys):
+    '''Recompute the edges from and to the DJs whose setlists changed, returning the number of edges written'''
+    num_edges = 0
+    with connection.cursor() as cursor:
+        for batch in batched(dj_keys):
+            cursor.execute(f'''
+                DELETE FROM {COLLABORATION_TABLE}
+                WHERE dj_id = ANY(%(dj_keys)s::bigint[]) OR collaborator_id = ANY(%(dj_keys)s::bigint[])
+            ''', {'dj_keys': list(batch)})
+            cursor.execute(f'''
+                INSERT INTO {COLLABORATION_TABLE} (dj_id, collaborator_id, num_setlists)
+                {COLLABORATIONS_SQL.format(condition=DJ_COLLABORATIONS_CONDITION)}
+            ''', {'dj_keys': list(batch)})
+            num_edges += cursor.rowcount
+    return num_edges
+
+
+def rebuild_collaborations():
+    '''Recompute the whole graph from scratch, returning the number of edges'''
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COLLABORATION_TABLE}')
+        cursor.execute(f'''
+            INSERT INTO {COLLABORATION_TABLE} (dj_id, collaborator_id, num_setlists)
+            {COLLABORATIONS_SQL.format(condition='')}
+        ''')
+        return cursor.rowcount
+
+
+def get_collaborators(dj_key, hops=1, limit=None):
+    '''
+    Return the DJ's collaborators, by descending weight, as {id, name, hops, weight} dicts. The weight of a direct
+    collaborator is the number of b2b setlists they share. With 2 hops, the collaborators of those collaborators
+    follow, weighted by the sum over the collaborators in common of the fewer setlists of the two edges through each.
+    '''
+    two_hops_sql = f'''
+        UNION ALL
+        SELECT second.collaborator_id, 2, SUM(LEAST(direct.num_setlists, second.num_setlists))
+        FROM direct
+        JOIN {COLLABORATION_TABLE} second ON second.dj_id = direct.collaborator_id
+        WHERE second.collaborator_id <> %(dj_key)s
+            AND second.collaborator_id NOT IN (SELECT collaborator_id FROM direct)
+        GROUP BY second.collaborator_id
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH direct AS (
+                SELECT collaborator_id, num_setlists FROM {COLLABORATION_TABLE} WHERE dj_id = %(dj_key)s
+            )
+            SELECT dj.id, dj.name, collaborator.hops, collaborator.weight
+            FROM (
+                SELECT collaborator_id, 1 AS hops, num_setlists AS weight FROM direct
+                {two_hops_sql if hops > 1 else ''}
+            ) collaborator
+            JOIN {DJ_TABLE} dj ON dj.key = collaborator.collaborator_id
+            ORDER BY collaborator.hops, collaborator.weight DESC, dj.name
+            {'LIMIT %(limit)s' if limit else ''}
+        ''', {'dj_key': dj_key, 'limit': limit})
+        return [OrderedDict(zip(('id', 'name', 'hops', 'weight'), row)) for row in cursor.fetchall()]
@@ -0,0 +1,102 @@
+'''
+Streaming bulk exports of list endpoints as newline delimited JSON or CSV, e.g. /api/plays/?format=ndjson.
+
+An export streams every row of the filtered list as a flat row of the viewset's export_fields, straight from
+.values_list() without instantiating models or running serializers, and reads them from Postgres through a server side
+cursor in chunks, so that the memory it takes stays the same however many rows there are.
+'''
+import csv
+import io
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class NDJSONRenderer(BaseRenderer):
+    '''Renders the responses of ?format=ndjson other than exports, such as errors, as a single JSON line'''
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+class CSVRenderer(BaseRenderer):
+    '''Renders the responses of ?format=csv other than exports, such as a single object or error, as CSV'''
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        rows = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if rows and isinstance(rows[0], dict):
+            writer.writerow(rows[0].keys())
+            writer.writerows([get_csv_value(value) for value in row.values()] for row in rows)
+        else:
+            writer.writerows([get_csv_value(value)] for value in rows)
+        return buffer.getvalue()
+
+
+EXPORT_RENDERERS = {renderer.format: renderer for renderer in (NDJSONRenderer, CSVRenderer)}
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def get_csv_value(value):
+    # Datetimes and UUIDs as they appear in the JSON responses
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return _encoder.default(value)
+
+
+class Echo:
+    '''File-like object returning what is written to it, to have csv.writer format rows one at a time'''
+
+    def write(self, value):
+        return value
+
+
+def iterate_chunks(rows):
+    '''
+    Yield lists of up to EXPORT_CHUNK_SIZE rows. The rows are only fetched once the response is streamed, after
+    ATOMIC_REQUESTS committed the view's transaction, so that Django declares their server side cursor WITH HOLD and
+    it stays open for the whole export.
+    '''
+    iterator = rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    chunk = list(itertools.islice(iterator, EXPORT_CHUNK_SIZE))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, EXPORT_CHUNK_SIZE))
+
+
+def generate_ndjson(columns, rows):
+    for chunk in iterate_chunks(rows):
+        yield ''.join(_encoder.encode(dict(zip(columns, row))) + '\n' for row in chunk)
+
+
+def generate_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for chunk in iterate_chunks(rows):
+        yield ''.join(writer.writerow([get_csv_value(value) for value in row]) for row in chunk)
+
+
+def stream_export(queryset, export_fields, format, filename):
+    '''Return a response streaming the queryset's rows, as (column, field lookup) export_fields, in the format'''
+    columns = [column for column, _ in export_fields]
+    rows = queryset.values_list(*(lookup for _, lookup in export_fields))
+    generate = generate_csv if format == CSVRenderer.format else generate_ndjson
+    renderer = EXPORT_RENDERERS[format]
+    response = StreamingHttpResponse(generate(columns, rows), content_type=f'{renderer.media_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{format}"'
+    return response
@@ -1,20 +1,93 @@
+from django.db.models import Exists, OuterRef
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.sql.where import AND
 import rest_framework_filters as filters
 from rest_framework_filters.filters import BooleanFilter, CharFilter
+from rest_framework_filters.filterset import related
 
 from setlistspy.app.models import Artist, DJ, Label, Setlist, Track, TrackPlay
-
-
-class ArtistFilter(filters.FilterSet):
+from setlistspy.app.search import search_queryset
+
+
+def filter_exists(queryset, subquery, negated=False):
+    '''
+    Filter a queryset on [NOT] EXISTS (subquery). Django 2.2 only filters on an annotated Exists, as
+    EXISTS (...) = true, which Postgres runs as a subplan per row rather than planning it as a semi-join.
+    '''
+    queryset = queryset.all()
+    queryset.query.where.add(Exists(subquery, negated=negated).resolve_expression(queryset.query), AND)
+    return queryset
+
+
+def get_correlation(model, field_name):
+    '''
+    Return the lookup which correlates rows of the model related through field_name to an outer row of the model,
+    comparing the foreign key column with the field it references (e.g. a surrogate key) to spare a join
+    '''
+    field = model._meta.get_field(field_name)
+    if field.many_to_many:
+        # E.g. Track.setlists is correlated through the TrackPlay.track of the setlists' track plays
+        m2m_field = field if field.concrete else field.field
+        through_fields = m2m_field.remote_field.through._meta
+        if field.concrete:
+            target_field = through_fields.get_field(m2m_field.m2m_field_name()).target_field
+            return {f'{field.related_query_name()}__{target_field.name}': OuterRef(target_field.attname)}
+        target_field = through_fields.get_field(m2m_field.m2m_reverse_field_name()).target_field
+        return {f'{m2m_field.name}__{target_field.name}': OuterRef(target_field.attname)}
+    if field.concrete:
+        return {field.target_field.attname: OuterRef(field.attname)}
+    # Reverse relation, e.g. Track.plays is correlated through TrackPlay.track
+    return {field.field.attname: OuterRef(field.field.target_field.attname)}
+
+
+class SetSpyFilterSet(filters.FilterSet):
+    '''
+    Applies related filters as correlated EXISTS subqueries, e.g. ?plays__setlist__dj__name= on tracks as EXISTS
+    (play of the track whose setlist EXISTS (with the DJ)), which Postgres plans as semi-joins. Unlike the default
+    IN (subquery) over a join to the related table, they can't duplicate rows, so lists need no DISTINCT.
+    '''
+    # Off for the library's IN (subquery), which the filters benchmark compares against
+    exists_related_filters = True
+
+    def filter_related_filtersets(self, queryset):
+        for related_name, related_filterset in self.related_filtersets.items():
+            # Related filtersets should only be applied if they had data.
+            prefix = f'{related(self, related_name)}{LOOKUP_SEP}'
+            if not any(value.startswith(prefix) for value in self.data):
+                continue
+
+            field_name = self.filters[related_name].field_name
+            if self.exists_related_filters:
+                correlation = get_correlation(queryset.model, field_name)
+                queryset = filter_exists(queryset, related_filterset.qs.filter(**correlation))
+            else:
+                # The library selects the pk, which foreign keys to a surrogate key don't hold, so let the IN lookup
+                # select the referenced field itself
+                queryset = queryset.filter(**{f'{field_name}{LOOKUP_SEP}in': related_filterset.qs})
+        return queryset
+
+
+class SearchFilterSet(SetSpyFilterSet):
+    '''Adds a ?search= filter returning the rows whose search field contains or resembles it, best matches first'''
+    search = CharFilter(method='filter_search')
+    search_field_name = 'name'
+
+    def filter_search(self, qs, name, value):
+        return search_queryset(qs, self.search_field_name, value)
+
+
+class ArtistFilter(SearchFilterSet):
     name = CharFilter(field_name='name', lookup_expr='iexact')
 
     class Meta:
         model = Artist
         fields = {
             'name': ['iexact', 'in', 'startswith', 'icontains'],
+            'total_plays': ['exact', 'gte', 'lte'],
         }
 
 
-class LabelFilter(filters.FilterSet):
+class LabelFilter(SearchFilterSet):
     name = CharFilter(field_name='name', lookup_expr='iexact')
     track_plays = filters.RelatedFilter('TrackPlayFilter', field_name='track_plays', queryset=TrackPlay.objects.all())
 
@@ -22,10 +95,11 @@ class LabelFilter(filters.FilterSet):
         model = Label
         fields = {
             'name': ['iexact', 'in', 'startswith', 'icontains'],
+            'total_plays': ['exact', 'gte', 'lte'],
         }
 
 
-class DJFilter(filters.FilterSet):
+class DJFilter(SearchFilterSet):
     name = CharFilter(field_name='name', lookup_expr='iexact')
     setlists = filters.RelatedFilter('SetlistFilter', field_name='setlists', queryset=Setlist.objects.all())
 
@@ -33,17 +107,19 @@ class DJFilter(filters.FilterSet):
         model = DJ
         fields = {
             'name': ['iexact', 'in', 'startswith', 'icontains'],
+            'num_setlists': ['exact', 'gte', 'lte'],
         }
 
 
-class SetlistFilter(filters.FilterSet):
+class SetlistFilter(SearchFilterSet):
     title = CharFilter(field_name='title', lookup_expr='iexact')
+    search_field_name = 'title'
     dj = filters.RelatedFilter('DJFilter', field_name='dj', queryset=DJ.objects.all())
     track_plays = filters.RelatedFilter('TrackPlayFilter', field_name='track_plays', queryset=TrackPlay.objects.all())
     empty = BooleanFilter(field_name='empty', method='filter_empty')
 
     def filter_empty(self, qs, name, value):
-        return qs.filter(track_plays__isnull=value)
+        return qs.filter(num_tracks=0) if value else qs.filter(num_tracks__gt=0)
 
     class Meta:
         model = Setlist
@@ -52,11 +128,13 @@ class SetlistFilter(filters.FilterSet):
             'title': ['iexact', 'in', 'startswith', 'icontains'],
             'mixesdb_id': ['exact', 'in'],
             'b2b': ['exact'],
+            'num_tracks': ['exact', 'gte', 'lte'],
         }
 
 
-class TrackFilter(filters.FilterSet):
+class TrackFilter(SearchFilterSet):
     title = CharFilter(field_name='title', lookup_expr='iexact')
+    search_field_name = 'title'
     artist = filters.RelatedFilter('ArtistFilter', field_name='artist', queryset=Artist.objects.all())
     setlists = filters.RelatedFilter('SetlistFilter', field_name='setlists', queryset=Setlist.objects.all())
     plays = filters.RelatedFilter('TrackPlayFilter', field_name='plays', queryset=TrackPlay.objects.all())
@@ -65,10 +143,11 @@ class TrackFilter(filters.FilterSet):
         model = Track
         fields = {
             'title': ['iexact', 'in', 'startswith', 'icontains'],
+            'num_plays': ['exact', 'gte', 'lte'],
         }
 
 
-class TrackPlayFilter(filters.FilterSet):
+class TrackPlayFilter(SetSpyFilterSet):
     label = filters.RelatedFilter('LabelFilter', field_name='label', queryset=Label.objects.all())
     track = filters.RelatedFilter('TrackFilter', field_name='track', queryset=Track.objects.all())
     setlist = filters.RelatedFilter('SetlistFilter', field_name='setlist', queryset=Setlist.objects.all())
@@ -77,4 +156,4 @@ class TrackPlayFilter(filters.FilterSet):
         model = TrackPlay
         fields = {
             'set_order': ['exact', 'in']
-        }
\ No newline at end of file
+        }
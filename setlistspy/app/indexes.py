@@ -0,0 +1,65 @@
+'''
+Index usage and size of the app's tables, from the pg_stat_user_indexes statistics Postgres keeps since they were
+last reset.
+
+An index is reported as redundant when another btree index on the same table starts with the same columns in the same
+order, with the same operator classes and sort orders, as any lookup or ordered scan it serves can be served by that
+other index instead. Unique and primary key
+indexes are never redundant, as they enforce constraints.
+'''
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import connection
+
+IndexUsage = namedtuple('IndexUsage', (
+    'table', 'name', 'columns', 'scans', 'tuples_read', 'size', 'unique', 'redundant_with',
+))
+
+INDEX_USAGE_SQL = '''
+    SELECT stats.relname, stats.indexrelname, pg_get_indexdef(stats.indexrelid), stats.idx_scan, stats.idx_tup_read,
+        pg_relation_size(stats.indexrelid), idx.indisunique OR idx.indisprimary, idx.indkey::text, idx.indclass::text,
+        idx.indoption::text, idx.indexprs IS NULL AND idx.indpred IS NULL AND am.amname = 'btree'
+    FROM pg_stat_user_indexes stats
+    JOIN pg_index idx ON idx.indexrelid = stats.indexrelid
+    JOIN pg_class rel ON rel.oid = stats.indexrelid
+    JOIN pg_am am ON am.oid = rel.relam
+    WHERE stats.relname = ANY(%s)
+    ORDER BY stats.relname, pg_relation_size(stats.indexrelid) DESC
+'''
+
+
+def get_app_tables():
+    return [model._meta.db_table for model in apps.get_app_config('app').get_models()]
+
+
+def get_index_usage(tables=None):
+    '''Return the IndexUsage of every index on the tables (the app's tables by default), largest first per table'''
+    with connection.cursor() as cursor:
+        cursor.execute(INDEX_USAGE_SQL, [list(tables or get_app_tables())])
+        rows = cursor.fetchall()
+
+    # {table: [(index name, [(column number, operator class, sort option)], unique)]} of the plain btree indexes
+    plain_indexes = {}
+    for table, name, _, _, _, _, unique, column_numbers, column_classes, column_options, plain in rows:
+        if plain:
+            columns = list(zip(column_numbers.split(), column_classes.split(), column_options.split()))
+            plain_indexes.setdefault(table, []).append((name, columns, unique))
+
+    usages = []
+    for table, name, definition, scans, tuples_read, size, unique, column_numbers, column_classes, column_options, \
+            plain in rows:
+        columns = list(zip(column_numbers.split(), column_classes.split(), column_options.split()))
+        redundant_with = None
+        if plain and not unique:
+            redundant_with = next((
+                other_name for other_name, other_columns, other_unique in plain_indexes[table]
+                if other_name != name and other_columns[:len(columns)] == columns
+                # Of two identical plain indexes, only the one named last is redundant
+                and (len(other_columns) > len(columns) or other_unique or other_name < name)
+            ), None)
+        usages.append(IndexUsage(
+            table, name, definition[definition.index('(') + 1:definition.rindex(')')], scans, tuples_read, size,
+            unique, redundant_with,
+        ))
+    return usages
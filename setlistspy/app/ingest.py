@@ -0,0 +1,147 @@
+'''
+Set-based ingestion of parsed setlists.
+
+Takes setlist features as extracted by setlistspy.app.tasks.mixesdb.extract_setlist_features and saves a whole batch
+of setlists with their artists, labels, tracks and track plays in a handful of queries, however many tracks it has.
+Bulk writes bypass the model signals, so the play count rollups, collaboration graph and cache generations are updated
+here instead.
+'''
+import uuid
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from setlistspy.app.base_model import assign_keys, get_key_field
+from setlistspy.app.cache import batch_invalidation, bump_generations
+from setlistspy.app.collaborations import update_collaborations
+from setlistspy.app.models import Artist, DJ, Label, Setlist, Track, TrackPlay
+from setlistspy.app.rollups import update_play_counters, update_rollups
+from setlistspy.app.utils import BATCH_SIZE, batched
+
+SETLIST_FIELDS = ('title', 'mixesdb_mod_time', 'xml_sha1', 'b2b')
+
+
+def ingest_setlists(dj, setlists_features):
+    '''Save the new and changed setlists of a DJ along with their tracklists, skipping the unchanged ones'''
+    setlists_features = {features['mixesdb_id']: features for features in setlists_features}
+    with transaction.atomic(), batch_invalidation():
+        saved_setlists = {
+            setlist.mixesdb_id: setlist
+            for setlist in Setlist.objects.filter(dj=dj, mixesdb_id__in=setlists_features.keys())
+        }
+        new_setlists, changed_setlists, tracklists = [], [], {}
+        for mixesdb_id, features in setlists_features.items():
+            setlist = saved_setlists.get(mixesdb_id)
+            if setlist is None:
+                setlist = Setlist(dj=dj, mixesdb_id=mixesdb_id)
+                new_setlists.append(setlist)
+            elif setlist.xml_sha1 != features['xml_sha1']:
+                setlist.last_modified = timezone.now()
+                changed_setlists.append(setlist)
+            else:
+                continue
+            for field_name in SETLIST_FIELDS:
+                setattr(setlist, field_name, features[field_name])
+            tracklists[setlist] = features['tracklist_data']
+
+        assign_keys(new_setlists)
+        Setlist.objects.bulk_create(new_setlists, batch_size=BATCH_SIZE)
+        Setlist.objects.bulk_update(changed_setlists, SETLIST_FIELDS + ('last_modified',), batch_size=BATCH_SIZE)
+        if tracklists:
+            update_collaborations([dj.key])
+            bump_generations(Setlist)
+            ingest_tracklists(tracklists)
+    return list(tracklists.keys())
+
+
+def ingest_tracklists(tracklists):
+    '''Replace the track plays of setlists with their parsed tracklists, given as {setlist: [track features]}'''
+    track_features = [features for tracklist in tracklists.values() for features in tracklist]
+    with transaction.atomic(), batch_invalidation():
+        artist_keys = get_or_create_by_name(Artist, {features['artist_name'] for features in track_features})
+        label_ids = get_or_create_by_name(Label, {features['label_name'] for features in track_features
+                                                  if features.get('label_name')})
+        track_keys = get_or_create_tracks({(artist_keys[features['artist_name']], features['title'])
+                                           for features in track_features})
+
+        # Every current play of the setlists is either overwritten or deleted below
+        play_deltas = Counter()
+        replaced_track_keys = set()
+        for dj_key, artist_key, label_id, track_key in TrackPlay.objects.filter(setlist__in=tracklists.keys())\
+                .values_list('setlist__dj', 'track__artist', 'label', 'track'):
+            play_deltas[(dj_key, artist_key, label_id)] -= 1
+            replaced_track_keys.add(track_key)
+
+        now = timezone.now()
+        play_rows = []
+        for setlist, tracklist in tracklists.items():
+            for set_order, features in enumerate(tracklist, 1):
+                artist_key = artist_keys[features['artist_name']]
+                label_id = label_ids.get(features.get('label_name'))
+                play_rows.append((uuid.uuid4(), now, now, track_keys[(artist_key, features['title'])], setlist.key,
+                                  set_order, label_id))
+                play_deltas[(setlist.dj_id, artist_key, label_id)] += 1
+
+        with connection.cursor() as cursor:
+            upsert_track_plays(cursor, play_rows)
+            delete_track_plays_after(cursor, [(setlist.key, len(tracklist))
+                                              for setlist, tracklist in tracklists.items()])
+        update_rollups(play_deltas)
+        update_play_counters([setlist.key for setlist in tracklists], replaced_track_keys | set(track_keys.values()))
+        bump_generations(Artist, DJ, Label, Setlist, Track, TrackPlay)
+
+
+def get_or_create_by_name(model, names):
+    '''
+    Return {name: key} of the artists or labels with the names, creating the missing ones, where the key is what
+    foreign keys to the model reference
+    '''
+    key_name = get_key_field(model).name
+    instances = [model(name=name) for name in names]
+    assign_keys(instances)
+    model.objects.bulk_create(instances, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    keys = {}
+    for batch in batched(names):
+        keys.update(model.objects.filter(name__in=batch).values_list('name', key_name))
+    return keys
+
+
+def get_or_create_tracks(artist_titles):
+    '''Return {(artist key, title): key} of the tracks, creating the missing ones'''
+    tracks = [Track(artist_id=artist_key, title=title) for artist_key, title in artist_titles]
+    assign_keys(tracks)
+    Track.objects.bulk_create(tracks, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    keys = {}
+    for batch in batched(artist_titles):
+        artist_keys, titles = {artist_key for artist_key, title in batch}, {title for artist_key, title in batch}
+        for artist_key, title, key in Track.objects.filter(artist_id__in=artist_keys, title__in=titles)\
+                .values_list('artist_id', 'title', 'key'):
+            keys[(artist_key, title)] = key
+    return keys
+
+
+def upsert_track_plays(cursor, play_rows):
+    '''Insert (id, created_at, last_modified, track key, setlist key, set_order, label_id) rows of track plays,
+    overwriting the track and label of the plays already at the same place in a setlist'''
+    table = TrackPlay._meta.db_table
+    for batch in batched(play_rows):
+        cursor.execute(f'''
+            INSERT INTO {table} (id, created_at, last_modified, track_id, setlist_id, set_order, label_id)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))}
+            ON CONFLICT (setlist_id, set_order) DO UPDATE SET
+                track_id = EXCLUDED.track_id,
+                label_id = EXCLUDED.label_id,
+                last_modified = EXCLUDED.last_modified
+        ''', [param for row in batch for param in row])
+
+
+def delete_track_plays_after(cursor, setlist_lengths):
+    '''Delete the track plays past the end of setlists whose tracklists got shorter, given (setlist key, length)'''
+    table = TrackPlay._meta.db_table
+    for batch in batched(setlist_lengths):
+        cursor.execute(f'''
+            DELETE FROM {table} play
+            USING (VALUES {', '.join(['(%s::bigint, %s)'] * len(batch))}) AS tracklist (setlist_id, length)
+            WHERE play.setlist_id = tracklist.setlist_id AND play.set_order > tracklist.length
+        ''', [param for setlist_length in batch for param in setlist_length])
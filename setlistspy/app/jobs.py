@@ -0,0 +1,67 @@
+'''
+Cached stats responses, refreshed in the background by django-cacheback.
+
+A stats response is cached per serializer and object, along with the cache generations (see setlistspy.app.cache) it
+was computed at. Once those change, i.e. rows were written through the ORM, or the response outlives
+STATS_CACHE_LIFETIME, e.g. because rows were loaded behind the ORM's back, the stale response is still served while a
+Celery task recomputes it, so no request has to wait for it.
+'''
+from cacheback.base import Job
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+
+from setlistspy.app.cache import CACHED_MODELS, get_generation_key_prefix
+from setlistspy.app.profiling import cache_lookup, record_cache_miss, timed_serialization
+
+STATS_CACHE_LIFETIME = getattr(settings, 'STATS_CACHE_LIFETIME', 60 * 60)
+
+# Sorted set of '{serializer path}:{pk}' members scored by the number of times their stats were requested
+STATS_REQUESTS_KEY = 'stats_requests'
+
+
+class StatsJob(Job):
+    lifetime = STATS_CACHE_LIFETIME
+    task_options = {'queue': 'celery'}
+
+    def fetch(self, serializer_path, pk):
+        '''Return the generation the stats are computed at along with them'''
+        record_cache_miss()
+        generation = get_generation_key_prefix(CACHED_MODELS)
+        serializer_class = import_string(serializer_path)
+        queryset = serializer_class.Meta.model.objects.all()
+        if hasattr(serializer_class, 'setup_queryset'):
+            queryset = serializer_class.setup_queryset(queryset, {})
+        instance = queryset.get(pk=pk)
+        with timed_serialization():
+            return generation, dict(serializer_class(instance, context={}).data)
+
+
+def get_serializer_path(serializer_class):
+    return f'{serializer_class.__module__}.{serializer_class.__name__}'
+
+
+def get_cached_stats(serializer_class, instance):
+    '''Return the stats of an instance as serialized by the serializer class, from the cache when possible'''
+    serializer_path, pk = get_serializer_path(serializer_class), str(instance.pk)
+    get_redis_connection().zincrby(STATS_REQUESTS_KEY, 1, f'{serializer_path}:{pk}')
+    job = StatsJob()
+    with cache_lookup():
+        generation, stats = job.get(serializer_path, pk)
+    # Refreshed at most once per refresh timeout however often the catalogue changes in the meantime
+    if generation != get_generation_key_prefix(CACHED_MODELS) and \
+            cache.add(f'{job.key(serializer_path, pk)}:refreshing', True, job.refresh_timeout):
+        job.invalidate(serializer_path, pk)
+    return stats
+
+
+def get_most_requested_stats(limit):
+    '''Return the (serializer path, pk) of the most requested stats responses'''
+    members = get_redis_connection().zrevrange(STATS_REQUESTS_KEY, 0, limit - 1)
+    return [member.decode('utf-8').rsplit(':', 1) for member in members]
+
+
+def forget_least_requested_stats(keep):
+    '''Trim the request counts down to the most requested stats responses'''
+    get_redis_connection().zremrangebyrank(STATS_REQUESTS_KEY, 0, -(keep + 1))
@@ -0,0 +1,185 @@
+'''
+Two-tier cache: a bounded in-process LRU tier in front of the Redis cache, for the small values every request looks up,
+such as the cache generations and popular DJs, artists and labels.
+
+Values are read from the local tier of the worker, then from Redis, and kept in the local tier for at most
+LOCAL_CACHE_TTL seconds. Changing a value in Redis goes with invalidate(), which publishes the keys to drop from the
+local tier of every worker on a Redis channel each process listens to from a background thread (a greenlet under
+gevent). The local tier is cleared whenever that subscription starts over, since invalidations may have been missed
+in between.
+
+Each process counts the lookups served by each tier and adds them up in Redis every STATS_FLUSH_INTERVAL seconds,
+for ./manage.py cache_stats to report the hit ratios of every worker put together.
+'''
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis import get_redis_connection
+
+LOCAL_CACHE_MAX_ENTRIES = getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', 1000)
+LOCAL_CACHE_TTL = getattr(settings, 'LOCAL_CACHE_TTL', 60)
+INVALIDATION_CHANNEL = 'local_cache_invalidation'
+# Hash of the number of lookups served by each tier, or missed by both, across every worker
+STATS_KEY = 'local_cache_stats'
+STATS_FLUSH_INTERVAL = 60
+# Longest the first lookup of a process waits for its invalidations to be listened to
+SUBSCRIBE_TIMEOUT = 1
+TIERS = ('local', 'redis', 'miss')
+
+logger = logging.getLogger(__name__)
+
+_missing = object()
+
+
+class LRUCache:
+    '''Thread safe cache of at most max_entries values, evicting the least recently used, which expire after ttl'''
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            value, expiry = entry
+            if expiry < time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = LRUCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL)
+_listener_lock = threading.Lock()
+_listener_pid = None
+_subscribed = threading.Event()
+_counts = dict.fromkeys(TIERS, 0)
+_last_flush = time.monotonic()
+
+
+def get(key, default=None):
+    return get_many([key]).get(key, default)
+
+
+def get_many(keys):
+    '''Return {key: value} of the keys found in either tier'''
+    ensure_listening()
+    values = {}
+    for key in keys:
+        value = _local.get(key, _missing)
+        if value is not _missing:
+            values[key] = value
+    count('local', len(values))
+    missing_keys = [key for key in keys if key not in values]
+    if missing_keys:
+        redis_values = cache.get_many(missing_keys)
+        for key, value in redis_values.items():
+            _local.set(key, value)
+        values.update(redis_values)
+        count('redis', len(redis_values))
+        count('miss', len(missing_keys) - len(redis_values))
+    return values
+
+
+def set(key, value, timeout=DEFAULT_TIMEOUT):
+    '''Set a value which wasn't in the cache yet, e.g. one whose key changes along with it'''
+    cache.set(key, value, timeout)
+    _local.set(key, value)
+
+
+def invalidate(*keys):
+    '''Drop the keys, whose values changed in Redis, from the local tier of every worker'''
+    for key in keys:
+        _local.delete(key)
+    get_redis_connection().publish(INVALIDATION_CHANNEL, json.dumps(keys))
+
+
+def ensure_listening():
+    '''Listen to invalidations from the current process, e.g. once a gunicorn worker has been forked'''
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            _listener_pid = os.getpid()
+            _subscribed.clear()
+            threading.Thread(target=listen, name='local-cache-invalidation', daemon=True).start()
+            _subscribed.wait(SUBSCRIBE_TIMEOUT)
+
+
+def listen():
+    while True:
+        try:
+            pubsub = get_redis_connection().pubsub()
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                if message['type'] == 'subscribe':
+                    # Including the values inherited from a parent process
+                    _local.clear()
+                    _subscribed.set()
+                elif message['type'] == 'message':
+                    for key in json.loads(message['data']):
+                        _local.delete(key)
+        except Exception:
+            logger.exception('Lost the local cache invalidation channel, subscribing again')
+            time.sleep(1)
+
+
+def count(tier, num_lookups):
+    global _last_flush
+    _counts[tier] += num_lookups
+    if time.monotonic() - _last_flush >= STATS_FLUSH_INTERVAL:
+        _last_flush = time.monotonic()
+        flush_stats()
+
+
+def flush_stats():
+    '''Add the lookups counted by this process to the counts of every worker'''
+    counts = {tier: _counts[tier] for tier in TIERS if _counts[tier]}
+    for tier in counts:
+        _counts[tier] -= counts[tier]
+    if counts:
+        pipeline = get_redis_connection().pipeline()
+        for tier, num_lookups in counts.items():
+            pipeline.hincrby(STATS_KEY, tier, num_lookups)
+        pipeline.execute()
+
+
+def get_stats():
+    '''Return {tier: (lookups, share of all lookups)} of every worker since the counts were last reset'''
+    flush_stats()
+    counts = {tier.decode('utf-8'): int(num_lookups)
+              for tier, num_lookups in get_redis_connection().hgetall(STATS_KEY).items()}
+    total = sum(counts.values())
+    return OrderedDict((tier, (counts.get(tier, 0), counts.get(tier, 0) / total if total else 0)) for tier in TIERS)
+
+
+def reset_stats():
+    _counts.update(dict.fromkeys(TIERS, 0))
+    get_redis_connection().delete(STATS_KEY)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from setlistspy.app.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run benchmarks of the hot paths, e.g. ./manage.py benchmark tracklists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help=f'Benchmarks to run, out of {", ".join(BENCHMARKS)} (all of them by default)',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            dest='rounds',
+            default=5,
+            help='Number of rounds to run each benchmark for',
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        unknown_names = set(names) - set(BENCHMARKS)
+        if unknown_names:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown_names))}')
+        over_budget = []
+        for name in names:
+            results = import_string(BENCHMARKS[name])(options['rounds'])
+            if results.get('within_budget', True):
+                self.stdout.write(self.style.SUCCESS(name))
+            else:
+                self.stdout.write(self.style.ERROR(name))
+                over_budget.append(name)
+            for metric, value in results.items():
+                self.stdout.write(f'  {metric}: {value}')
+        if over_budget:
+            raise CommandError(f'Over budget: {", ".join(over_budget)}')
@@ -0,0 +1,62 @@
+import gzip
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from setlistspy.app.bulk_load import bulk_load
+
+
+def read_setlists(paths):
+    '''Yield the setlists of newline-delimited JSON files, optionally gzipped, or of stdin for -'''
+    for path in paths:
+        if path == '-':
+            lines = sys.stdin
+        elif path.endswith('.gz'):
+            lines = gzip.open(path, 'rt', encoding='utf-8')
+        else:
+            lines = open(path, encoding='utf-8')
+        try:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+
+class Command(BaseCommand):
+    help = 'Seed the database with parsed setlists from newline-delimited JSON files via COPY and set-based merges'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Files of one setlist per line as described in setlistspy.app.bulk_load, or - for stdin',
+        )
+        parser.add_argument(
+            '--defer-indexes',
+            action='store_true',
+            dest='defer_indexes',
+            default=False,
+            help='Drop the non-unique indexes during the load and rebuild them at the end, for loads into an '
+                 'empty or small database',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        timings = bulk_load(read_setlists(options['paths']), defer_indexes=options['defer_indexes'])
+        for step, num_rows, seconds in timings:
+            if num_rows is None:
+                self.stdout.write(f'{step}: {seconds:.2f}s')
+            else:
+                self.stdout.write(f'{step}: {format_rate(num_rows, seconds)}')
+        num_plays = next(num_rows for step, num_rows, _ in timings if step == 'merge track plays')
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded track plays: {format_rate(num_plays, time.perf_counter() - start)}'
+        ))
+
+
+def format_rate(num_rows, seconds):
+    return f'{num_rows} rows in {seconds:.2f}s ({num_rows / max(seconds, 0.001):.0f} rows/sec)'
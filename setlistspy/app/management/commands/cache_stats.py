@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from setlistspy.app import local_cache
+
+
+class Command(BaseCommand):
+    help = 'Report the share of cache lookups served by the in-process tier, by Redis, or missed, across every worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            dest='reset',
+            default=False,
+            help='Start counting over once reported',
+        )
+
+    def handle(self, *args, **options):
+        for tier, (num_lookups, ratio) in local_cache.get_stats().items():
+            self.stdout.write(f'{tier}: {num_lookups} lookups ({ratio:.1%})')
+        if options['reset']:
+            local_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Reset the cache stats'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from setlistspy.app.indexes import get_index_usage
+
+
+class Command(BaseCommand):
+    help = 'Report the scans and size of the indexes on the app tables, flagging unused and redundant ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tables',
+            nargs='*',
+            help='Tables whose indexes to report, e.g. app_trackplay (all of the app tables by default)',
+        )
+        parser.add_argument(
+            '--flagged',
+            action='store_true',
+            dest='flagged',
+            help='Only report unused and redundant indexes',
+        )
+
+    def handle(self, *args, **options):
+        table = None
+        for usage in get_index_usage(options['tables']):
+            flags = []
+            if not usage.scans and not usage.unique:
+                flags.append('unused')
+            if usage.redundant_with:
+                flags.append(f'redundant with {usage.redundant_with}')
+            if options['flagged'] and not flags:
+                continue
+            if usage.table != table:
+                table = usage.table
+                self.stdout.write(self.style.MIGRATE_HEADING(table))
+            line = f'  {usage.name} ({usage.columns}): {usage.scans} scans, {usage.tuples_read} tuples read, ' \
+                   f'{usage.size / 2 ** 20:.2f} MB'
+            self.stdout.write(self.style.WARNING(f'{line}, {", ".join(flags)}') if flags else line)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from setlistspy.app.collaborations import rebuild_collaborations
+from setlistspy.app.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the play count rollups, totals and collaboration graph backing the stats endpoints from scratch'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_rollups()
+            num_edges = rebuild_collaborations()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt play count rollups and {num_edges} collaborations'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from setlistspy.app.rollups import COUNTERS, recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Repair the counter columns lists are ordered and filtered by, e.g. track play counts, from the track plays'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            help=f'Models whose counters to recount, out of {", ".join(model.__name__ for model in COUNTERS)} '
+                 f'(all by default)',
+        )
+
+    def handle(self, *args, **options):
+        models_by_name = {model.__name__.lower(): model for model in COUNTERS}
+        try:
+            models = [models_by_name[name.lower()] for name in options['models']] or None
+        except KeyError as e:
+            raise CommandError(f'No counters on {e.args[0]}')
+        with transaction.atomic():
+            corrected = recount_counters(models)
+        for model, num_rows in corrected.items():
+            column = COUNTERS[model][0]
+            self.stdout.write(f'{model.__name__}.{column}: corrected {num_rows} rows')
+        self.stdout.write(self.style.SUCCESS('Recounted counters'))
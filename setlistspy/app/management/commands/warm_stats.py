@@ -0,0 +1,36 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand
+
+from setlistspy.app.jobs import StatsJob, forget_least_requested_stats, get_most_requested_stats
+
+
+class Command(BaseCommand):
+    help = 'Precompute and cache the stats of the most requested DJs, artists, labels and tracks, e.g. after an ingest'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            dest='top',
+            default=100,
+            help='Number of most requested stats responses to warm',
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            dest='keep',
+            default=10000,
+            help='Number of most requested stats responses to keep request counts for',
+        )
+
+    def handle(self, *args, **options):
+        job = StatsJob()
+        num_warmed = 0
+        for serializer_path, pk in get_most_requested_stats(options['top']):
+            try:
+                job.refresh(serializer_path, pk)
+                num_warmed += 1
+            except ObjectDoesNotExist:
+                continue
+        forget_least_requested_stats(options['keep'])
+        self.stdout.write(self.style.SUCCESS(f'Warmed {num_warmed} stats responses'))
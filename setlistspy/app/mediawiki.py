@@ -0,0 +1,49 @@
+'''
+Streaming reader for MediaWiki XML exports, such as the per DJ category exports of mixesdb.com.
+
+Pages are parsed one at a time with lxml's iterparse and cleared once they've been yielded, so memory use doesn't
+grow with the size of the export.
+'''
+import hashlib
+
+from lxml import etree
+
+
+class HashingReader:
+    '''Wraps a binary file object, hashing what is read through it'''
+
+    def __init__(self, source, hash_name='md5'):
+        self.source = source
+        self.hash = hashlib.new(hash_name)
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.hash.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def iter_pages(source):
+    '''
+    Yield the <page> elements with a revision of an export, given as a path or binary file object, as dicts shaped
+    like their xmltodict parse, i.e. {'id', 'title', 'revision': {'timestamp', 'sha1', 'text': {'#text'}}}
+    '''
+    pages = etree.iterparse(source, events=('end',), tag='{*}page', resolve_entities=False, huge_tree=True)
+    for _, page in pages:
+        revision = page.find('{*}revision')
+        if revision is not None:
+            yield {
+                'id': page.findtext('{*}id'),
+                'title': page.findtext('{*}title'),
+                'revision': {
+                    'timestamp': revision.findtext('{*}timestamp'),
+                    'sha1': revision.findtext('{*}sha1'),
+                    'text': {'#text': revision.findtext('{*}text') or ''},
+                },
+            }
+        # Drop the page and the (already cleared) pages before it, which the root element still references
+        page.clear()
+        while page.getprevious() is not None:
+            del page.getparent()[0]
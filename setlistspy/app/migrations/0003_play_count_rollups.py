@@ -0,0 +1,120 @@
+# Generated by Django 2.2.4 on 2026-10-18 14:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Backfill the rollups from the existing track plays
+BACKFILL_ROLLUPS_SQL = '''
+INSERT INTO app_djartistplaycount (dj_id, artist_id, play_count)
+SELECT setlist.dj_id, track.artist_id, COUNT(*)
+FROM app_trackplay play
+JOIN app_track track ON track.id = play.track_id
+JOIN app_setlist setlist ON setlist.id = play.setlist_id
+GROUP BY setlist.dj_id, track.artist_id;
+
+INSERT INTO app_djlabelplaycount (dj_id, label_id, play_count)
+SELECT setlist.dj_id, play.label_id, COUNT(*)
+FROM app_trackplay play
+JOIN app_setlist setlist ON setlist.id = play.setlist_id
+WHERE play.label_id IS NOT NULL
+GROUP BY setlist.dj_id, play.label_id;
+
+INSERT INTO app_labelartistplaycount (label_id, artist_id, play_count)
+SELECT play.label_id, track.artist_id, COUNT(*)
+FROM app_trackplay play
+JOIN app_track track ON track.id = play.track_id
+WHERE play.label_id IS NOT NULL
+GROUP BY play.label_id, track.artist_id;
+
+UPDATE app_artist SET total_plays = totals.play_count
+FROM (SELECT artist_id, SUM(play_count) AS play_count FROM app_djartistplaycount GROUP BY artist_id) totals
+WHERE app_artist.id = totals.artist_id;
+
+UPDATE app_label SET total_plays = totals.play_count
+FROM (SELECT label_id, SUM(play_count) AS play_count FROM app_djlabelplaycount GROUP BY label_id) totals
+WHERE app_label.id = totals.label_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_track_artist_rel_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artist',
+            name='total_plays',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='label',
+            name='total_plays',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LabelArtistPlayCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('play_count', models.IntegerField(default=0)),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_play_counts', to='app.Artist')),
+                ('label', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artist_play_counts', to='app.Label')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DJLabelPlayCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('play_count', models.IntegerField(default=0)),
+                ('dj', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_play_counts', to='app.DJ')),
+                ('label', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dj_play_counts', to='app.Label')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DJArtistPlayCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('play_count', models.IntegerField(default=0)),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dj_play_counts', to='app.Artist')),
+                ('dj', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artist_play_counts', to='app.DJ')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='labelartistplaycount',
+            index=models.Index(fields=['label', '-play_count'], name='app_labelar_label_i_64ad2f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labelartistplaycount',
+            index=models.Index(fields=['artist', '-play_count'], name='app_labelar_artist__b77365_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='labelartistplaycount',
+            unique_together={('label', 'artist')},
+        ),
+        migrations.AddIndex(
+            model_name='djlabelplaycount',
+            index=models.Index(fields=['dj', '-play_count'], name='app_djlabel_dj_id_d0ec1f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='djlabelplaycount',
+            index=models.Index(fields=['label', '-play_count'], name='app_djlabel_label_i_c49180_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='djlabelplaycount',
+            unique_together={('dj', 'label')},
+        ),
+        migrations.AddIndex(
+            model_name='djartistplaycount',
+            index=models.Index(fields=['dj', '-play_count'], name='app_djartis_dj_id_5b0d69_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='djartistplaycount',
+            index=models.Index(fields=['artist', '-play_count'], name='app_djartis_artist__7467e1_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='djartistplaycount',
+            unique_together={('dj', 'artist')},
+        ),
+        migrations.RunSQL(BACKFILL_ROLLUPS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.4 on 2026-10-18 15:02
+
+from django.db import migrations
+
+SEARCH_COLUMNS = (
+    ('app_artist', 'name'),
+    ('app_label', 'name'),
+    ('app_dj', 'name'),
+    ('app_setlist', 'title'),
+    ('app_track', 'title'),
+)
+
+# GIN trigram indexes on UPPER(column::text), the expression icontains lookups filter on, so they serve both the
+# existing icontains filters and the fuzzy % matches of the search filters. Databases without the pg_trgm contrib
+# module are left as they are, and searches there fall back to sequential scans.
+CREATE_SEARCH_INDEXES_SQL = '''
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+%s
+    END IF;
+END
+$$;
+''' % '\n'.join(
+    f'        CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} '
+    f'USING gin (UPPER({column}::text) gin_trgm_ops);'
+    for table, column in SEARCH_COLUMNS
+)
+
+DROP_SEARCH_INDEXES_SQL = '\n'.join(f'DROP INDEX IF EXISTS {table}_{column}_trgm;' for table, column in SEARCH_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_play_count_rollups'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEARCH_INDEXES_SQL, DROP_SEARCH_INDEXES_SQL),
+    ]
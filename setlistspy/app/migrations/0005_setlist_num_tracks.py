@@ -0,0 +1,26 @@
+# Generated by Django 2.2.4 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+# Backfill the track counts from the existing track plays
+BACKFILL_NUM_TRACKS_SQL = '''
+UPDATE app_setlist SET num_tracks = counts.num_tracks
+FROM (SELECT setlist_id, COUNT(*) AS num_tracks FROM app_trackplay GROUP BY setlist_id) counts
+WHERE app_setlist.id = counts.setlist_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='setlist',
+            name='num_tracks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_NUM_TRACKS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.4 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+# Backfill the counters from the existing track plays, before their indexes are built
+BACKFILL_COUNTERS_SQL = '''
+UPDATE app_track SET num_plays = counts.num_plays
+FROM (SELECT track_id, COUNT(*) AS num_plays FROM app_trackplay GROUP BY track_id) counts
+WHERE app_track.id = counts.track_id;
+
+UPDATE app_dj SET num_setlists = counts.num_setlists
+FROM (SELECT dj_id, COUNT(*) AS num_setlists FROM app_setlist WHERE num_tracks > 0 GROUP BY dj_id) counts
+WHERE app_dj.id = counts.dj_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_setlist_num_tracks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dj',
+            name='num_setlists',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='num_plays',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_COUNTERS_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='artist',
+            index=models.Index(fields=['total_plays'], name='app_artist_total_p_b90d76_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dj',
+            index=models.Index(fields=['num_setlists'], name='app_dj_num_set_2d1beb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='label',
+            index=models.Index(fields=['total_plays'], name='app_label_total_p_086cbb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='setlist',
+            index=models.Index(fields=['num_tracks'], name='app_setlist_num_tra_f2aee4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['num_plays'], name='app_track_num_pla_b5c306_idx'),
+        ),
+    ]
@@ -0,0 +1,148 @@
+# Generated by Django 2.2.4 on 2026-10-18 16:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import setlistspy.app.base_model
+
+KEYED_TABLES = ('app_dj', 'app_setlist', 'app_artist', 'app_track')
+
+# {table: [(foreign key column, referenced table)]} switched from the referenced UUIDs to their keys
+FOREIGN_KEYS = {
+    'app_setlist': [('dj_id', 'app_dj')],
+    'app_track': [('artist_id', 'app_artist')],
+    'app_trackplay': [('track_id', 'app_track'), ('setlist_id', 'app_setlist')],
+    'app_djartistplaycount': [('dj_id', 'app_dj'), ('artist_id', 'app_artist')],
+    'app_djlabelplaycount': [('dj_id', 'app_dj')],
+    'app_labelartistplaycount': [('artist_id', 'app_artist')],
+}
+
+
+def get_number_keys_sql(table):
+    '''Number the existing rows in creation order and continue the sequence from there'''
+    return f'''
+        CREATE SEQUENCE {table}_key_seq OWNED BY {table}.key;
+        UPDATE {table} SET key = numbered.key
+        FROM (SELECT id, row_number() OVER (ORDER BY created_at, id) AS key FROM {table}) numbered
+        WHERE {table}.id = numbered.id;
+        SELECT setval('{table}_key_seq', COALESCE((SELECT MAX(key) FROM {table}), 0) + 1, false);
+        ALTER TABLE {table} ALTER COLUMN key SET DEFAULT nextval('{table}_key_seq');
+    '''
+
+
+def get_switch_foreign_keys_sql(from_column, from_type, to_column, to_type):
+    '''
+    Convert the foreign key columns from referencing from_column to to_column of their tables.
+
+    ALTER COLUMN TYPE rewrites each table once, looking the new values up through a function as USING can't hold a
+    subquery, and rebuilds the indexes and unique constraints on the columns under their existing names.
+    '''
+    sql = [
+        f'''
+        CREATE FUNCTION pg_temp.{table}_{to_column}_of({from_type}) RETURNS {to_type} AS
+            'SELECT {to_column} FROM {table} WHERE {from_column} = $1' LANGUAGE sql STABLE;
+        '''
+        for table in KEYED_TABLES
+    ]
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        for column, _ in foreign_keys:
+            sql.append(f'''
+                DO $$
+                DECLARE constraint_name text;
+                BEGIN
+                    FOR constraint_name IN
+                        SELECT conname FROM pg_constraint
+                        JOIN pg_attribute ON attrelid = conrelid AND attnum = ANY(conkey)
+                        WHERE conrelid = '{table}'::regclass AND contype = 'f' AND attname = '{column}'
+                    LOOP
+                        EXECUTE format('ALTER TABLE {table} DROP CONSTRAINT %I', constraint_name);
+                    END LOOP;
+                END $$;
+            ''')
+        alter_columns = ', '.join(
+            f'ALTER COLUMN {column} TYPE {to_type} USING pg_temp.{referenced_table}_{to_column}_of({column})'
+            for column, referenced_table in foreign_keys
+        )
+        sql.append(f'ALTER TABLE {table} {alter_columns};')
+        for column, referenced_table in foreign_keys:
+            sql.append(f'''
+                ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fk_{referenced_table}_{to_column}
+                FOREIGN KEY ({column}) REFERENCES {referenced_table} ({to_column}) DEFERRABLE INITIALLY DEFERRED;
+            ''')
+    sql += [f'DROP FUNCTION pg_temp.{table}_{to_column}_of({from_type});' for table in KEYED_TABLES]
+    return '\n'.join(sql)
+
+
+def add_key_operations(model_name, table):
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name='key',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunSQL(get_number_keys_sql(table), migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name=model_name,
+            name='key',
+            field=setlistspy.app.base_model.SurrogateKeyField(),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_popularity_counters'),
+    ]
+
+    operations = [
+        *add_key_operations('dj', 'app_dj'),
+        *add_key_operations('setlist', 'app_setlist'),
+        *add_key_operations('artist', 'app_artist'),
+        *add_key_operations('track', 'app_track'),
+        migrations.RunSQL(
+            get_switch_foreign_keys_sql('id', 'uuid', 'key', 'bigint'),
+            get_switch_foreign_keys_sql('key', 'bigint', 'id', 'uuid'),
+            state_operations=[
+                migrations.AlterField(
+                    model_name='setlist',
+                    name='dj',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='setlists', to='app.DJ', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='track',
+                    name='artist',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='tracks', to='app.Artist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='trackplay',
+                    name='setlist',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='track_plays', to='app.Setlist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='trackplay',
+                    name='track',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='plays', to='app.Track', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djartistplaycount',
+                    name='artist',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dj_play_counts', to='app.Artist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djartistplaycount',
+                    name='dj',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artist_play_counts', to='app.DJ', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djlabelplaycount',
+                    name='dj',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_play_counts', to='app.DJ', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='labelartistplaycount',
+                    name='artist',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_play_counts', to='app.Artist', to_field='key'),
+                ),
+            ],
+        ),
+    ]
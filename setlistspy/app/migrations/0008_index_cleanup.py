@@ -0,0 +1,153 @@
+# Generated by Django 2.2.4 on 2026-10-18 17:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# {table: [foreign key column]} whose own indexes are dropped, as each is the first column of a composite index
+UNINDEXED_FOREIGN_KEYS = {
+    'app_setlist': ['dj_id'],
+    'app_track': ['artist_id'],
+    'app_trackplay': ['track_id', 'setlist_id'],
+    'app_djartistplaycount': ['dj_id', 'artist_id'],
+    'app_djlabelplaycount': ['dj_id', 'label_id'],
+    'app_labelartistplaycount': ['label_id', 'artist_id'],
+}
+
+
+def get_drop_column_indexes_sql(table, column):
+    '''
+    Drop the plain btree indexes on just the column, as AlterField(db_index=False) would, without it dropping and
+    revalidating the column's foreign key constraint
+    '''
+    return f'''
+        DO $$
+        DECLARE index_name text;
+        BEGIN
+            FOR index_name IN
+                SELECT indexrelid::regclass::text FROM pg_index
+                JOIN pg_class ON pg_class.oid = indexrelid
+                JOIN pg_am ON pg_am.oid = relam
+                JOIN pg_attribute ON attrelid = indrelid AND attnum = indkey[0]
+                WHERE indrelid = '{table}'::regclass AND indnatts = 1 AND NOT indisunique AND NOT indisprimary
+                    AND indexprs IS NULL AND indpred IS NULL AND amname = 'btree' AND attname = '{column}'
+            LOOP
+                EXECUTE format('DROP INDEX %s', index_name);
+            END LOOP;
+        END $$;
+    '''
+
+
+DROP_FOREIGN_KEY_INDEXES_SQL = '\n'.join(
+    get_drop_column_indexes_sql(table, column)
+    for table, columns in UNINDEXED_FOREIGN_KEYS.items() for column in columns
+)
+
+CREATE_FOREIGN_KEY_INDEXES_SQL = '\n'.join(
+    f'CREATE INDEX ON {table} ({column});' for table, columns in UNINDEXED_FOREIGN_KEYS.items() for column in columns
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_surrogate_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dj',
+            name='app_dj_name_8ba7b1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='setlist',
+            name='app_setlist_dj_id_ef0f1a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='track',
+            name='app_track_artist__620f28_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='track',
+            name='app_track_artist__27c042_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trackplay',
+            name='app_trackpl_track_i_8aea96_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trackplay',
+            name='app_trackpl_setlist_37604c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='djartistplaycount',
+            name='app_djartis_dj_id_5b0d69_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='djlabelplaycount',
+            name='app_djlabel_dj_id_d0ec1f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='djartistplaycount',
+            index=models.Index(fields=['dj', '-play_count', 'artist'], name='app_djartis_dj_id_faddb1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='djlabelplaycount',
+            index=models.Index(fields=['dj', '-play_count', 'label'], name='app_djlabel_dj_id_2319a9_idx'),
+        ),
+        migrations.RunSQL(
+            DROP_FOREIGN_KEY_INDEXES_SQL,
+            CREATE_FOREIGN_KEY_INDEXES_SQL,
+            state_operations=[
+                migrations.AlterField(
+                    model_name='setlist',
+                    name='dj',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='setlists', to='app.DJ', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='track',
+                    name='artist',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='tracks', to='app.Artist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='trackplay',
+                    name='setlist',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='track_plays', to='app.Setlist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='trackplay',
+                    name='track',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='plays', to='app.Track', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djartistplaycount',
+                    name='artist',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='dj_play_counts', to='app.Artist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djartistplaycount',
+                    name='dj',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='artist_play_counts', to='app.DJ', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djlabelplaycount',
+                    name='dj',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='label_play_counts', to='app.DJ', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='djlabelplaycount',
+                    name='label',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='dj_play_counts', to='app.Label'),
+                ),
+                migrations.AlterField(
+                    model_name='labelartistplaycount',
+                    name='artist',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='label_play_counts', to='app.Artist', to_field='key'),
+                ),
+                migrations.AlterField(
+                    model_name='labelartistplaycount',
+                    name='label',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='artist_play_counts', to='app.Label'),
+                ),
+            ],
+        ),
+    ]
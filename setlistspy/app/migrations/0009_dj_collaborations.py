@@ -0,0 +1,46 @@
+# Generated by Django 2.2.4 on 2026-10-18 18:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Backfill the collaboration graph from the existing setlists
+BACKFILL_COLLABORATIONS_SQL = '''
+INSERT INTO app_djcollaboration (dj_id, collaborator_id, num_setlists)
+SELECT setlist.dj_id, other.dj_id, COUNT(*)
+FROM app_setlist setlist
+JOIN app_setlist other ON other.mixesdb_id = setlist.mixesdb_id AND other.dj_id <> setlist.dj_id
+WHERE setlist.b2b
+GROUP BY setlist.dj_id, other.dj_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='setlist',
+            index=models.Index(fields=['mixesdb_id', 'dj'], name='app_setlist_mixesdb_3dad2e_idx'),
+        ),
+        migrations.CreateModel(
+            name='DJCollaboration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_setlists', models.IntegerField(default=0)),
+                ('collaborator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.DJ', to_field='key')),
+                ('dj', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='collaborations', to='app.DJ', to_field='key')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='djcollaboration',
+            index=models.Index(fields=['dj', '-num_setlists', 'collaborator'], name='app_djcolla_dj_id_c029be_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='djcollaboration',
+            unique_together={('dj', 'collaborator')},
+        ),
+        migrations.RunSQL(BACKFILL_COLLABORATIONS_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,22 +1,104 @@
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 
 from rest_framework.mixins import ListModelMixin
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from django.conf import settings
 
+from setlistspy.app import local_cache
+from setlistspy.app.cache import CACHED_MODELS, get_generation_key_prefix
+from setlistspy.app.export import EXPORT_RENDERERS, stream_export
+from setlistspy.app.profiling import cache_lookup, record_cache_miss, timed_serialization
+from setlistspy.app.response_cache import get_cached_response
+
 CACHE_TTL = getattr(settings, 'CACHE_TTL', DEFAULT_TIMEOUT)
 
+# Query params which don't filter the queryset, so don't widen the models a cached list depends on
+UNFILTERED_QUERY_PARAMS = {'limit', 'offset', 'cursor', 'ordering', 'format'}
+
+
 class SetSpyListModelMixin(ListModelMixin):
+    # Models whose rows end up in the serialized list, i.e. whose changes invalidate the cached list
+    cache_dependencies = CACHED_MODELS
+    # ValuesSerializer compiled from serializer_class, to serialize lists from .values() rows instead of models
+    values_serializer = None
+
+    def get_cache_dependencies(self):
+        if set(self.request.query_params) - UNFILTERED_QUERY_PARAMS:
+            # Related filters can reach any model
+            return CACHED_MODELS
+        return self.cache_dependencies
 
-    @method_decorator(cache_page(CACHE_TTL))
     def list(self, request, *args, **kwargs):
+        key_prefix = get_generation_key_prefix(self.get_cache_dependencies())
+        with cache_lookup():
+            return get_cached_response(self, request, key_prefix, CACHE_TTL,
+                                       lambda: self.list_uncached(request, *args, **kwargs))
+
+    def list_uncached(self, request, *args, **kwargs):
+        record_cache_miss()
         queryset = self.filter_queryset(self.get_queryset())
         serializer_class = self.get_serializer_class()
+        values_serializer = self.values_serializer
+        if values_serializer is not None and values_serializer.serializer_class is serializer_class:
+            # Keyset pages are ordered by, and their cursors made of, the cursor_ordering fields
+            queryset = values_serializer.get_queryset(queryset, getattr(self, 'cursor_ordering', ()))
+            page = self.paginate_queryset(queryset)
+            with timed_serialization():
+                data = values_serializer.serialize(page)
+            return self.get_paginated_response(data)
+
         context = self.get_serializer_context()
         if hasattr(serializer_class, "setup_queryset"):
             queryset = serializer_class.setup_queryset(queryset, context)
         page = self.paginate_queryset(queryset)
         serializer = serializer_class(page, many=True, context=context)
-        return self.get_paginated_response(serializer.data)
\ No newline at end of file
+        with timed_serialization():
+            data = serializer.data
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        # As RetrieveModelMixin.retrieve, timing the serializer
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        with timed_serialization():
+            data = serializer.data
+        return Response(data)
+
+
+class SetSpyExportMixin:
+    '''Streams the whole filtered list with ?format=ndjson or ?format=csv, see setlistspy.app.export'''
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + list(EXPORT_RENDERERS.values())
+    # (column, field lookup) of the exported rows
+    export_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format in EXPORT_RENDERERS:
+            queryset = self.filter_queryset(self.get_queryset())
+            return stream_export(queryset, self.export_fields, request.accepted_renderer.format, self.basename)
+        return super().list(request, *args, **kwargs)
+
+
+class SetSpyCachedObjectMixin:
+    '''
+    Looks up the object of the detail actions most requested for popular objects, such as retrieve and stats, in the
+    two-tier cache of setlistspy.app.local_cache before Postgres
+    '''
+    cached_object_actions = ('retrieve', 'stats')
+    # Models whose changes may change the cached object, e.g. through the counters rollups maintain
+    object_cache_dependencies = ()
+
+    def get_object(self):
+        if self.action not in self.cached_object_actions:
+            return super().get_object()
+        model = self.queryset.model
+        key_prefix = get_generation_key_prefix(self.object_cache_dependencies or (model,))
+        key = f'object:{model._meta.label_lower}:{key_prefix}:{self.kwargs[self.lookup_url_kwarg or self.lookup_field]}'
+        instance = local_cache.get(key)
+        if instance is None:
+            instance = super().get_object()
+            local_cache.set(key, instance, CACHE_TTL)
+        else:
+            self.check_object_permissions(self.request, instance)
+        return instance
@@ -1,6 +1,6 @@
 import os
 from django.db import models
-from setlistspy.app.base_model import BaseSetSpyModel
+from setlistspy.app.base_model import BaseSetSpyModel, KeyedSetSpyModel
 from playhouse.postgres_ext import *
 
 
@@ -15,36 +15,43 @@ from playhouse.postgres_ext import *
 # )
 
 
-class DJ(BaseSetSpyModel):
+class DJ(KeyedSetSpyModel):
     name = models.CharField(max_length=255)
     url = models.CharField(max_length=255, unique=True)
     xml_md5 = models.CharField(max_length=32, default='')
     last_check_time = models.DateTimeField(null=True, blank=True)
+    # Number of setlists with tracks, kept up to date by setlistspy.app.rollups
+    num_setlists = models.IntegerField(default=0)
 
     class Meta:
         indexes = [
-            models.Index(fields=['name']),
             models.Index(fields=['last_check_time']),
-            models.Index(fields=['name', 'last_check_time'])
+            models.Index(fields=['name', 'last_check_time']),
+            models.Index(fields=['num_setlists']),
         ]
 
     def __str__(self):
         return f'{self.name}'
 
 
-class Setlist(BaseSetSpyModel):
-    dj = models.ForeignKey(DJ, on_delete=models.PROTECT, related_name='setlists')
+class Setlist(KeyedSetSpyModel):
+    # Indexed as the first column of the unique constraint below
+    dj = models.ForeignKey(DJ, on_delete=models.PROTECT, related_name='setlists', to_field='key', db_index=False)
     title = models.CharField(max_length=255)
     mixesdb_id = models.IntegerField()
     mixesdb_mod_time = models.DateTimeField()
     xml_sha1 = models.CharField(max_length=31, null=True)
     b2b = models.NullBooleanField('Other DJs on deck', null=True)
+    # Number of track plays, kept up to date by setlistspy.app.rollups
+    num_tracks = models.IntegerField(default=0)
 
     class Meta:
         indexes = [
-            models.Index(fields=['dj']),
             models.Index(fields=['mixesdb_mod_time']),
-            models.Index(fields=['dj', 'mixesdb_mod_time'])
+            models.Index(fields=['dj', 'mixesdb_mod_time']),
+            models.Index(fields=['num_tracks']),
+            # Covers the other DJs listed on the same MixesDB page, as the collaboration graph is maintained
+            models.Index(fields=['mixesdb_id', 'dj']),
         ]
         unique_together = (
             ('dj', 'mixesdb_id'),
@@ -54,8 +61,14 @@ class Setlist(BaseSetSpyModel):
         return f'{self.title}'
 
 
-class Artist(BaseSetSpyModel):
+class Artist(KeyedSetSpyModel):
     name = models.CharField(max_length=255, unique=True)
+    total_plays = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['total_plays']),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -64,24 +77,32 @@ class Artist(BaseSetSpyModel):
 class Label(BaseSetSpyModel):
     name = models.CharField(max_length=255, unique=True)
     discogs_id = models.IntegerField(null=True)
+    total_plays = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['total_plays']),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
 
-class Track(BaseSetSpyModel):
-    artist = models.ForeignKey(Artist, on_delete=models.PROTECT, related_name="tracks")
+class Track(KeyedSetSpyModel):
+    # Indexed as the first column of the unique constraint below
+    artist = models.ForeignKey(Artist, on_delete=models.PROTECT, related_name="tracks", to_field='key', db_index=False)
     title = models.CharField(max_length=255)
     setlists = models.ManyToManyField(Setlist, through="TrackPlay", related_name="tracks")
+    # Number of track plays, kept up to date by setlistspy.app.rollups
+    num_plays = models.IntegerField(default=0)
 
     def __str__(self):
         return f'{self.artist.name} - {self.title}'
 
     class Meta:
         indexes = [
-            models.Index(fields=['artist']),
             models.Index(fields=['title']),
-            models.Index(fields=['artist', 'title']),
+            models.Index(fields=['num_plays']),
         ]
         unique_together = (
             ('artist', 'title'),
@@ -89,15 +110,15 @@ class Track(BaseSetSpyModel):
 
 
 class TrackPlay(BaseSetSpyModel):
-    track = models.ForeignKey(Track, related_name='plays', on_delete=models.PROTECT)
-    setlist = models.ForeignKey(Setlist, related_name='track_plays', on_delete=models.PROTECT)
+    # Indexed as the first columns of the (track, setlist) index and the unique constraint below
+    track = models.ForeignKey(Track, related_name='plays', on_delete=models.PROTECT, to_field='key', db_index=False)
+    setlist = models.ForeignKey(Setlist, related_name='track_plays', on_delete=models.PROTECT, to_field='key',
+                                db_index=False)
     set_order = models.IntegerField()
     label = models.ForeignKey(Label, null=True, related_name='track_plays', on_delete=models.PROTECT)
 
     class Meta:
         indexes = [
-            models.Index(fields=['track']),
-            models.Index(fields=['setlist']),
             models.Index(fields=['track', 'setlist']),
         ]
         unique_together = (
@@ -105,4 +126,79 @@ class TrackPlay(BaseSetSpyModel):
         )
 
     def __str__(self):
-        return f'{self.setlist.title} - {self.set_order}. {self.track.artist.name} - {self.track.title}'
\ No newline at end of file
+        return f'{self.setlist.title} - {self.set_order}. {self.track.artist.name} - {self.track.title}'
+
+
+# Play count rollups, kept up to date by setlistspy.app.rollups as track plays are written. Their foreign keys are
+# indexed as the first columns of their composite indexes rather than on their own
+
+
+class DJArtistPlayCount(models.Model):
+    dj = models.ForeignKey(DJ, related_name='artist_play_counts', on_delete=models.CASCADE, to_field='key',
+                           db_index=False)
+    artist = models.ForeignKey(Artist, related_name='dj_play_counts', on_delete=models.CASCADE, to_field='key',
+                               db_index=False)
+    play_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Covers the DJ stats' top played artists, so they are read with an index only scan
+            models.Index(fields=['dj', '-play_count', 'artist']),
+            models.Index(fields=['artist', '-play_count']),
+        ]
+        unique_together = (
+            ('dj', 'artist'),
+        )
+
+
+class DJLabelPlayCount(models.Model):
+    dj = models.ForeignKey(DJ, related_name='label_play_counts', on_delete=models.CASCADE, to_field='key',
+                           db_index=False)
+    label = models.ForeignKey(Label, related_name='dj_play_counts', on_delete=models.CASCADE, db_index=False)
+    play_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Covers the DJ stats' top played labels, so they are read with an index only scan
+            models.Index(fields=['dj', '-play_count', 'label']),
+            models.Index(fields=['label', '-play_count']),
+        ]
+        unique_together = (
+            ('dj', 'label'),
+        )
+
+
+class LabelArtistPlayCount(models.Model):
+    label = models.ForeignKey(Label, related_name='artist_play_counts', on_delete=models.CASCADE, db_index=False)
+    artist = models.ForeignKey(Artist, related_name='label_play_counts', on_delete=models.CASCADE, to_field='key',
+                               db_index=False)
+    play_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['label', '-play_count']),
+            models.Index(fields=['artist', '-play_count']),
+        ]
+        unique_together = (
+            ('label', 'artist'),
+        )
+
+
+class DJCollaboration(models.Model):
+    '''
+    Edge of the b2b collaboration graph, kept up to date by setlistspy.app.collaborations: another DJ listed on the
+    same MixesDB pages as b2b setlists of the DJ, and the number of those setlists
+    '''
+    dj = models.ForeignKey(DJ, related_name='collaborations', on_delete=models.CASCADE, to_field='key',
+                           db_index=False)
+    collaborator = models.ForeignKey(DJ, related_name='+', on_delete=models.CASCADE, to_field='key')
+    num_setlists = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Covers the collaborators of a DJ by weight, so they are read with an index only scan
+            models.Index(fields=['dj', '-num_setlists', 'collaborator']),
+        ]
+        unique_together = (
+            ('dj', 'collaborator'),
+        )
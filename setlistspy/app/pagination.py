@@ -0,0 +1,187 @@
+import base64
+import datetime
+import hashlib
+import json
+import uuid
+from collections import OrderedDict
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.template import loader
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from setlistspy.app.cache import get_generation_key_prefix
+
+
+class SetSpyPagination(LimitOffsetPagination):
+    '''
+    Limit/offset pagination, or keyset pagination when the request has a cursor param (left empty for the first page).
+
+    Limit/offset pages of large unfiltered tables report Postgres' row estimate as their count, and exact counts of
+    filtered querysets are cached per query for COUNT_CACHE_TTL. count_exact tells clients which one they got. Either
+    way the count is only reported, and pages and their next links go by the rows actually there.
+
+    Keyset pages are ordered by the view's cursor_ordering, which should be an indexed ordering ending in a unique
+    field, and pick up right after the last row of the previous page. They skip the count and cost the same however
+    deep into the table they are.
+    '''
+    cursor_query_param = 'cursor'
+    default_cursor_ordering = ('created_at', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+    count_estimate_threshold = getattr(settings, 'COUNT_ESTIMATE_THRESHOLD', 100000)
+    count_cache_ttl = getattr(settings, 'COUNT_CACHE_TTL', 60)
+
+    use_cursor = False
+    has_next = False
+    count_exact = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        self.request = request
+        self.use_cursor = self.cursor_query_param in request.query_params
+        self.limit = self.get_limit(request)
+        if not self.use_cursor:
+            self.count = self.get_count(queryset)
+            if self.limit is None:
+                return None
+            self.offset = self.get_offset(request)
+            if self.count > self.limit and self.template is not None:
+                self.display_page_controls = True
+            # The count may be an estimate, so whether there are rows past the page is told by fetching one more
+            return self.get_page(queryset[self.offset:])
+
+        self.cursor_ordering = getattr(view, 'cursor_ordering', self.default_cursor_ordering)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position:
+            queryset = queryset.filter(self.get_position_filter(position))
+        return self.get_page(queryset)
+
+    def get_page(self, queryset):
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        self.page = results[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return Response(OrderedDict([
+                ('count', self.count),
+                ('count_exact', self.count_exact),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data)
+            ]))
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_count(self, queryset):
+        self.count_exact = True
+        if not queryset.query.where:
+            # Unfiltered, so every row of the table counts and its planner estimate is close enough when it's large
+            estimate = self.get_count_estimate(queryset.model)
+            if estimate >= self.count_estimate_threshold:
+                self.count_exact = False
+                return estimate
+
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        signature = f'{sql}{params!r}'
+        if hasattr(self.view, 'get_cache_dependencies'):
+            signature += get_generation_key_prefix(self.view.get_cache_dependencies())
+        key = f'count:{hashlib.md5(signature.encode("utf-8")).hexdigest()}'
+        count = cache.get(key)
+        if count is None:
+            count = super().get_count(queryset)
+            cache.set(key, count, self.count_cache_ttl)
+        return count
+
+    @staticmethod
+    def get_count_estimate(model):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.use_cursor:
+            # Not LimitOffsetPagination's, which stops at the count even when it's an estimate
+            url = replace_query_param(self.request.build_absolute_uri(), self.limit_query_param, self.limit)
+            return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        return None
+
+    def to_html(self):
+        if not self.use_cursor:
+            return super().to_html()
+        template = loader.get_template('rest_framework/pagination/previous_and_next.html')
+        return template.render({'previous_url': None, 'next_url': self.get_next_link()})
+
+    def get_position_filter(self, position):
+        '''Match the rows which come after the position, i.e. (a, b, c) > (x, y, z) for an ordering of a, b, c'''
+        after_position = Q()
+        for index, field_name in enumerate(self.cursor_ordering):
+            equal_up_to_field = Q(**dict(zip(self.cursor_ordering[:index], position[:index])))
+            after_position |= equal_up_to_field & Q(**{f'{field_name}__gt': position[index]})
+        # The redundant bound on the leading column lets Postgres range scan its index
+        return Q(**{f'{self.cursor_ordering[0]}__gte': position[0]}) & after_position
+
+    def encode_cursor(self, instance):
+        if isinstance(instance, dict):
+            # A .values() row, see setlistspy.app.values_serializers
+            position = [self.encode_value(instance[field_name]) for field_name in self.cursor_ordering]
+        else:
+            position = [self.encode_value(reduce(getattr, field_name.split('__'), instance))
+                        for field_name in self.cursor_ordering]
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.cursor_ordering) or None in position:
+            raise NotFound(self.invalid_cursor_message)
+        # Values of the wrong type would only fail once the position filter is built or run
+        try:
+            return [self.get_ordering_field(model, field_name).to_python(value)
+                    for field_name, value in zip(self.cursor_ordering, position)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def get_ordering_field(model, field_name):
+        '''Return the model field an ordering refers to, following relations, e.g. the artist name of artist__name'''
+        *relation_names, name = field_name.split('__')
+        for relation_name in relation_names:
+            model = model._meta.get_field(relation_name).related_model
+        return model._meta.get_field(name)
+
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return value
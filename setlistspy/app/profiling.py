@@ -0,0 +1,175 @@
+'''
+Lightweight per-request profiling of the API, cheap enough to leave on in production.
+
+ProfilingMiddleware records the number of queries and time spent in the database, the time spent serializing
+responses and the response cache hits and misses of every request. It reports them in a Server-Timing header, logs a
+sample of them as JSON lines, and checks the number of queries against the query budget of the view.
+
+Views declare their budgets as query_budgets = {action: maximum number of queries}, keyed by viewset action (list,
+retrieve, stats...) or, for plain API views, by lowercase HTTP method. Budgets hold on a cache miss, so that N+1 queries
+show up as requests over budget. Those are always logged, and raise QueryBudgetExceeded when QUERY_BUDGETS_ENFORCED is
+set, as it is in the tests.
+'''
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_profiles = threading.local()
+
+# Transaction control, such as the savepoints ATOMIC_REQUESTS and nested atomic blocks issue, which isn't a query
+re_transaction_control = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def is_query(sql):
+    '''Whether a statement counts towards query budgets, as anything but transaction control does'''
+    return not re_transaction_control.match(sql)
+
+
+class RequestProfile:
+    '''What a request spent its time on, also installed as a database execute wrapper to count its queries'''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total_seconds = None
+        self.num_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_missed = False
+        self.view_name = None
+        self.query_budget = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if is_query(sql):
+                self.num_queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self.start
+
+    def is_over_budget(self):
+        return self.query_budget is not None and self.num_queries > self.query_budget
+
+    def get_server_timing(self):
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.num_queries} queries"',
+            f'serializer;dur={self.serializer_seconds * 1000:.1f}',
+        ]
+        if self.cache_hits or self.cache_misses:
+            metrics.append(f'cache;desc="{"miss" if self.cache_misses else "hit"}"')
+        metrics.append(f'total;dur={self.total_seconds * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.num_queries,
+            'query_budget': self.query_budget,
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'serializer_ms': round(self.serializer_seconds * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.total_seconds * 1000, 2),
+        }
+
+
+def get_profile():
+    '''Return the RequestProfile of the request being handled, or None outside of a profiled request'''
+    return getattr(_profiles, 'profile', None)
+
+
+@contextmanager
+def timed_serialization():
+    '''Count the time spent in the block as serializer time'''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile = get_profile()
+        if profile is not None:
+            profile.serializer_seconds += time.perf_counter() - start
+
+
+@contextmanager
+def cache_lookup():
+    '''Count the cached response looked up in the block as a hit, unless record_cache_miss is called within it'''
+    profile = get_profile()
+    if profile is None:
+        yield
+        return
+    profile.cache_missed = False
+    yield
+    if profile.cache_missed:
+        profile.cache_misses += 1
+    else:
+        profile.cache_hits += 1
+
+
+def record_cache_miss():
+    profile = get_profile()
+    if profile is not None:
+        profile.cache_missed = True
+
+
+def get_view_budget(view_func, method):
+    '''Return the (name, query budget) of a resolved view, where the budget is None when the view declares none'''
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', None), None
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}', getattr(view_class, 'query_budgets', {}).get(action)
+
+
+class ProfilingMiddleware:
+    log_sample_rate = getattr(settings, 'PROFILING_LOG_SAMPLE_RATE', 0.01)
+    enforce_query_budgets = getattr(settings, 'QUERY_BUDGETS_ENFORCED', False)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = _profiles.profile = RequestProfile()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _profiles.profile = None
+        profile.finish()
+        response['Server-Timing'] = profile.get_server_timing()
+
+        if profile.is_over_budget():
+            message = f'{profile.view_name} ran {profile.num_queries} queries, over its budget of ' \
+                      f'{profile.query_budget}'
+            if self.enforce_query_budgets:
+                raise QueryBudgetExceeded(message)
+            logger.warning('%s: %s', message, json.dumps(self.get_log_record(request, response, profile)))
+        elif random.random() < self.log_sample_rate:
+            logger.info(json.dumps(self.get_log_record(request, response, profile)))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = get_profile()
+        if profile is not None:
+            profile.view_name, profile.query_budget = get_view_budget(view_func, request.method)
+
+    @staticmethod
+    def get_log_record(request, response, profile):
+        return {'method': request.method, 'path': request.path, 'status': response.status_code, **profile.as_dict()}
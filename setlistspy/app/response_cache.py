@@ -0,0 +1,138 @@
+'''
+Precompressed, ETag-aware caching of rendered JSON responses, in place of django.views.decorators.cache.cache_page.
+
+A cached response is stored once, gzipped, along with the hash of its content as its ETag. Requests whose
+If-None-Match holds that ETag get a 304 Not Modified straight from the cache, and the others the stored gzipped
+content, which is only decompressed for the rare clients that don't accept gzip. Responses are cached under a key
+prefix which changes with the cache generations of the models they were built from (see setlistspy.app.cache).
+
+Only JSON is cached: the browsable API's HTML carries the CSRF token and user of the request that rendered it.
+'''
+import gzip
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+from django.utils.http import parse_etags
+
+CachedResponse = namedtuple('CachedResponse', ('etag', 'content_type', 'compressed_content'))
+
+COMPRESS_LEVEL = 6
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class CachedHttpResponse(HttpResponse):
+    '''Response served from a CachedResponse'''
+
+    def __init__(self, content, gzipped, **kwargs):
+        super().__init__(content, **kwargs)
+        self.gzipped = gzipped
+
+    @cached_property
+    def data(self):
+        # As DRF responses have, for code and tests inspecting responses whether they were cached or not
+        content = gzip.decompress(self.content) if self.gzipped else self.content
+        return json.loads(content.decode(self.charset))
+
+
+def get_etag(content):
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def get_response_cache_key(request, key_prefix):
+    url = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return f'response:{key_prefix}:{request.accepted_media_type}:{url}'
+
+
+def is_cacheable(request):
+    return getattr(request, 'accepted_renderer', None) is not None and request.accepted_renderer.format == 'json'
+
+
+def render(view, request, response):
+    '''Render a DRF response within the view, as its dispatch would after it returns'''
+    # finalize_response pops the view's Vary, which the response the dispatch finalizes in the end still needs
+    headers = dict(view.headers)
+    response = view.finalize_response(request, response)
+    response.render()
+    view.headers = headers
+    return response
+
+
+def compress(response):
+    return CachedResponse(get_etag(response.content), response['Content-Type'],
+                          gzip.compress(response.content, COMPRESS_LEVEL))
+
+
+def is_not_modified(request, etag):
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    # Weak comparison, as If-None-Match calls for
+    return '*' in etags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in etags)
+
+
+def accepts_gzip(request):
+    return bool(re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def respond(view, request, cached_response):
+    '''Return a cached response, as a 304 when the client has it already and gzipped when it accepts gzip'''
+    if is_not_modified(request, cached_response.etag):
+        response = HttpResponseNotModified()
+    elif accepts_gzip(request):
+        response = CachedHttpResponse(cached_response.compressed_content, gzipped=True,
+                                      content_type=cached_response.content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = CachedHttpResponse(gzip.decompress(cached_response.compressed_content), gzipped=False,
+                                      content_type=cached_response.content_type)
+    response['ETag'] = cached_response.etag
+    # On top of the view's own Vary, which its dispatch adds
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def get_cached_response(view, request, key_prefix, timeout, get_response):
+    '''
+    Serve a response from the cache, or get it from get_response(), which returns a DRF response, and cache it when
+    it's successful
+    '''
+    if not is_cacheable(request):
+        return get_response()
+    key = get_response_cache_key(request, key_prefix)
+    cached_response = cache.get(key)
+    if cached_response is None:
+        response = get_response()
+        if response.status_code != 200:
+            return response
+        cached_response = compress(render(view, request, response))
+        cache.set(key, cached_response, timeout)
+    return respond(view, request, cached_response)
+
+
+def get_compressed_response(view, request, response, timeout):
+    '''
+    Serve a DRF response with its content hash as its ETag and, when the client accepts gzip, compressed once per
+    distinct content. For responses whose data is cached elsewhere, such as stats.
+    '''
+    if not is_cacheable(request) or response.status_code != 200:
+        return response
+    response = render(view, request, response)
+    etag = get_etag(response.content)
+    not_modified = is_not_modified(request, etag)
+    if not_modified or not accepts_gzip(request):
+        if not_modified:
+            response = HttpResponseNotModified()
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+    key = f'compressed_response:{etag}'
+    cached_response = cache.get(key)
+    if cached_response is None:
+        cached_response = compress(response)
+        cache.set(key, cached_response, timeout)
+    return respond(view, request, cached_response)
@@ -0,0 +1,153 @@
+'''
+Incrementally maintained play count rollups backing the /stats endpoints.
+
+Every track play counts once towards its DJ x artist, DJ x label and label x artist rollup rows and towards the
+total_plays of its artist and label. Changes are applied as deltas keyed by (dj key, artist key, label_id), so a whole
+ingest batch can be folded into a handful of set-based statements.
+
+The other counter columns which lists serialize and order by, i.e. the num_tracks of setlists, num_plays of tracks and
+num_setlists (with tracks) of DJs, are recounted for the setlists and tracks whose track plays changed.
+'''
+from collections import Counter, OrderedDict
+
+from django.db import connection
+
+from setlistspy.app.base_model import get_key_field
+from setlistspy.app.models import Artist, DJ, DJArtistPlayCount, DJLabelPlayCount, Label, LabelArtistPlayCount, \
+    Setlist, Track, TrackPlay
+from setlistspy.app.utils import batched
+
+PLAY_TABLE, SETLIST_TABLE, TRACK_TABLE = TrackPlay._meta.db_table, Setlist._meta.db_table, Track._meta.db_table
+
+# {model: (counter column, joins from its table aliased as counted, count)}, ordered so that counters come after those
+# they're counted from
+COUNTERS = OrderedDict([
+    (Setlist, ('num_tracks', f'LEFT JOIN {PLAY_TABLE} play ON play.setlist_id = counted.key', 'COUNT(play.id)')),
+    (Track, ('num_plays', f'LEFT JOIN {PLAY_TABLE} play ON play.track_id = counted.key', 'COUNT(play.id)')),
+    (DJ, ('num_setlists', f'LEFT JOIN {SETLIST_TABLE} setlist ON setlist.dj_id = counted.key',
+          'COUNT(setlist.id) FILTER (WHERE setlist.num_tracks > 0)')),
+    (Artist, ('total_plays', f'''LEFT JOIN {TRACK_TABLE} track ON track.artist_id = counted.key
+                                 LEFT JOIN {PLAY_TABLE} play ON play.track_id = track.key''', 'COUNT(play.id)')),
+    (Label, ('total_plays', f'LEFT JOIN {PLAY_TABLE} play ON play.label_id = counted.id', 'COUNT(play.id)')),
+])
+
+
+def get_play_key(track_play):
+    '''Return the (dj key, artist key, label_id) rollup key of a track play instance'''
+    return track_play.setlist.dj_id, track_play.track.artist_id, track_play.label_id
+
+
+def get_saved_play(track_play_id):
+    '''Return the (setlist key, track key, rollup key) of a track play as currently stored in the database, or None'''
+    saved_play = TrackPlay.objects.filter(pk=track_play_id)\
+        .values_list('setlist', 'track', 'setlist__dj', 'track__artist', 'label').first()
+    return saved_play and (saved_play[0], saved_play[1], saved_play[2:])
+
+
+def update_rollups(play_deltas):
+    '''Apply a mapping of {(dj key, artist key, label_id): change in number of plays} to the rollups'''
+    dj_artist_deltas, dj_label_deltas, label_artist_deltas = Counter(), Counter(), Counter()
+    artist_deltas, label_deltas = Counter(), Counter()
+    for (dj_id, artist_id, label_id), delta in play_deltas.items():
+        dj_artist_deltas[(dj_id, artist_id)] += delta
+        artist_deltas[artist_id] += delta
+        if label_id:
+            dj_label_deltas[(dj_id, label_id)] += delta
+            label_artist_deltas[(label_id, artist_id)] += delta
+            label_deltas[label_id] += delta
+
+    with connection.cursor() as cursor:
+        _upsert_play_counts(cursor, DJArtistPlayCount, ('dj_id', 'artist_id'), dj_artist_deltas)
+        _upsert_play_counts(cursor, DJLabelPlayCount, ('dj_id', 'label_id'), dj_label_deltas)
+        _upsert_play_counts(cursor, LabelArtistPlayCount, ('label_id', 'artist_id'), label_artist_deltas)
+        _increment_total_plays(cursor, Artist, artist_deltas)
+        _increment_total_plays(cursor, Label, label_deltas)
+
+
+def update_play_counters(setlist_keys, track_keys):
+    '''Recount the counters of the setlists and tracks whose track plays changed, and of the setlists' DJs'''
+    with connection.cursor() as cursor:
+        for batch in batched(setlist_keys):
+            _recount(cursor, Setlist, 'WHERE counted.key = ANY(%s::bigint[])', [list(batch)])
+            _recount(cursor, DJ, f'''
+                WHERE counted.key IN (SELECT dj_id FROM {SETLIST_TABLE} WHERE key = ANY(%s::bigint[]))
+            ''', [list(batch)])
+        for batch in batched(track_keys):
+            _recount(cursor, Track, 'WHERE counted.key = ANY(%s::bigint[])', [list(batch)])
+
+
+def recount_counters(models=None):
+    '''Recount the counter columns of the models (all by default), returning {model: number of rows corrected}'''
+    corrected = OrderedDict()
+    with connection.cursor() as cursor:
+        for model in COUNTERS:
+            if models is None or model in models:
+                corrected[model] = _recount(cursor, model)
+    return corrected
+
+
+def rebuild_rollups():
+    '''Recompute every rollup from scratch, e.g. after track plays were written without update_rollups'''
+    plays_sql = f'''
+        FROM {PLAY_TABLE} play
+        JOIN {TRACK_TABLE} track ON track.key = play.track_id
+        JOIN {SETLIST_TABLE} setlist ON setlist.key = play.setlist_id
+    '''
+    with connection.cursor() as cursor:
+        for model, key_columns, source_columns in (
+            (DJArtistPlayCount, 'dj_id, artist_id', 'setlist.dj_id, track.artist_id'),
+            (DJLabelPlayCount, 'dj_id, label_id', 'setlist.dj_id, play.label_id'),
+            (LabelArtistPlayCount, 'label_id, artist_id', 'play.label_id, track.artist_id'),
+        ):
+            table = model._meta.db_table
+            label_condition = 'WHERE play.label_id IS NOT NULL' if 'label_id' in key_columns else ''
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'''
+                INSERT INTO {table} ({key_columns}, play_count)
+                SELECT {source_columns}, COUNT(*) {plays_sql} {label_condition}
+                GROUP BY {source_columns}
+            ''')
+    recount_counters()
+
+
+def _recount(cursor, model, where='', params=()):
+    table = model._meta.db_table
+    column, joins, count = COUNTERS[model]
+    cursor.execute(f'''
+        UPDATE {table} SET {column} = counts.value
+        FROM (SELECT counted.id, {count} AS value FROM {table} counted {joins} {where} GROUP BY counted.id) counts
+        WHERE {table}.id = counts.id AND {table}.{column} <> counts.value
+    ''', params)
+    return cursor.rowcount
+
+
+def _upsert_play_counts(cursor, model, key_columns, deltas):
+    table = model._meta.db_table
+    columns = ', '.join(key_columns)
+    row_placeholder = f"({', '.join(['%s'] * (len(key_columns) + 1))})"
+    for batch in batched((key, delta) for key, delta in deltas.items() if delta):
+        cursor.execute(f'''
+            INSERT INTO {table} ({columns}, play_count) VALUES {', '.join([row_placeholder] * len(batch))}
+            ON CONFLICT ({columns}) DO UPDATE SET play_count = {table}.play_count + EXCLUDED.play_count
+        ''', [param for key, delta in batch for param in (*key, delta)])
+
+    # Drop rows whose plays have all been removed so they don't show up in top played lists
+    key_placeholder = f"({', '.join(['%s'] * len(key_columns))})"
+    for batch in batched(key for key, delta in deltas.items() if delta < 0):
+        cursor.execute(f'''
+            DELETE FROM {table}
+            WHERE ({columns}) IN ({', '.join([key_placeholder] * len(batch))}) AND play_count <= 0
+        ''', [param for key in batch for param in key])
+
+
+def _increment_total_plays(cursor, model, deltas):
+    '''Apply {key: change in number of plays}, keyed by what foreign keys to the model reference, to total_plays'''
+    table = model._meta.db_table
+    key_field = get_key_field(model)
+    key_placeholder = f'(%s::{key_field.db_type(connection)}, %s)'
+    for batch in batched((key, delta) for key, delta in deltas.items() if delta):
+        cursor.execute(f'''
+            UPDATE {table} SET total_plays = {table}.total_plays + deltas.delta
+            FROM (VALUES {', '.join([key_placeholder] * len(batch))}) AS deltas (key, delta)
+            WHERE {table}.{key_field.column} = deltas.key
+        ''', [param for key_delta in batch for param in key_delta])
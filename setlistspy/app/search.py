@@ -0,0 +1,84 @@
+'''
+Ranked substring and fuzzy search over names and titles.
+
+A search matches the rows whose field contains the query or, where the pg_trgm extension is installed, is similar to
+it (trigram similarity above pg_trgm.similarity_threshold), best matches first. Both conditions are on
+UPPER(field::text), the expression the trigram indexes of migration 0004 are built on.
+'''
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, CharField, F, FloatField, Q, Value, When
+from django.db.models.functions import Length, Upper
+
+from setlistspy.app.models import Artist, DJ, Label, Track
+
+SearchType = namedtuple('SearchType', ('model', 'field_name', 'detail_field_name'))
+
+# Entity types searched by search_all, with the field searched and an optional field identifying a hit further
+SEARCH_TYPES = OrderedDict([
+    ('artists', SearchType(Artist, 'name', None)),
+    ('tracks', SearchType(Track, 'title', 'artist__name')),
+    ('labels', SearchType(Label, 'name', None)),
+    ('djs', SearchType(DJ, 'name', None)),
+])
+
+
+def search_queryset(queryset, field_name, query):
+    '''Filter a queryset to the rows whose field matches the query and order them by relevance'''
+    query = query.strip()
+    matches = Q(**{f'{field_name}__icontains': query})
+    if has_trigram_extension():
+        queryset = queryset.annotate(
+            search_key=Upper(field_name),
+            search_rank=TrigramSimilarity(Upper(field_name), query.upper()),
+        )
+        matches |= Q(search_key__trigram_similar=query.upper())
+    else:
+        queryset = queryset.annotate(search_rank=Case(
+            When(**{f'{field_name}__iexact': query}, then=Value(1.0)),
+            When(**{f'{field_name}__istartswith': query}, then=Value(0.5)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+    return queryset.filter(matches).order_by('-search_rank', Length(field_name), field_name)
+
+
+def search_all(query, limit):
+    '''
+    Return {search type: [hit]} of the best matching rows of every search type, in a single query of one index lookup
+    per type and without counting the matches
+    '''
+    querysets = []
+    for name, search_type in SEARCH_TYPES.items():
+        detail = F(search_type.detail_field_name) if search_type.detail_field_name else Value(None, CharField())
+        queryset = search_queryset(search_type.model.objects.all(), search_type.field_name, query).annotate(
+            search_type=Value(name, CharField()), search_name=F(search_type.field_name), search_detail=detail,
+        ).values_list('search_type', 'pk', 'search_name', 'search_detail', 'search_rank')
+        querysets.append(queryset[:limit])
+
+    rows = list(querysets[0].union(*querysets[1:], all=True))
+    # Postgres appends the subqueries' rows in order, but a union is unordered as far as SQL is concerned
+    rows.sort(key=lambda row: -row[4])
+    hits = OrderedDict((name, []) for name in SEARCH_TYPES)
+    for name, pk, value, detail, rank in rows:
+        search_type = SEARCH_TYPES[name]
+        hit = OrderedDict([('id', pk), (search_type.field_name, value)])
+        if search_type.detail_field_name:
+            hit[search_type.detail_field_name.split('__')[0]] = detail
+        hit['rank'] = round(rank, 3)
+        hits[name].append(hit)
+    return hits
+
+
+def has_trigram_extension():
+    return _has_extension(connection.settings_dict['NAME'], 'pg_trgm')
+
+
+@lru_cache(maxsize=None)
+def _has_extension(database_name, extension_name):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = %s)', [extension_name])
+        return cursor.fetchone()[0]
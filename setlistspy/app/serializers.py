@@ -1,6 +1,18 @@
-from django.db.models import Case, Count, Max, Sum, When
 from rest_framework import serializers
 from setlistspy.app.models import Artist, DJ, Label, Setlist, Track, TrackPlay
+from setlistspy.app.stats import get_dj_stats
+
+
+def serialize_top_played(rollups, field_name, serializer_class, context):
+    '''Serialize the entities of an ordered list of play count rollup rows along with their play counts'''
+    rollups = list(rollups)
+    play_count_context = context
+    play_count_context['play_counts'] = {
+        getattr(rollup, field_name).pk: rollup.play_count
+        for rollup in rollups
+    }
+    entities = [getattr(rollup, field_name) for rollup in rollups]
+    return serializer_class(many=True, context=play_count_context).to_representation(entities)
 
 
 class DJSerializer(serializers.ModelSerializer):
@@ -22,79 +34,34 @@ class DJPlayCountSerializer(DJSerializer):
 
 
 class DJStatsSerializer(DJSerializer):
-    b2b_collaborators = serializers.SerializerMethodField(read_only=True)
-    number_of_setlists = serializers.SerializerMethodField(read_only=True)
-    most_stacked_setlist = serializers.SerializerMethodField(read_only=True)
-    top_played_artists = serializers.SerializerMethodField(read_only=True)
-    top_played_labels = serializers.SerializerMethodField(read_only=True)
+    '''
+    Stats for a DJ, computed in a single query by setlistspy.app.stats.get_dj_stats:
+    number of non-empty setlists, other DJs this DJ has done b2b sets with, the setlist with the most tracks,
+    and the DJ's most played artists and labels.
+    '''
+    b2b_collaborators = serializers.ReadOnlyField()
+    number_of_setlists = serializers.ReadOnlyField()
+    most_stacked_setlist = serializers.ReadOnlyField()
+    top_played_artists = serializers.ReadOnlyField()
+    top_played_labels = serializers.ReadOnlyField()
 
     class Meta:
         model = DJ
         fields = ('id', 'name', 'number_of_setlists', 'b2b_collaborators', 'most_stacked_setlist',
                   'top_played_artists', 'top_played_labels')
 
-    def get_number_of_setlists(self, obj):
-        '''Return number of non-empty setlists played by the DJ'''
-        return obj.setlists.exclude(tracks=None).count()
-
-    def get_b2b_collaborators(self, obj):
-        '''Get list of other DJs this DJ has done sets with'''
-        b2b_setlist_mixesdb_ids = obj.setlists.filter(b2b=True).values('mixesdb_id')
-        b2b_dj_qs = DJ.objects.filter(
-            pk__in=Setlist.objects.filter(mixesdb_id__in=b2b_setlist_mixesdb_ids).exclude(dj=obj).values('dj')
-        )
-        return DJSerializer(many=True, context=self.context).to_representation(b2b_dj_qs)
-
-    def get_most_stacked_setlist(self, obj):
-        annotated_setlist_qs = obj.setlists.all().annotate(Count('tracks'))
-        max_num_tracks = annotated_setlist_qs.aggregate(Max('tracks__count'))['tracks__count__max']
-        if max_num_tracks > 0:
-            most_stacked_setlist = annotated_setlist_qs.filter(tracks__count=max_num_tracks).first()
-            setlist_context = self.context
-            setlist_context['num_tracks'] = max_num_tracks
-            return SetlistSerializer(context=self.context).to_representation(instance=most_stacked_setlist)
-        return None
-
-    def get_top_played_artists(self, obj):
-        setlists_qs = obj.setlists.values('tracks__artist').order_by('tracks__artist')\
-            .annotate(count=Count('tracks__artist')).order_by('-count')[:25]
-        artist_play_counts = {
-            setlist['tracks__artist']: setlist['count']
-            for setlist in setlists_qs
-        }
-        preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(artist_play_counts.keys())])
-        top_artists_qs = Artist.objects.filter(pk__in=artist_play_counts.keys()).order_by(preserved_order)
-        artist_context = self.context
-        artist_context['play_counts'] = artist_play_counts
-        return ArtistPlayCountSerializer(many=True, context=artist_context).to_representation(top_artists_qs)
-
-    def get_top_played_labels(self, obj):
-        setlists_qs = obj.setlists.values('track_plays__label').order_by('track_plays__label')\
-            .annotate(count=Count('track_plays__label')).order_by('-count')[:25]
-        label_play_counts = {
-            setlist['track_plays__label']: setlist['count']
-            for setlist in setlists_qs
-        }
-        preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(label_play_counts.keys())])
-        top_artists_qs = Label.objects.filter(pk__in=label_play_counts.keys()).order_by(preserved_order)
-        label_context = self.context
-        label_context['play_counts'] = label_play_counts
-        return LabelPlayCountSerializer(many=True, context=label_context).to_representation(top_artists_qs)
+    def to_representation(self, instance):
+        return get_dj_stats(instance.pk)
 
 
 class SetlistSerializer(serializers.ModelSerializer):
     dj = DJSerializer()
-    num_tracks = serializers.SerializerMethodField(read_only=True)
+    num_tracks = serializers.ReadOnlyField()
 
     class Meta:
         model = Setlist
         fields = ('id', 'dj', 'title', 'mixesdb_id', 'b2b', 'num_tracks')
 
-    def get_num_tracks(self, obj):
-        if self.context.get('num_tracks'):
-            return self.context.get('num_tracks')
-        return obj.tracks.count()
-
     @classmethod
     def setup_queryset(cls, queryset, context):
         queryset = queryset.select_related("dj")
@@ -117,21 +84,12 @@ class ArtistStatsSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'total_plays', 'top_djs')
 
     def get_total_plays(self, obj):
-        return obj.tracks.annotate(play_count=Count('plays')).aggregate(total_plays=Sum('play_count'))['total_plays']
+        return obj.total_plays
 
     def get_top_djs(self, obj):
-        # Group the cumulative track plays on a label by the djs that played the tracks and order by the play count
-        tracks_qs = obj.tracks.values('plays__setlist__dj').order_by('plays__setlist__dj')\
-            .annotate(count=Count('plays__setlist__dj')).order_by('-count')[:25]
-        dj_play_counts = {
-            track['plays__setlist__dj']: track['count']
-            for track in tracks_qs
-        }
-        preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(dj_play_counts.keys())])
-        top_djs_qs = DJ.objects.filter(pk__in=dj_play_counts.keys()).order_by(preserved_order)
-        dj_context = self.context
-        dj_context['play_counts'] = dj_play_counts
-        return DJPlayCountSerializer(many=True, context=dj_context).to_representation(top_djs_qs)
+        # Read the djs that played the artist's tracks the most straight from the artist's rollup rows
+        top_dj_rollups = obj.dj_play_counts.select_related('dj').order_by('-play_count')[:25]
+        return serialize_top_played(top_dj_rollups, 'dj', DJPlayCountSerializer, self.context)
 
 
 class ArtistPlayCountSerializer(DJSerializer):
@@ -160,15 +118,8 @@ class LabelSerializer(BaseLabelSerializer):
         model = Label
         fields = ('id', 'name', 'total_plays')
 
-    @classmethod
-    def setup_queryset(cls, queryset, context):
-        queryset = queryset.annotate(total_plays=Count('track_plays'))
-        return queryset
-
     def get_total_plays(self, obj):
-        if hasattr(obj, 'total_plays'):
-            return obj.total_plays
-        return obj.track_plays.count()
+        return obj.total_plays
 
 
 class LabelPlayCountSerializer(LabelSerializer):
@@ -193,32 +144,14 @@ class LabelStatsSerializer(LabelSerializer):
         fields = ('id', 'name', 'total_plays', 'top_djs', 'top_played_artists')
 
     def get_top_djs(self, obj):
-        # Group the cumulative track plays on a label by the djs that played the tracks and order by the play count
-        plays_qs = obj.track_plays.values('setlist__dj').order_by('setlist__dj')\
-            .annotate(count=Count('setlist__dj')).order_by('-count')[:25]
-        dj_play_counts = {
-            play['setlist__dj']: play['count']
-            for play in plays_qs
-        }
-        preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(dj_play_counts.keys())])
-        top_djs_qs = DJ.objects.filter(pk__in=dj_play_counts.keys()).order_by(preserved_order)
-        dj_context = self.context
-        dj_context['play_counts'] = dj_play_counts
-        return DJPlayCountSerializer(many=True, context=dj_context).to_representation(top_djs_qs)
+        # Read the djs that played tracks on the label the most straight from the label's rollup rows
+        top_dj_rollups = obj.dj_play_counts.select_related('dj').order_by('-play_count')[:25]
+        return serialize_top_played(top_dj_rollups, 'dj', DJPlayCountSerializer, self.context)
 
     def get_top_played_artists(self, obj):
-        # Group the cumulative track plays on a label by track artists and order by the play count
-        plays_qs = obj.track_plays.values('track__artist').order_by('track__artist__name') \
-                   .annotate(count=Count('track__artist__name')).order_by('-count')[:25]
-        artist_play_counts = {
-            play['track__artist']: play['count']
-            for play in plays_qs
-        }
-        preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(artist_play_counts.keys())])
-        top_artists_qs = Artist.objects.filter(pk__in=artist_play_counts.keys()).order_by(preserved_order)
-        artist_context = self.context
-        artist_context['play_counts'] = artist_play_counts
-        return ArtistPlayCountSerializer(many=True, context=artist_context).to_representation(top_artists_qs)
+        # Read the most played artists on the label straight from the label's rollup rows
+        top_artist_rollups = obj.artist_play_counts.select_related('artist').order_by('-play_count')[:25]
+        return serialize_top_played(top_artist_rollups, 'artist', ArtistPlayCountSerializer, self.context)
 
 
 class TrackSerializer(serializers.ModelSerializer):
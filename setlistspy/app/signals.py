@@ -1,11 +1,77 @@
+from collections import Counter
+
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 from rest_framework.authtoken.models import Token
 
+from setlistspy.app.cache import CACHED_MODELS, bump_generations
+from setlistspy.app.collaborations import update_collaborations
+from setlistspy.app.models import Setlist, TrackPlay
+from setlistspy.app.rollups import get_play_key, get_saved_play, update_play_counters, update_rollups
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created and not kwargs.get('raw', False):
-        Token.objects.create(user=instance)
\ No newline at end of file
+        Token.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=TrackPlay)
+def remember_saved_play_key(sender, instance=None, **kwargs):
+    if not instance._state.adding and not kwargs.get('raw', False):
+        instance._saved_play = get_saved_play(instance.pk)
+
+
+@receiver(post_save, sender=TrackPlay)
+def update_play_rollups_on_save(sender, instance=None, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    play_deltas = Counter({get_play_key(instance): 1})
+    setlist_ids, track_ids = {instance.setlist_id}, {instance.track_id}
+    saved_play = getattr(instance, '_saved_play', None)
+    if saved_play:
+        saved_setlist_id, saved_track_id, saved_play_key = saved_play
+        play_deltas[saved_play_key] -= 1
+        setlist_ids.add(saved_setlist_id)
+        track_ids.add(saved_track_id)
+        instance._saved_play = None
+    update_rollups(play_deltas)
+    if kwargs.get('created') or len(setlist_ids) > 1 or len(track_ids) > 1:
+        update_play_counters(setlist_ids, track_ids)
+
+
+@receiver(post_delete, sender=TrackPlay)
+def update_play_rollups_on_delete(sender, instance=None, **kwargs):
+    update_rollups({get_play_key(instance): -1})
+    update_play_counters([instance.setlist_id], [instance.track_id])
+
+
+@receiver(pre_save, sender=Setlist)
+def remember_saved_setlist_dj(sender, instance=None, **kwargs):
+    if not instance._state.adding and not kwargs.get('raw', False):
+        instance._saved_dj_id = Setlist.objects.filter(pk=instance.pk).values_list('dj', flat=True).first()
+
+
+@receiver(post_save, sender=Setlist)
+def update_collaborations_on_save(sender, instance=None, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    dj_keys = {instance.dj_id, getattr(instance, '_saved_dj_id', None)} - {None}
+    instance._saved_dj_id = None
+    update_collaborations(dj_keys)
+
+
+@receiver(post_delete, sender=Setlist)
+def update_collaborations_on_delete(sender, instance=None, **kwargs):
+    update_collaborations([instance.dj_id])
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    bump_generations(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'invalidate_cached_{model.__name__}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'invalidate_cached_{model.__name__}')
@@ -0,0 +1,85 @@
+'''
+Single query stats engine for the /stats endpoints.
+
+Builds the whole stats payload, in the same shape the stats serializers document, as one JSON document in Postgres
+so a stats request costs a fixed number of round trips however large the DJ's catalogue is.
+'''
+from django.db import connection
+
+from setlistspy.app.models import Artist, DJ, DJArtistPlayCount, DJCollaboration, DJLabelPlayCount, Label, Setlist
+
+DJ_STATS_SQL = f'''
+WITH stats_dj AS (
+    SELECT * FROM {DJ._meta.db_table} WHERE id = %(dj_id)s
+),
+most_stacked_setlist AS (
+    SELECT id, title, mixesdb_id, b2b, num_tracks
+    FROM {Setlist._meta.db_table}
+    WHERE dj_id = (SELECT key FROM stats_dj) AND num_tracks > 0
+    ORDER BY num_tracks DESC
+    LIMIT 1
+),
+b2b_collaborators AS (
+    SELECT dj.id, dj.name
+    FROM {DJCollaboration._meta.db_table} collaboration
+    JOIN {DJ._meta.db_table} dj ON dj.key = collaboration.collaborator_id
+    WHERE collaboration.dj_id = (SELECT key FROM stats_dj)
+),
+top_played_artists AS (
+    SELECT artist.id, artist.name, rollup.play_count
+    FROM {DJArtistPlayCount._meta.db_table} rollup
+    JOIN {Artist._meta.db_table} artist ON artist.key = rollup.artist_id
+    WHERE rollup.dj_id = (SELECT key FROM stats_dj)
+    ORDER BY rollup.play_count DESC
+    LIMIT %(top_n)s
+),
+top_played_labels AS (
+    SELECT label.id, label.name, rollup.play_count
+    FROM {DJLabelPlayCount._meta.db_table} rollup
+    JOIN {Label._meta.db_table} label ON label.id = rollup.label_id
+    WHERE rollup.dj_id = (SELECT key FROM stats_dj)
+    ORDER BY rollup.play_count DESC
+    LIMIT %(top_n)s
+)
+SELECT json_build_object(
+    'id', dj.id,
+    'name', dj.name,
+    'number_of_setlists', dj.num_setlists,
+    'b2b_collaborators', COALESCE(
+        (SELECT json_agg(json_build_object('id', id, 'name', name) ORDER BY name) FROM b2b_collaborators),
+        '[]'::json
+    ),
+    'most_stacked_setlist', (
+        SELECT json_build_object(
+            'id', setlist.id,
+            'dj', json_build_object('id', dj.id, 'name', dj.name),
+            'title', setlist.title,
+            'mixesdb_id', setlist.mixesdb_id,
+            'b2b', setlist.b2b,
+            'num_tracks', setlist.num_tracks
+        )
+        FROM most_stacked_setlist setlist
+    ),
+    'top_played_artists', COALESCE(
+        (SELECT json_agg(json_build_object('id', id, 'name', name, 'play_count', play_count)
+                         ORDER BY play_count DESC)
+         FROM top_played_artists),
+        '[]'::json
+    ),
+    'top_played_labels', COALESCE(
+        (SELECT json_agg(json_build_object('id', id, 'name', name, 'play_count', play_count)
+                         ORDER BY play_count DESC)
+         FROM top_played_labels),
+        '[]'::json
+    )
+)
+FROM stats_dj dj
+'''
+
+
+def get_dj_stats(dj_id, top_n=25):
+    '''Return the stats payload of a DJ, or None if the DJ doesn't exist'''
+    with connection.cursor() as cursor:
+        cursor.execute(DJ_STATS_SQL, {'dj_id': dj_id, 'top_n': top_n})
+        row = cursor.fetchone()
+    return row[0] if row else None
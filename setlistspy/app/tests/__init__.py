@@ -1 +1,3 @@
 from .api import *
+from .ingest import *
+from .indexes import *
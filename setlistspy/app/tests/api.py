@@ -1,8 +1,34 @@
+import base64
+import csv
+import gzip
+import json
+import time
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.cache import cc_delim_re
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
-from setlistspy.app.models import Setlist
+from setlistspy.app import local_cache
+from setlistspy.app.benchmarks import api as api_benchmark
+from setlistspy.app.benchmarks.catalogue import generate_setlists
+from setlistspy.app.cache import batch_invalidation, bump_generations, get_generation_key_prefix
+from setlistspy.app.collaborations import rebuild_collaborations
+from setlistspy.app.models import Artist, DJ, DJCollaboration, Setlist, Track, TrackPlay
+from setlistspy.app.pagination import SetSpyPagination
+from setlistspy.app.profiling import ProfilingMiddleware, QueryBudgetExceeded, is_query
+from setlistspy.app.jobs import StatsJob, get_serializer_path
+from setlistspy.app.rollups import rebuild_rollups
+from setlistspy.app.search import has_trigram_extension, search_queryset
+from setlistspy.app.serializers import ArtistStatsSerializer, DJStatsSerializer, SetlistSerializer
+from setlistspy.app.views import DJViewSet, TrackPlayViewSet
 from setlistspy.app.factories import ArtistFactory, DJFactory, LabelFactory, SetlistFactory, TrackFactory, \
     TrackPlayFactory, UserFactory
 
@@ -28,6 +54,79 @@ class ArtistsApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
         self.assertEqual(res.data['count'], 3)
 
+    def test_list_cache_invalidation(self):
+        ArtistFactory()
+        res = self.client.get(self.list_url)
+        self.assertEqual(res.data['count'], 1)
+
+        # Changes to models the list doesn't depend on leave the cached list in place
+        DJFactory()
+        with CaptureQueriesContext(connection) as cached_queries:
+            res = self.client.get(self.list_url)
+        self.assertEqual(res.data['count'], 1)
+        self.assertFalse([query for query in cached_queries if 'app_artist' in query['sql']])
+
+        # Changes to artists invalidate it
+        ArtistFactory()
+        res = self.client.get(self.list_url)
+        self.assertEqual(res.data['count'], 2)
+        with batch_invalidation():
+            Artist.objects.first().delete()
+            res = self.client.get(self.list_url)
+            self.assertEqual(res.data['count'], 2)
+        res = self.client.get(self.list_url)
+        self.assertEqual(res.data['count'], 1)
+
+    def test_cache_invalidation_on_commit(self):
+        # Generations are bumped again once the transaction commits, past responses cached in the meantime
+        with mock.patch('setlistspy.app.cache.transaction.on_commit') as on_commit:
+            ArtistFactory()
+        generation_key_prefix = get_generation_key_prefix([Artist])
+        on_commit.call_args[0][0]()
+        self.assertNotEqual(get_generation_key_prefix([Artist]), generation_key_prefix)
+
+    def test_list_follows_play_counts(self):
+        artists = [ArtistFactory(), ArtistFactory()]
+        TrackPlayFactory(track__artist=artists[0])
+        res = self.client.get(self.list_url, {'ordering': '-total_plays'})
+        self.assertEqual(res.json()['results'][0]['id'], str(artists[0].pk))
+
+        # The cached list is invalidated by the track plays its order changes with
+        for i in range(2):
+            TrackPlayFactory(track__artist=artists[1])
+        res = self.client.get(self.list_url, {'ordering': '-total_plays'})
+        self.assertEqual(res.json()['results'][0]['id'], str(artists[1].pk))
+
+    def test_conditional_requests(self):
+        artist = ArtistFactory()
+        TrackPlayFactory(track__artist=artist)
+        for url, key, value in ((self.list_url, 'count', 1),
+                                (reverse('artist-stats', kwargs={'pk': artist.pk.hex}), 'name', artist.name)):
+            res = self.client.get(url)
+            etag = res['ETag']
+            self.assertLessEqual({'Accept', 'Accept-Encoding'}, set(cc_delim_re.split(res['Vary'])))
+
+            # Revalidated, and served gzipped without compressing the response again
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=f'W/"other", {etag}')
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(res['ETag'], etag)
+            res = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual((res['Content-Encoding'], res['ETag']), ('gzip', etag))
+            self.assertLessEqual({'Accept', 'Accept-Encoding'}, set(cc_delim_re.split(res['Vary'])))
+            self.assertEqual(json.loads(gzip.decompress(res.content).decode('utf-8'))[key], value)
+
+        # Cached lists are revalidated without touching Postgres, until they change
+        etag = self.client.get(self.list_url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Bar the savepoint ATOMIC_REQUESTS wraps the request in
+        self.assertFalse([query for query in queries if is_query(query['sql'])])
+        ArtistFactory()
+        res = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
     def test_retrieve(self):
         artist = ArtistFactory()
         url = reverse('artist-detail', kwargs={'pk': artist.pk.hex})
@@ -46,6 +145,30 @@ class ArtistsApiTestCase(SetlistSpyApiTestCase):
         res = self.client.get(self.list_url, {'name__in': f'{artist1.name},{artist2.name}'}, format='json')
         self.assertEqual(res.data['count'], 2)
 
+    def test_search(self):
+        for name in ('Robert Hoodie', 'Robert Hood', 'Hoodlum Priest', 'Jeff Mills'):
+            ArtistFactory(name=name)
+        res = self.client.get(self.list_url, {'search': 'robert hood'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+        self.assertEqual([artist['name'] for artist in res.data['results']], ['Robert Hood', 'Robert Hoodie'])
+        res = self.client.get(self.list_url, {'search': 'hood'}, format='json')
+        self.assertEqual({artist['name'] for artist in res.data['results']},
+                         {'Robert Hood', 'Robert Hoodie', 'Hoodlum Priest'})
+
+    def test_search_query_plan(self):
+        if not has_trigram_extension():
+            self.skipTest('pg_trgm is not installed')
+        ArtistFactory(name='Robert Hood')
+        queryset = search_queryset(Artist.objects.all(), 'name', 'robert hod')
+        self.assertEqual(list(queryset.values_list('name', flat=True)), ['Robert Hood'])
+        with connection.cursor() as cursor:
+            # The table is far too small for the planner to pick an index otherwise
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('app_artist_name_trgm', plan)
+
     def test_stats(self):
         # 3 setlists by different DJs -- 10 tracks by artist 1 in the first, 5 tracks by artist 1 in the 2nd,
         # and 2 tracks by another artist entirely in the third
@@ -67,13 +190,52 @@ class ArtistsApiTestCase(SetlistSpyApiTestCase):
         url = reverse('artist-stats', kwargs={'pk': artist.pk.hex})
         res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
-        self.assertEqual(res.json()['total_plays'], 15) # 10 + 5
+        self.assertEqual(res.json()['total_plays'], 15)  # 10 + 5
         self.assertEqual(len(res.json()['top_djs']), 2)
         self.assertEqual(res.json()['top_djs'][0]['id'], setlists[0].dj.id.__str__())
         self.assertEqual(res.json()['top_djs'][0]['play_count'], 10)
         self.assertEqual(res.json()['top_djs'][1]['id'], setlists[1].dj.id.__str__())
         self.assertEqual(res.json()['top_djs'][1]['play_count'], 5)
 
+    def test_stats_cache(self):
+        artist = ArtistFactory(name='Aphex Twin')
+        TrackPlayFactory(track__artist=artist)
+        url = reverse('artist-stats', kwargs={'pk': artist.pk.hex})
+        res = self.client.get(url)
+        self.assertEqual(res.json()['total_plays'], 1)
+
+        # Served from the cache
+        with CaptureQueriesContext(connection) as cached_queries:
+            res = self.client.get(url)
+        self.assertEqual(res.json()['total_plays'], 1)
+        self.assertFalse([query for query in cached_queries if 'app_djartistplaycount' in query['sql']])
+
+        # Once the catalogue changes, the stale stats are served while they're refreshed in the background, once
+        TrackPlayFactory(track__artist=artist)
+        job = StatsJob()
+        job_args = (get_serializer_path(ArtistStatsSerializer), str(artist.pk))
+        with mock.patch.object(StatsJob, 'async_refresh') as async_refresh:
+            for i in range(2):
+                res = self.client.get(url)
+                self.assertEqual(res.json()['total_plays'], 1)
+        async_refresh.assert_called_once_with(*job_args)
+        job.refresh(*job_args)
+        res = self.client.get(url)
+        self.assertEqual(res.json()['total_plays'], 2)
+
+        # Likewise once expired, e.g. after rows were changed behind the ORM's back
+        Artist.objects.filter(pk=artist.pk).update(name='AFX')
+        job.store(job.key(*job_args), time.time() - 1, job.cache.get(job.key(*job_args))[1])
+        with mock.patch.object(StatsJob, 'async_refresh') as async_refresh:
+            res = self.client.get(url)
+        self.assertEqual(res.json()['name'], 'Aphex Twin')
+        async_refresh.assert_called_once_with(*job_args)
+
+        # Warming the most requested stats refreshes them
+        call_command('warm_stats', top=10, stdout=StringIO())
+        res = self.client.get(url)
+        self.assertEqual(res.json()['name'], 'AFX')
+
 
 class DJsApiTestCase(SetlistSpyApiTestCase):
     list_url = reverse('dj-list')
@@ -91,6 +253,26 @@ class DJsApiTestCase(SetlistSpyApiTestCase):
         res = self.client.get(url, format='json')
         self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
 
+    def test_cached_object(self):
+        dj = DJFactory(name='Jeff Mills')
+        url = reverse('dj-detail', kwargs={'pk': dj.pk.hex})
+        res = self.client.get(url, format='json')
+        self.assertEqual(res.data['name'], 'Jeff Mills')
+
+        # Then served from the local tier, without looking up the DJ
+        local_hits = local_cache._counts['local']
+        with CaptureQueriesContext(connection) as cached_queries:
+            res = self.client.get(url, format='json')
+        self.assertEqual(res.data['name'], 'Jeff Mills')
+        self.assertFalse([query for query in cached_queries if f'"{DJ._meta.db_table}"' in query['sql']])
+        self.assertGreater(local_cache._counts['local'], local_hits)
+
+        # Until the DJ changes
+        dj.name = 'The Wizard'
+        dj.save()
+        res = self.client.get(url, format='json')
+        self.assertEqual(res.data['name'], 'The Wizard')
+
     def test_filters(self):
         dj1 = DJFactory(name='Jeff Mills')
         dj2 = DJFactory(name='Surgeon')
@@ -166,7 +348,8 @@ class DJsApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.json()['top_played_artists'][0]['play_count'], 15)  # 5 tracks * 3 sets = 15
         self.assertEqual(res.json()['top_played_artists'][1]['play_count'], 9)  # 3 tracks * 3 sets = 9
         self.assertEqual(res.json()['top_played_artists'][2]['play_count'], 6)  # 2 tracks * 3 sets = 6
-        self.assertEqual(res.json()['top_played_labels'][0]['play_count'], 12)  # 4 track plays on label # 1 * 3 sets = 12
+        # 4 track plays on label # 1 * 3 sets = 12
+        self.assertEqual(res.json()['top_played_labels'][0]['play_count'], 12)
         self.assertEqual(res.json()['top_played_labels'][1]['play_count'], 9)  # 3 track plays on label # 2 * 3 sets = 9
         self.assertEqual(res.json()['top_played_labels'][2]['play_count'], 6)  # 2 track plays on label # 3 * 3 sets = 6
         self.assertEqual(res.json()['top_played_labels'][3]['play_count'], 3)  # 1 track plays on label # 4 * 3 sets = 3
@@ -175,10 +358,75 @@ class DJsApiTestCase(SetlistSpyApiTestCase):
         # Make the first setlist 1 track longer to make sure the 'most stacked setlist' stat works right
         first_setlist = Setlist.objects.get(mixesdb_id=0)
         TrackPlayFactory(setlist=first_setlist, set_order=11)
+        StatsJob().refresh(get_serializer_path(DJStatsSerializer), str(dj.pk))
         res = self.client.get(url, format='json')
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.json()['most_stacked_setlist']['id'], first_setlist.pk.__str__())
 
+    def test_stats_query_count(self):
+        dj = DJFactory()
+        other_dj = DJFactory()
+        url = reverse('dj-stats', kwargs={'pk': dj.pk.hex})
+
+        def add_setlists(num_setlists):
+            for i in range(num_setlists):
+                setlist = SetlistFactory(dj=dj, b2b=True)
+                SetlistFactory(dj=other_dj, mixesdb_id=setlist.mixesdb_id, b2b=True)
+                for j in range(5):
+                    TrackPlayFactory(setlist=setlist, set_order=j)
+
+        add_setlists(1)
+        with CaptureQueriesContext(connection) as small_catalogue_queries:
+            res = self.client.get(url, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        add_setlists(10)
+        # Computed afresh rather than served stale
+        StatsJob().delete(get_serializer_path(DJStatsSerializer), str(dj.pk))
+        with CaptureQueriesContext(connection) as large_catalogue_queries:
+            res = self.client.get(url, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(large_catalogue_queries), len(small_catalogue_queries))
+
+        stats = res.json()
+        self.assertEqual(stats['number_of_setlists'], 11)
+        self.assertEqual(stats['b2b_collaborators'], [{'id': str(other_dj.pk), 'name': other_dj.name}])
+        most_stacked_setlist = Setlist.objects.get(pk=stats['most_stacked_setlist']['id'])
+        self.assertEqual(stats['most_stacked_setlist'],
+                         SetlistSerializer(most_stacked_setlist).data)
+        self.assertEqual(len(stats['top_played_artists']), 25)
+        self.assertEqual(len(stats['top_played_labels']), 25)
+
+    def test_collaborators(self):
+        dj, partner, occasional_partner, partners_partner = (DJFactory(name=name) for name in (
+            'Jeff Mills', 'Mike Banks', 'Robert Hood', 'Underground Resistance'))
+
+        def add_b2b_setlist(mixesdb_id, *djs):
+            return [SetlistFactory(dj=b2b_dj, mixesdb_id=mixesdb_id, b2b=True) for b2b_dj in djs]
+
+        add_b2b_setlist(1, dj, partner)
+        partner_setlist = add_b2b_setlist(2, dj, partner)[1]
+        add_b2b_setlist(3, dj, occasional_partner)
+        add_b2b_setlist(4, partner, partners_partner)
+        url = reverse('dj-collaborators', kwargs={'pk': dj.pk.hex})
+
+        def get_collaborators(**params):
+            res = self.client.get(url, params, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return [(collaborator['name'], collaborator['hops'], collaborator['weight']) for collaborator in res.json()]
+
+        self.assertEqual(get_collaborators(), [('Mike Banks', 1, 2), ('Robert Hood', 1, 1)])
+        self.assertEqual(get_collaborators(hops=2), [('Mike Banks', 1, 2), ('Robert Hood', 1, 1),
+                                                     ('Underground Resistance', 2, 1)])
+        self.assertEqual(get_collaborators(hops=2, limit=1), [('Mike Banks', 1, 2)])
+
+        # The graph is kept up to date as setlists change, as a rebuild from scratch would have it
+        partner_setlist.delete()
+        self.assertEqual(get_collaborators(), [('Mike Banks', 1, 1), ('Robert Hood', 1, 1)])
+        edges = set(DJCollaboration.objects.values_list('dj', 'collaborator', 'num_setlists'))
+        self.assertEqual(rebuild_collaborations(), len(edges))
+        self.assertEqual(set(DJCollaboration.objects.values_list('dj', 'collaborator', 'num_setlists')), edges)
+
 
 class LabelsApiTestCase(SetlistSpyApiTestCase):
     list_url = reverse('label-list')
@@ -256,6 +504,29 @@ class LabelsApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.json()['top_played_artists'][1]['id'], other_artist.id.__str__())
         self.assertEqual(res.json()['top_played_artists'][1]['play_count'], 3)
 
+    def test_stats_follow_play_changes(self):
+        label = LabelFactory()
+        other_label = LabelFactory()
+        plays = [TrackPlayFactory(label=label) for i in range(3)]
+        url = reverse('label-stats', kwargs={'pk': label.pk.hex})
+
+        # Moving a play to another label and deleting another is reflected in the rollups
+        plays[0].label = other_label
+        plays[0].save()
+        plays[1].delete()
+        res = self.client.get(url, format='json')
+        self.assertEqual(res.json()['total_plays'], 1)
+        self.assertEqual(len(res.json()['top_djs']), 1)
+        self.assertEqual(res.json()['top_djs'][0]['id'], plays[2].setlist.dj.id.__str__())
+        self.assertEqual(len(res.json()['top_played_artists']), 1)
+
+        # Rebuilding the rollups from scratch gives the same result
+        rebuild_rollups()
+        rebuilt_res = self.client.get(url, format='json')
+        self.assertEqual(rebuilt_res.json(), res.json())
+        other_label.refresh_from_db()
+        self.assertEqual(other_label.total_plays, 1)
+
 
 class TracksApiTestCase(SetlistSpyApiTestCase):
     list_url = reverse('track-list')
@@ -267,6 +538,28 @@ class TracksApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
         self.assertEqual(res.data['count'], 3)
 
+    def test_cursor_pagination(self):
+        tracks = [TrackFactory(artist__name=artist_name, title=title) for artist_name, title in
+                  (('AFX', 'Xtal'), ('AFX', 'Analord'), ('Basic Channel', 'Quadrant Dub'), ('Autechre', 'Gantz Graf'))]
+        track_ids = []
+        res = self.client.get(self.list_url, {'cursor': '', 'limit': 3})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+            self.assertNotIn('count', res.data)
+            track_ids += [track['id'] for track in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+        self.assertEqual(track_ids, [str(tracks[i].id) for i in (1, 0, 3, 2)])
+
+        res = self.client.get(self.list_url, {'cursor': 'not a cursor'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        # Cursors of the wrong length, or with values of the wrong type for the ordering fields
+        for position in (['AFX', 'Xtal'], ['AFX', 'Xtal', 'not a uuid'], ['AFX', 'Xtal', None]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            res = self.client.get(self.list_url, {'cursor': cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_retrieve(self):
         track = TrackFactory()
         url = reverse('track-detail', kwargs={'pk': track.pk.hex})
@@ -283,27 +576,30 @@ class TracksApiTestCase(SetlistSpyApiTestCase):
         TrackPlayFactory(track=track3, set_order=3)
 
         # By title
-        res = self.client.get(self.list_url, {'title': track1.title.upper()}, format='json') # case insensitive
+        res = self.client.get(self.list_url, {'title': track1.title.upper()}, format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         res = self.client.get(self.list_url, {'title__in': f'{track1.title},{track2.title}'}, format='json')
         self.assertEqual(res.data['count'], 2)
 
         # By artist name
-        res = self.client.get(self.list_url, {'artist__name': track1.artist.name.upper()}, format='json') # case insensitive
+        res = self.client.get(self.list_url, {'artist__name': track1.artist.name.upper()},
+                              format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         res = self.client.get(self.list_url, {'artist__name__in': f'{track1.artist.name},{track2.artist.name}'},
                               format='json')
         self.assertEqual(res.data['count'], 2)
 
         # By setlist title
-        res = self.client.get(self.list_url, {'setlists__title': track1.setlists.first().title.upper()}, format='json')   # case insensitive
+        res = self.client.get(self.list_url, {'setlists__title': track1.setlists.first().title.upper()},
+                              format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         track_filter = f'{track1.setlists.first().title},{track2.setlists.first().title}'
         res = self.client.get(self.list_url, {'setlists__title__in': track_filter}, format='json')
         self.assertEqual(res.data['count'], 2)
 
         # By setlist dj name
-        res = self.client.get(self.list_url, {'setlists__dj__name': track1.setlists.first().dj.name.upper()}, format='json')  # case insensitive
+        res = self.client.get(self.list_url, {'setlists__dj__name': track1.setlists.first().dj.name.upper()},
+                              format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         track_filter = {'setlists__dj__name__in': f'{track1.setlists.first().dj.name},' +
                                                   f'{track2.setlists.first().dj.name}'}
@@ -311,10 +607,11 @@ class TracksApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.data['count'], 2)
 
         # By label name
-        res = self.client.get(self.list_url, {'plays__label__name': track1.plays.first().label.name.upper()}, format='json')  # case insensitive
+        res = self.client.get(self.list_url, {'plays__label__name': track1.plays.first().label.name.upper()},
+                              format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         # Use complex filter to support value with commas in it
-        track_filter = {'filters': f'(plays__label__name={track1.plays.first().label.name})|' + \
+        track_filter = {'filters': f'(plays__label__name={track1.plays.first().label.name})|' +
                                    f'(plays__label__name={track2.plays.first().label.name})'}
         res = self.client.get(self.list_url, track_filter, format='json')
         self.assertEqual(res.data['count'], 2)
@@ -326,6 +623,62 @@ class TracksApiTestCase(SetlistSpyApiTestCase):
         res = self.client.get(self.list_url, track_filter, format='json')
         self.assertEqual(res.data['count'], 2)
 
+    def test_popularity(self):
+        tracks = [TrackFactory() for i in range(3)]
+        for track, num_plays in zip(tracks, (1, 3, 2)):
+            for i in range(num_plays):
+                TrackPlayFactory(track=track, set_order=1)
+
+        res = self.client.get(self.list_url, {'ordering': '-num_plays'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+        self.assertEqual([track['id'] for track in res.data['results']], [str(tracks[i].id) for i in (1, 2, 0)])
+        res = self.client.get(self.list_url, {'num_plays__gte': 2}, format='json')
+        self.assertEqual(res.data['count'], 2)
+
+        # Moving a play to another track moves its count along
+        play = tracks[1].plays.first()
+        play.track = tracks[0]
+        play.save()
+        tracks[2].plays.first().delete()
+        self.assertEqual([Track.objects.get(pk=track.pk).num_plays for track in tracks], [2, 2, 1])
+
+        # Drifted counters are repaired by recounting
+        Track.objects.update(num_plays=0)
+        Setlist.objects.update(num_tracks=0)
+        out = StringIO()
+        call_command('recount', 'track', stdout=out)
+        self.assertIn('Track.num_plays: corrected 3 rows', out.getvalue())
+        self.assertNotIn('Setlist', out.getvalue())
+        self.assertEqual([Track.objects.get(pk=track.pk).num_plays for track in tracks], [2, 2, 1])
+        call_command('recount', stdout=out)
+        self.assertIn('Setlist.num_tracks: corrected 5 rows', out.getvalue())
+        self.assertEqual(Setlist.objects.filter(num_tracks=1).count(), 5)
+
+    def test_related_filters_exists(self):
+        dj = DJFactory(name='Surgeon')
+        track = TrackFactory()
+        for setlist in SetlistFactory.create_batch(2, dj=dj):
+            TrackPlayFactory(track=track, setlist=setlist, set_order=1)
+        TrackPlayFactory(set_order=1)
+
+        # Two hops through plays of the track in two setlists of the DJ, without duplicating the track
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.list_url, {'plays__setlist__dj__name': 'surgeon'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual([result['id'] for result in res.data['results']], [str(track.id)])
+        track_queries = [query['sql'] for query in queries if 'FROM "app_track"' in query['sql']]
+        self.assertTrue(track_queries)
+        for sql in track_queries:
+            self.assertIn('EXISTS', sql)
+            self.assertNotIn('DISTINCT', sql)
+
+        res = self.client.get(self.list_url, {'filters': '(plays__setlist__dj__name=Surgeon)|(title=nothing)'},
+                              format='json')
+        self.assertEqual(res.data['count'], 1)
+        res = self.client.get(self.list_url, {'filters': '~(plays__setlist__dj__name=Surgeon)'}, format='json')
+        self.assertEqual(res.data['count'], 1)
+
     def test_stats(self):
         tracks = []
         for i in range(10):
@@ -352,6 +705,89 @@ class TrackPlaysApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
         self.assertEqual(res.data['count'], 3)
 
+    def test_list_counts(self):
+        plays = [TrackPlayFactory() for i in range(3)]
+        res = self.client.get(self.list_url)
+        self.assertEqual(res.data['count'], 3)
+        self.assertTrue(res.data['count_exact'])
+
+        # Large unfiltered tables report the planner's estimate
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE app_trackplay')
+        with mock.patch.object(SetSpyPagination, 'count_estimate_threshold', 3):
+            res = self.client.get(self.list_url, {'limit': 1})
+        self.assertEqual(res.data['count'], 3)
+        self.assertFalse(res.data['count_exact'])
+
+        # Pages past an estimate which is too low are still served, and link to the next one while there are rows left
+        with mock.patch.object(SetSpyPagination, 'count_estimate_threshold', 1), \
+                mock.patch.object(SetSpyPagination, 'get_count_estimate', return_value=1):
+            res = self.client.get(self.list_url, {'limit': 1, 'offset': 1})
+            self.assertEqual((res.data['count'], len(res.data['results'])), (1, 1))
+            res = self.client.get(res.data['next'])
+            self.assertEqual(len(res.data['results']), 1)
+            self.assertIsNone(res.data['next'])
+
+        # Filtered counts are exact and cached
+        play_filter = {'set_order__in': ','.join(str(play.set_order) for play in plays), 'limit': 1}
+        res = self.client.get(self.list_url, play_filter)
+        self.assertTrue(res.data['count_exact'])
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.list_url, {**play_filter, 'offset': 1})
+        self.assertEqual(res.data['count'], 3)
+        self.assertFalse([query for query in queries if 'AS "__count" FROM "app_trackplay"' in query['sql']])
+
+    def test_surrogate_keys(self):
+        plays = [TrackPlayFactory() for i in range(2)]
+        # Track plays reference their tracks and setlists by key, but the API keeps exposing UUIDs
+        self.assertEqual((plays[0].track_id, plays[0].setlist_id), (plays[0].track.key, plays[0].setlist.key))
+        self.assertNotEqual(plays[0].setlist.key, plays[1].setlist.key)
+        res = self.client.get(self.list_url, {'setlist': str(plays[0].setlist.pk)}, format='json')
+        self.assertEqual(res.data['count'], 1)
+        result = res.data['results'][0]
+        self.assertEqual((result['track']['id'], result['setlist']['id'], result['setlist']['dj']['id']),
+                         (str(plays[0].track.pk), str(plays[0].setlist.pk), str(plays[0].setlist.dj.pk)))
+        self.assertNotIn('key', result['setlist'])
+
+    def test_values_serializer(self):
+        TrackPlayFactory(label=None)
+        for i in range(2):
+            TrackPlayFactory()
+        # Served from .values() rows, with the same JSON down to the byte as the DRF serializer's and keyset cursors
+        for params in ({'ordering': 'id', 'limit': 2}, {'cursor': '', 'limit': 2}):
+            res = self.client.get(self.list_url, params)
+            pages = [res.content, self.client.get(res.data['next']).content]
+            bump_generations(TrackPlay)
+            with mock.patch.object(TrackPlayViewSet, 'values_serializer', None):
+                res = self.client.get(self.list_url, params)
+                model_pages = [res.content, self.client.get(res.data['next']).content]
+            self.assertEqual(pages, model_pages)
+        self.assertIn(b'"label":null', b''.join(pages))
+
+    def test_export(self):
+        plays = [TrackPlayFactory(set_order=i + 1) for i in range(3)]
+        plays[0].label.name = 'Comma, Semicolon, and Period Records'
+        plays[0].label.save()
+        res = self.client.get(self.list_url, {'format': 'ndjson', 'set_order__in': '1,2'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(res['Content-Disposition'], 'attachment; filename="trackplay.ndjson"')
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual({row['id'] for row in rows}, {str(play.pk) for play in plays[:2]})
+        row = next(row for row in rows if row['id'] == str(plays[0].pk))
+        self.assertEqual((row['track_id'], row['artist_name'], row['dj_name'], row['label_name']),
+                         (str(plays[0].track.pk), plays[0].track.artist.name, plays[0].setlist.dj.name,
+                          plays[0].label.name))
+
+        res = self.client.get(self.list_url, {'format': 'csv'})
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(b''.join(res.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(list(rows[0]), [column for column, _ in TrackPlayViewSet.export_fields])
+        row = next(row for row in rows if row['id'] == str(plays[0].pk))
+        self.assertEqual((row['set_order'], row['label_name']), ('1', plays[0].label.name))
+
     def test_retrieve(self):
         play = TrackPlayFactory()
         url = reverse('trackplay-detail', kwargs={'pk': play.pk.hex})
@@ -394,7 +830,8 @@ class TrackPlaysApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.data['count'], 2)
 
         # By setlist dj name
-        res = self.client.get(self.list_url, {'setlist__dj__name': play1.setlist.dj.name.upper()}, format='json')  # case insensitive
+        res = self.client.get(self.list_url, {'setlist__dj__name': play1.setlist.dj.name.upper()},
+                              format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         track_filter = {'setlist__dj__name__in': f'{play1.setlist.dj.name},{play2.setlist.dj.name}'}
         res = self.client.get(self.list_url, track_filter, format='json')
@@ -420,6 +857,34 @@ class SetlistsApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
         self.assertEqual(res.data['count'], 3)
 
+    def test_list_query_count(self):
+        def add_setlists(num_setlists):
+            for i in range(num_setlists):
+                setlist = SetlistFactory()
+                for j in range(3):
+                    TrackPlayFactory(setlist=setlist, set_order=j)
+
+        add_setlists(1)
+        with CaptureQueriesContext(connection) as small_page_queries:
+            res = self.client.get(self.list_url, {'ordering': 'title'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+
+        add_setlists(10)
+        with CaptureQueriesContext(connection) as large_page_queries:
+            res = self.client.get(self.list_url, {'ordering': 'title'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+        self.assertEqual(len(large_page_queries), len(small_page_queries))
+        self.assertEqual([setlist['num_tracks'] for setlist in res.data['results']], [3] * 11)
+
+        # Track counts follow the track plays
+        setlist = Setlist.objects.order_by('title').first()
+        setlist.track_plays.first().delete()
+        TrackPlayFactory(setlist=SetlistFactory(), set_order=1)
+        res = self.client.get(self.list_url, {'ordering': 'title'})
+        num_tracks = {result['id']: result['num_tracks'] for result in res.data['results']}
+        self.assertEqual(num_tracks[str(setlist.id)], 2)
+        self.assertEqual(sorted(setlist['num_tracks'] for setlist in res.data['results']), [1, 2] + [3] * 10)
+
     def test_retrieve(self):
         setlist = SetlistFactory()
         for i in range(5):
@@ -444,7 +909,7 @@ class SetlistsApiTestCase(SetlistSpyApiTestCase):
         self.assertEqual(res.data['count'], 2)
 
         # By dj name
-        res = self.client.get(self.list_url, {'dj__name': setlist1.dj.name.upper()}, format='json') # case insensitive
+        res = self.client.get(self.list_url, {'dj__name': setlist1.dj.name.upper()}, format='json')  # case insensitive
         self.assertEqual(res.data['count'], 1)
         setlist_filter = {'dj__name__in': f'{setlist1.dj.name},{setlist2.dj.name}'}
         res = self.client.get(self.list_url, setlist_filter, format='json')
@@ -469,3 +934,115 @@ class SetlistsApiTestCase(SetlistSpyApiTestCase):
         res = self.client.get(self.list_url, {'empty': False}, format='json')
         self.assertEqual(res.data['count'], 1)
 
+
+class SearchApiTestCase(SetlistSpyApiTestCase):
+    url = reverse('search')
+
+    def test_search(self):
+        artist = ArtistFactory(name='Robert Hood')
+        ArtistFactory(name='Robert Hoodie')
+        ArtistFactory(name='Jeff Mills')
+        track = TrackFactory(title='Hood Rat', artist=artist)
+        label = LabelFactory(name='Hoodlum Records')
+        DJFactory(name='Ben Klock')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.url, {'q': 'hood', 'limit': 1}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK, msg=res.data)
+        self.assertEqual(res.data['artists'], [{'id': str(artist.id), 'name': 'Robert Hood', 'rank': mock.ANY}])
+        self.assertEqual(res.data['tracks'], [{'id': str(track.id), 'title': 'Hood Rat', 'artist': 'Robert Hood',
+                                               'rank': mock.ANY}])
+        self.assertEqual([hit['id'] for hit in res.data['labels']], [str(label.id)])
+        self.assertEqual(res.data['djs'], [])
+        # All four types in one query, without counting
+        search_queries = [query['sql'] for query in queries if 'UNION ALL' in query['sql']]
+        self.assertEqual(len(search_queries), 1)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+        res = self.client.get(self.url, {'q': 'robert', 'limit': 5}, format='json')
+        self.assertEqual([hit['name'] for hit in res.data['artists']], ['Robert Hood', 'Robert Hoodie'])
+        res = self.client.get(self.url, {'q': ' '}, format='json')
+        self.assertEqual(res.data, {'artists': [], 'tracks': [], 'labels': [], 'djs': []})
+
+
+class LocalCacheTestCase(SetlistSpyApiTestCase):
+
+    def test_lru(self):
+        lru = local_cache.LRUCache(max_entries=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(lru.get('a'))
+
+    def test_invalidation(self):
+        cache.set('local_cache_test', 1)
+        self.assertEqual(local_cache.get('local_cache_test'), 1)
+        cache.set('local_cache_test', 2)
+        self.assertEqual(local_cache.get('local_cache_test'), 1)
+        local_cache.invalidate('local_cache_test')
+        self.assertEqual(local_cache.get('local_cache_test'), 2)
+
+    def test_cache_stats(self):
+        local_cache.reset_stats()
+        local_cache.get('local_cache_test_missing')
+        out = StringIO()
+        call_command('cache_stats', reset=True, stdout=out)
+        self.assertIn('miss: 1 lookups (100.0%)', out.getvalue())
+        self.assertEqual(local_cache.get_stats()['miss'], (0, 0))
+
+
+class ProfilingApiTestCase(SetlistSpyApiTestCase):
+    list_url = reverse('dj-list')
+
+    def test_server_timing(self):
+        DJFactory()
+        res = self.client.get(self.list_url)
+        self.assertRegex(res['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", serializer;dur=[\d.]+, '
+                                               r'cache;desc="miss", total;dur=[\d.]+$')
+        res = self.client.get(self.list_url)
+        self.assertIn('desc="0 queries"', res['Server-Timing'])
+        self.assertIn('cache;desc="hit"', res['Server-Timing'])
+
+    def test_query_budget(self):
+        dj = DJFactory()
+        with mock.patch.object(DJViewSet, 'query_budgets', {'list': 2}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.list_url)
+            # Requests served from the cache run no queries
+            DJFactory()
+            with mock.patch.object(ProfilingMiddleware, 'enforce_query_budgets', False), \
+                    self.assertLogs('setlistspy.app.profiling', 'WARNING') as logs:
+                res = self.client.get(self.list_url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertIn('DJViewSet.list ran 3 queries, over its budget of 2', logs.output[0])
+            res = self.client.get(self.list_url)
+            self.assertIn('desc="0 queries"', res['Server-Timing'])
+
+        # Views and actions without a budget are only profiled
+        with mock.patch.object(DJViewSet, 'query_budgets', {}):
+            DJFactory()
+            res = self.client.get(self.list_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(reverse('dj-detail', kwargs={'pk': dj.pk.hex}))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ApiBenchmarkTestCase(SetlistSpyApiTestCase):
+
+    def test_popularity(self):
+        setlists = list(generate_setlists(500, num_djs=20, popularity_exponent=api_benchmark.POPULARITY_EXPONENT))
+        num_setlists = Counter(setlist['dj_url'] for setlist in setlists)
+        self.assertGreater(num_setlists['/w/Category:DJ_0'], 5 * num_setlists['/w/Category:DJ_19'])
+        self.assertEqual([setlist['dj_name'] for setlist in setlists],
+                         [setlist['dj_name'] for setlist in generate_setlists(
+                             500, num_djs=20, popularity_exponent=api_benchmark.POPULARITY_EXPONENT)])
+
+    @mock.patch.multiple(api_benchmark, CATALOGUE_SETLISTS=50, CATALOGUE_DJS=5, REPLAYS=1)
+    def test_request_mix(self):
+        results = api_benchmark.run(rounds=1)
+        self.assertTrue(results['within_budget'], msg=results['over_query_budget'])
+        self.assertGreater(results['dj stats queries'], 0)
@@ -0,0 +1,28 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from setlistspy.app.indexes import get_index_usage
+from setlistspy.app.models import TrackPlay
+
+
+class IndexUsageTestCase(TestCase):
+
+    def test_no_redundant_indexes(self):
+        self.assertEqual([usage.name for usage in get_index_usage() if usage.redundant_with], [])
+
+    def test_index_usage(self):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE INDEX app_trackplay_track_only ON app_trackplay (track_id)')
+        usages = {usage.name: usage for usage in get_index_usage([TrackPlay._meta.db_table])}
+        self.assertEqual(usages['app_trackplay_track_only'].columns, 'track_id')
+        self.assertEqual(usages['app_trackplay_track_only'].redundant_with, 'app_trackpl_track_i_1645eb_idx')
+        self.assertIsNone(usages['app_trackpl_track_i_1645eb_idx'].redundant_with)
+
+        out = StringIO()
+        call_command('index_usage', TrackPlay._meta.db_table, '--flagged', stdout=out)
+        self.assertIn('app_trackplay_track_only (track_id): 0 scans', out.getvalue())
+        self.assertIn('unused, redundant with app_trackpl_track_i_1645eb_idx', out.getvalue())
+        self.assertNotIn('app_trackplay_pkey', out.getvalue())
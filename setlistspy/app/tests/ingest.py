@@ -0,0 +1,218 @@
+import hashlib
+import json
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from setlistspy.app.benchmarks.tracklists import load_corpus
+from setlistspy.app.factories import DJFactory
+from setlistspy.app.ingest import ingest_setlists
+from setlistspy.app.models import Artist, DJ, DJArtistPlayCount, DJCollaboration, Label, Setlist, Track, TrackPlay
+from setlistspy.app.tasks.mixesdb import save_setlists_xml
+from setlistspy.app.tracklists import TrackRecord, TracklistMetrics, parse_tracklist
+
+
+def make_setlist_features(mixesdb_id, tracklist, xml_sha1='a' * 31):
+    return {
+        'mixesdb_id': mixesdb_id,
+        'title': f'Setlist {mixesdb_id}',
+        'mixesdb_mod_time': timezone.now(),
+        'xml_sha1': xml_sha1,
+        'b2b': False,
+        'tracklist_data': [
+            {'artist_name': artist_name, 'title': title, 'label_name': label_name}
+            for artist_name, title, label_name in tracklist
+        ]
+    }
+
+
+class IngestTestCase(TestCase):
+
+    def test_ingest_setlists(self):
+        dj = DJFactory()
+        tracklist = [
+            ('Jeff Mills', 'The Bells', 'Purpose Maker'),
+            ('Robert Hood', 'Minus', 'M-Plant'),
+            ('Jeff Mills', 'Changes Of Life', 'Axis'),
+        ]
+        ingest_setlists(dj, [make_setlist_features(1, tracklist), make_setlist_features(2, tracklist[:1])])
+        self.assertEqual(Setlist.objects.filter(dj=dj).count(), 2)
+        self.assertEqual(Artist.objects.count(), 2)
+        self.assertEqual(Label.objects.count(), 3)
+        self.assertEqual(Track.objects.count(), 3)
+        self.assertEqual(TrackPlay.objects.count(), 4)
+        jeff_mills = Artist.objects.get(name='Jeff Mills')
+        self.assertEqual(jeff_mills.total_plays, 3)
+        self.assertEqual(DJArtistPlayCount.objects.get(dj=dj, artist=jeff_mills).play_count, 3)
+        self.assertEqual(dict(Setlist.objects.values_list('mixesdb_id', 'num_tracks')), {1: 3, 2: 1})
+        self.assertEqual(Track.objects.get(title='The Bells').num_plays, 2)
+        self.assertEqual(DJ.objects.get(pk=dj.pk).num_setlists, 2)
+
+        # Unchanged setlists are skipped, changed ones get their track plays replaced
+        setlist = Setlist.objects.get(dj=dj, mixesdb_id=1)
+        ingest_setlists(dj, [make_setlist_features(1, tracklist[1:], xml_sha1='b' * 31),
+                             make_setlist_features(2, [])])
+        self.assertEqual(list(setlist.track_plays.order_by('set_order').values_list('track__title', 'set_order')),
+                         [('Minus', 1), ('Changes Of Life', 2)])
+        self.assertEqual(TrackPlay.objects.count(), 3)
+        jeff_mills.refresh_from_db()
+        self.assertEqual(jeff_mills.total_plays, 2)
+        self.assertEqual(DJArtistPlayCount.objects.get(dj=dj, artist=jeff_mills).play_count, 2)
+        self.assertEqual(dict(Setlist.objects.values_list('mixesdb_id', 'num_tracks')), {1: 2, 2: 1})
+        self.assertEqual(Track.objects.get(title='The Bells').num_plays, 1)
+
+    def test_ingest_collaborations(self):
+        dj, partner = DJFactory(), DJFactory()
+        tracklist = [('Jeff Mills', 'The Bells', 'Purpose Maker')]
+        ingest_setlists(dj, [{**make_setlist_features(1, tracklist), 'b2b': True}])
+        self.assertFalse(DJCollaboration.objects.exists())
+        ingest_setlists(partner, [{**make_setlist_features(1, tracklist), 'b2b': True}])
+        self.assertEqual(set(DJCollaboration.objects.values_list('dj', 'collaborator', 'num_setlists')),
+                         {(dj.key, partner.key, 1), (partner.key, dj.key, 1)})
+
+    def test_ingest_query_count(self):
+        dj = DJFactory()
+
+        def ingest_tracks(mixesdb_id, num_tracks):
+            tracklist = [(f'Artist {i}', f'Track {i}', f'Label {i}') for i in range(num_tracks)]
+            with CaptureQueriesContext(connection) as queries:
+                ingest_setlists(dj, [make_setlist_features(mixesdb_id, tracklist)])
+            return len(queries)
+
+        self.assertEqual(ingest_tracks(1, 2), ingest_tracks(2, 50))
+
+
+class BulkLoadTestCase(TestCase):
+
+    def get_index_definitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename LIKE 'app\\_%%' ORDER BY indexdef")
+            return cursor.fetchall()
+
+    def load(self, setlists, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as setlists_file:
+            for setlist in setlists:
+                setlists_file.write(json.dumps(setlist, cls=DjangoJSONEncoder) + '\n')
+            setlists_file.flush()
+            out = StringIO()
+            call_command('bulk_load', setlists_file.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_bulk_load(self):
+        tracklist = [
+            ('Jeff Mills', 'The Bells', 'Purpose Maker'),
+            ('Robert Hood', 'Minus', None),
+            ('Jeff Mills', 'Changes Of Life', 'Axis'),
+        ]
+        dj = {'dj_name': 'Surgeon', 'dj_url': '/w/Category:Surgeon'}
+        setlists = [{**dj, **make_setlist_features(1, tracklist)}, {**dj, **make_setlist_features(2, tracklist[:1])}]
+        index_definitions = self.get_index_definitions()
+        out = self.load(setlists, '--defer-indexes')
+        self.assertIn('Loaded track plays: 4 rows', out)
+        self.assertEqual(self.get_index_definitions(), index_definitions)
+        self.assertEqual(Setlist.objects.filter(dj__url=dj['dj_url']).count(), 2)
+        self.assertEqual(Artist.objects.count(), 2)
+        self.assertEqual(Label.objects.count(), 2)
+        self.assertEqual(Track.objects.count(), 3)
+        self.assertEqual(Artist.objects.get(name='Jeff Mills').total_plays, 3)
+
+        # Unchanged setlists are skipped, changed ones get their track plays replaced
+        setlists[0] = {**dj, **make_setlist_features(1, tracklist[1:], xml_sha1='b' * 31)}
+        out = self.load(setlists)
+        self.assertIn('Loaded track plays: 2 rows', out)
+        setlist = Setlist.objects.get(dj__url=dj['dj_url'], mixesdb_id=1)
+        self.assertEqual(list(setlist.track_plays.order_by('set_order').values_list('track__title', 'label__name')),
+                         [('Minus', None), ('Changes Of Life', 'Axis')])
+        self.assertEqual(TrackPlay.objects.count(), 3)
+        jeff_mills = Artist.objects.get(name='Jeff Mills')
+        self.assertEqual(jeff_mills.total_plays, 2)
+        self.assertEqual(DJArtistPlayCount.objects.get(dj=setlist.dj, artist=jeff_mills).play_count, 2)
+        self.assertEqual(dict(Setlist.objects.values_list('mixesdb_id', 'num_tracks')), {1: 2, 2: 1})
+
+
+MEDIAWIKI_EXPORT = '''<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="en">
+  <siteinfo><sitename>Mixesdb</sitename></siteinfo>
+  <page>
+    <title>2019-05-01 - Surgeon @ Tresor, Berlin</title>
+    <ns>0</ns>
+    <id>1234</id>
+    <revision>
+      <id>5678</id>
+      <timestamp>2019-05-02T10:00:00Z</timestamp>
+      <text xml:space="preserve">== Tracklist ==
+# [0:00] Jeff Mills - The Bells [Purpose Maker]
+# [5:00] Robert Hood - Minus
+# ?
+[[Category:Surgeon]]</text>
+      <sha1>0123456789abcdefghijklmnopqrstu</sha1>
+    </revision>
+  </page>
+  <page>
+    <title>File:Surgeon.jpg</title>
+    <ns>6</ns>
+    <id>1235</id>
+    <revision>
+      <id>5679</id>
+      <timestamp>2019-05-02T10:00:00Z</timestamp>
+      <text xml:space="preserve">Cover</text>
+      <sha1>abcdefghijklmnopqrstu0123456789</sha1>
+    </revision>
+  </page>
+</mediawiki>'''
+
+
+class MediaWikiExportTestCase(TestCase):
+
+    def test_save_setlists_xml(self):
+        dj = DJFactory(name='Surgeon')
+        export = MEDIAWIKI_EXPORT.encode('utf-8')
+        save_setlists_xml(BytesIO(export), dj)
+        setlist = Setlist.objects.get(dj=dj)
+        self.assertEqual((setlist.mixesdb_id, setlist.title, setlist.xml_sha1),
+                         (1234, '2019-05-01 - Surgeon @ Tresor, Berlin', '0123456789abcdefghijklmnopqrstu'))
+        self.assertEqual(list(setlist.track_plays.order_by('set_order')
+                              .values_list('track__artist__name', 'track__title', 'label__name')),
+                         [('Jeff Mills', 'The Bells', 'Purpose Maker'), ('Robert Hood', 'Minus', None)])
+        dj.refresh_from_db()
+        self.assertEqual(dj.xml_md5, hashlib.md5(export).hexdigest())
+
+
+class TracklistParserTestCase(SimpleTestCase):
+
+    def test_parse_tracklist(self):
+        metrics = TracklistMetrics()
+        records = parse_tracklist([
+            '== Tracklist ==',
+            '# [0:00] Surgeon - Magneze [Dynamic Tension]',
+            '# [4:12] Regis - blood witness [Downwards - LINEAR 009]',
+            '# [7:40] ?',
+            '# Robert Hood - Minus - M-Plant',
+            '# Juan Atkins - Game One (Original Mix)',
+            '# Surgeon [UK] - Magneze',
+            '[[Category:Surgeon]]',
+        ], metrics=metrics)
+        self.assertEqual(records, [
+            TrackRecord('Surgeon', 'Magneze', 'Dynamic Tension'),
+            TrackRecord('Regis', 'blood witness', 'Downwards'),
+            TrackRecord('Robert Hood', 'Minus', 'M'),
+            TrackRecord('Juan Atkins', 'Game One (Original Mix)', None),
+        ])
+        self.assertEqual(metrics.as_dict(), {'lines': 8, 'tracks': 4, 'skipped': 3, 'irregular': 1,
+                                             'irregular_samples': ['# Surgeon [UK] - Magneze']})
+
+    def test_parse_b2b_tracklist(self):
+        records = parse_tracklist(['# Surgeon - Atol [Counterbalance]', ';Regis - Allegiance', '[0:00] - Intro'],
+                                  b2b=True)
+        self.assertEqual(records, [TrackRecord('Surgeon', 'Atol', 'Counterbalance')])
+
+    def test_benchmark_corpus(self):
+        metrics = TracklistMetrics()
+        parse_tracklist(load_corpus(), metrics=metrics)
+        self.assertEqual((metrics.counts['lines'], metrics.counts['tracks'], metrics.counts['irregular']),
+                         (138, 98, 2))
@@ -0,0 +1,72 @@
+'''
+Parsing of MixesDB tracklist wikitext into track records.
+
+Tracklist lines generally look like "# [12:34] Artist - Title [Label - CAT 001]". Lines which aren't tracks (headers,
+categories, templates, unknown "?" tracks) are skipped, and lines which look like tracks but can't be parsed are
+counted as irregular in TracklistMetrics rather than reported one by one.
+'''
+import re
+from collections import Counter, deque, namedtuple
+
+NAME_MAX_LENGTH = 255
+
+# {cue} {artist} - {title} {[label]}, where the cue and label are optional and unknown "?" tracks don't match
+TRACK_PATTERN = re.compile(r'(?:\[[\d:\?]*\])?[\s]?(?!\?)([^\[]*) - ([^\[]*)(\[.*])?$')
+TRACK_SEPARATOR = ' - '
+NON_TRACK_PREFIXES = ('[', '{', '|', '=')
+B2B_NON_TRACK_PREFIXES = ('[', ';')
+LABEL_STRIP_CHARS = '[( )]'
+LINE_STRIP_CHARS = '# '
+
+TrackRecord = namedtuple('TrackRecord', ('artist_name', 'title', 'label_name'))
+
+
+class TracklistMetrics:
+    '''Counts of the lines seen by the parser, with the last few irregular lines kept as samples'''
+
+    def __init__(self, max_samples=10):
+        self.counts = Counter(lines=0, tracks=0, skipped=0, irregular=0)
+        self.irregular_samples = deque(maxlen=max_samples)
+
+    def add_irregular(self, line):
+        self.counts['irregular'] += 1
+        self.irregular_samples.append(line)
+
+    def as_dict(self):
+        return {**self.counts, 'irregular_samples': list(self.irregular_samples)}
+
+
+def parse_tracklist(lines, b2b=False, metrics=None):
+    '''Return the TrackRecords of an iterable of stripped tracklist lines, in one pass'''
+    metrics = metrics if metrics is not None else TracklistMetrics()
+    match = TRACK_PATTERN.match
+    records = []
+    append = records.append
+    num_lines = 0
+    for line in lines:
+        num_lines += 1
+        # Every track line has an artist - title separator, which rules out most other lines cheaply
+        if TRACK_SEPARATOR not in line or (b2b and line.startswith(B2B_NON_TRACK_PREFIXES)):
+            continue
+        matched = match(line.strip(LINE_STRIP_CHARS))
+        if matched:
+            append(get_track_record(*matched.groups()))
+        elif len(line) > 7 and not line.startswith(NON_TRACK_PREFIXES) and 'file details' not in line.lower():
+            metrics.add_irregular(line)
+    metrics.counts['lines'] += num_lines
+    metrics.counts['tracks'] += len(records)
+    metrics.counts['skipped'] = metrics.counts['lines'] - metrics.counts['tracks'] - metrics.counts['irregular']
+    return records
+
+
+def get_track_record(artist_name, title, label):
+    artist_name = artist_name.title()
+    if TRACK_SEPARATOR in artist_name:
+        # Fringe case of an "Artist - Title - Label" line without brackets
+        artist_name, title, label = artist_name.split(TRACK_SEPARATOR)[:2] + [title]
+        artist_name, title = artist_name.strip().title(), title.strip().title()
+    else:
+        title = title.strip()
+    if label:
+        label = label.strip(LABEL_STRIP_CHARS).split('-')[0].strip().title()[:NAME_MAX_LENGTH] or None
+    return TrackRecord(artist_name[:NAME_MAX_LENGTH], title[:NAME_MAX_LENGTH], label)
@@ -0,0 +1,13 @@
+from itertools import islice
+
+# Number of rows written or looked up per statement by the set-based ingest and rollup queries
+BATCH_SIZE = 5000
+
+
+def batched(items, batch_size=BATCH_SIZE):
+    '''Split items into lists of at most batch_size items, consuming iterators lazily'''
+    items = iter(items)
+    batch = list(islice(items, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(items, batch_size))
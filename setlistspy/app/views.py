@@ -3,10 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
 from rest_framework_filters.backends import ComplexFilterBackend
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from setlistspy.app.mixins import SetSpyListModelMixin
+from setlistspy.app.cache import get_generation_key_prefix
+from setlistspy.app.collaborations import get_collaborators
+from setlistspy.app.jobs import get_cached_stats
+from setlistspy.app.mixins import CACHE_TTL, SetSpyCachedObjectMixin, SetSpyExportMixin, SetSpyListModelMixin
 from setlistspy.app.models import Artist, DJ, Label, Setlist, Track, TrackPlay
+from setlistspy.app.profiling import cache_lookup, record_cache_miss
+from setlistspy.app.response_cache import get_cached_response, get_compressed_response
 from setlistspy.app.filters import ArtistFilter, DJFilter, LabelFilter, TrackFilter, TrackPlayFilter, SetlistFilter
+from setlistspy.app.search import SEARCH_TYPES, search_all
 from setlistspy.app.serializers import (
     ArtistSerializer,
     ArtistStatsSerializer,
@@ -19,15 +26,27 @@ from setlistspy.app.serializers import (
     TrackStatsSerializer,
     SetlistSerializer
 )
+from setlistspy.app.values_serializers import ValuesSerializer
 
-# CACHE_TTL = getattr(settings, 'CACHE_TTL', DEFAULT_TIMEOUT)
 
-
-class DJViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
+class DJViewSet(SetSpyCachedObjectMixin, SetSpyListModelMixin, viewsets.ModelViewSet):
     serializer_class = DJSerializer
     queryset = DJ.objects.all()
     filter_backends = (ComplexFilterBackend, OrderingFilter)
     filter_class = DJFilter
+    ordering_fields = ('id', 'name', 'num_setlists')
+    # num_setlists is recounted by setlistspy.app.rollups as setlists and their track plays change
+    cache_dependencies = (DJ, Setlist, TrackPlay)
+    object_cache_dependencies = (DJ, Setlist, TrackPlay)
+    cached_object_actions = ('retrieve', 'stats', 'collaborators')
+    # Maximum number of queries per action on a cache miss, enforced by setlistspy.app.profiling. Lists may run a
+    # count estimate, the count and the page, plus one lookup for a related object filter
+    query_budgets = {'list': 4, 'retrieve': 1, 'stats': 3, 'collaborators': 2}
+    # The collaboration graph changes with the setlists, see setlistspy.app.collaborations
+    collaborators_cache_dependencies = (DJ, Setlist)
+    max_collaborator_hops = 2
+    default_collaborators_limit = 100
+    max_collaborators_limit = 1000
 
     def get_serializer_class(self, *args, **kwargs):
         if self.action == 'stats':
@@ -37,31 +56,69 @@ class DJViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='stats')
     def stats(self, request, pk=None, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance, context=self.get_serializer_context(), **kwargs)
-        return Response(serializer.data)
+        response = Response(get_cached_stats(self.get_serializer_class(), instance))
+        return get_compressed_response(self, request, response, CACHE_TTL)
+
+    @action(detail=True, methods=['get'], url_path='collaborators')
+    def collaborators(self, request, pk=None, *args, **kwargs):
+        '''DJs this DJ has done b2b sets with, by the number of them (?limit=), and their own collaborators (?hops=2)'''
+        key_prefix = get_generation_key_prefix(self.collaborators_cache_dependencies)
+        with cache_lookup():
+            return get_cached_response(self, request, key_prefix, CACHE_TTL,
+                                       lambda: self.collaborators_uncached(request))
+
+    def collaborators_uncached(self, request):
+        record_cache_miss()
+        instance = self.get_object()
+        hops = self.get_query_param_int(request, 'hops', 1, self.max_collaborator_hops)
+        limit = self.get_query_param_int(request, 'limit', self.default_collaborators_limit,
+                                         self.max_collaborators_limit)
+        return Response(get_collaborators(instance.key, hops, limit))
 
+    def get_query_param_int(self, request, name, default, maximum):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            return default
+        return min(max(value, 1), maximum)
 
-class SetlistViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
+
+class SetlistViewSet(SetSpyExportMixin, SetSpyListModelMixin, viewsets.ModelViewSet):
     serializer_class = SetlistSerializer
+    values_serializer = ValuesSerializer(SetlistSerializer)
     queryset = Setlist.objects.all()
     filter_backends = (ComplexFilterBackend, OrderingFilter)
     filter_class = SetlistFilter
+    ordering_fields = ('id', 'dj', 'title', 'mixesdb_id', 'mixesdb_mod_time', 'b2b', 'num_tracks')
+    cache_dependencies = (Setlist, DJ, TrackPlay)
+    cursor_ordering = ('mixesdb_mod_time', 'id')
+    query_budgets = {'list': 4, 'retrieve': 1}
+    export_fields = (('id', 'id'), ('title', 'title'), ('mixesdb_id', 'mixesdb_id'),
+                     ('mixesdb_mod_time', 'mixesdb_mod_time'), ('b2b', 'b2b'), ('num_tracks', 'num_tracks'),
+                     ('dj_id', 'dj__id'), ('dj_name', 'dj__name'))
 
     def get_queryset(self):
         return super(SetlistViewSet, self).get_queryset()\
-                .select_related("dj")\
-                .prefetch_related("tracks__artist").distinct()
+                .select_related("dj")
 
 
-class TrackViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
+class TrackViewSet(SetSpyExportMixin, SetSpyListModelMixin, viewsets.ModelViewSet):
     serializer_class = TrackSerializer
+    values_serializer = ValuesSerializer(TrackSerializer)
     queryset = Track.objects.all()
     filter_backends = (ComplexFilterBackend, OrderingFilter)
     filter_class = TrackFilter
+    ordering_fields = ('id', 'title', 'num_plays')
+    # num_plays is recounted by setlistspy.app.rollups as track plays change
+    cache_dependencies = (Track, Artist, TrackPlay)
+    cursor_ordering = ('artist__name', 'title', 'id')
+    query_budgets = {'list': 4, 'retrieve': 1, 'stats': 4}
+    export_fields = (('id', 'id'), ('title', 'title'), ('num_plays', 'num_plays'), ('artist_id', 'artist__id'),
+                     ('artist_name', 'artist__name'))
 
     def get_queryset(self):
         return super(TrackViewSet, self).get_queryset()\
-            .select_related("artist").distinct()\
+            .select_related("artist")\
             .order_by("artist__name", "title")
 
     def get_serializer_class(self, *args, **kwargs):
@@ -72,15 +129,20 @@ class TrackViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='stats')
     def stats(self, request, pk=None, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance, context=self.get_serializer_context(), **kwargs)
-        return Response(serializer.data)
+        response = Response(get_cached_stats(self.get_serializer_class(), instance))
+        return get_compressed_response(self, request, response, CACHE_TTL)
 
 
-class ArtistViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
+class ArtistViewSet(SetSpyCachedObjectMixin, SetSpyListModelMixin, viewsets.ModelViewSet):
     serializer_class = ArtistSerializer
     queryset = Artist.objects.all()
     filter_backends = (ComplexFilterBackend, OrderingFilter)
     filter_class = ArtistFilter
+    ordering_fields = ('id', 'name', 'total_plays')
+    # total_plays is kept up to date by setlistspy.app.rollups as track plays change
+    cache_dependencies = (Artist, TrackPlay)
+    object_cache_dependencies = (Artist, TrackPlay)
+    query_budgets = {'list': 4, 'retrieve': 1, 'stats': 3}
 
     def get_serializer_class(self, *args, **kwargs):
         if self.action == 'stats':
@@ -90,15 +152,19 @@ class ArtistViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='stats')
     def stats(self, request, pk=None, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance, context=self.get_serializer_context(), **kwargs)
-        return Response(serializer.data)
+        response = Response(get_cached_stats(self.get_serializer_class(), instance))
+        return get_compressed_response(self, request, response, CACHE_TTL)
 
 
-class LabelViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
+class LabelViewSet(SetSpyCachedObjectMixin, SetSpyListModelMixin, viewsets.ModelViewSet):
     serializer_class = LabelSerializer
     queryset = Label.objects.all()
     filter_backends = (ComplexFilterBackend, OrderingFilter)
     filter_class = LabelFilter
+    ordering_fields = ('id', 'name', 'total_plays')
+    cache_dependencies = (Label, TrackPlay)
+    object_cache_dependencies = (Label, TrackPlay)
+    query_budgets = {'list': 4, 'retrieve': 1, 'stats': 4}
 
     def get_serializer_class(self, *args, **kwargs):
         if self.action == 'stats':
@@ -108,13 +174,54 @@ class LabelViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='stats')
     def stats(self, request, pk=None, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance, context=self.get_serializer_context(), **kwargs)
-        return Response(serializer.data)
+        response = Response(get_cached_stats(self.get_serializer_class(), instance))
+        return get_compressed_response(self, request, response, CACHE_TTL)
 
 
-class TrackPlayViewSet(SetSpyListModelMixin, viewsets.ModelViewSet):
+class TrackPlayViewSet(SetSpyExportMixin, SetSpyListModelMixin, viewsets.ModelViewSet):
     serializer_class = TrackPlaySerializer
+    values_serializer = ValuesSerializer(TrackPlaySerializer)
     queryset = TrackPlay.objects.all()
     filter_backends = (ComplexFilterBackend, OrderingFilter)
     filter_class = TrackPlayFilter
+    cache_dependencies = (TrackPlay, Track, Artist, Setlist, DJ, Label)
+    cursor_ordering = ('created_at', 'id')
+    query_budgets = {'list': 4, 'retrieve': 1}
+    export_fields = (('id', 'id'), ('set_order', 'set_order'), ('track_id', 'track__id'),
+                     ('track_title', 'track__title'), ('artist_id', 'track__artist__id'),
+                     ('artist_name', 'track__artist__name'), ('setlist_id', 'setlist__id'),
+                     ('setlist_title', 'setlist__title'), ('dj_id', 'setlist__dj__id'),
+                     ('dj_name', 'setlist__dj__name'), ('label_id', 'label__id'), ('label_name', 'label__name'))
 
+    def get_queryset(self):
+        return super(TrackPlayViewSet, self).get_queryset()\
+            .select_related('label', 'track__artist', 'setlist__dj')
+
+
+class SearchView(APIView):
+    '''Typeahead search over artists, tracks, labels and DJs at once, returning the top hits of each (?q=, ?limit=)'''
+    cache_dependencies = (Artist, Track, Label, DJ)
+    # The search query and whether the trigram extension is installed, which is looked up once per process
+    query_budgets = {'get': 2}
+    default_limit = 5
+    max_limit = 25
+
+    def get(self, request, *args, **kwargs):
+        key_prefix = get_generation_key_prefix(self.cache_dependencies)
+        with cache_lookup():
+            return get_cached_response(self, request, key_prefix, CACHE_TTL,
+                                       lambda: self.get_uncached(request, *args, **kwargs))
+
+    def get_uncached(self, request, *args, **kwargs):
+        record_cache_miss()
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({name: [] for name in SEARCH_TYPES})
+        return Response(search_all(query, self.get_limit(request)))
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)